@@ -6,48 +6,38 @@ from dash.dependencies import Input, Output
 import dash_table
 
 import plotly.graph_objects as go
+from flask_compress import Compress
 import datetime
-import tweepy
+import flask
+import functools
+import os
+import pickle
 
-from secrets import *
 from data_prep import *
+from cache_manager import fingerprint_files, memoize_callback
+from dash_metrics import instrument_dash_app
+from figure_payloads import downsample_indices, serve_cached_layout
+from dashboard_snapshot import LiveSnapshot
+from leader_profiles import LeaderProfileStore, StubProfileBackend, make_backend
+from search_index import load_search_index, SEARCH_INDEX_PATH
 
 HEADER_COLOR = '#83c3cd'  # color guide: https://www.color-hex.com/color/07889b
 
-df = load_and_clean_data()
-tweet_volume_df = data_prep_calculate_tweet_volume(df)
-top10_accounts_by_tweets_df = data_prep_accounts_by_tweet_volume(df)
-mentions_df = data_prep_top10_mentions(df)
-top10_accounts_faves_df = data_prep_top10_accounts_fave(df)
-top10_accounts_retweets_df = data_prep_top10_accounts_retweets(df)
-retweet_df = data_prep_retweet_df(df)
-favorites_df = data_prep_favorites_df(df)
-hashtag_counts_df = data_prep_hashtag_counts_df(df)
-average_number_of_tweets_per_hour = data_prep_tweets_by_time(df)
-links_df, all_urls = data_prep_links_df(df)
-domains_df = data_prep_domains_df(all_urls)
-leader_df = data_prep_leader_df(df)
-leader_hashtag_counts = data_prep_count_hashtags_by_leader(df)
-
-# Constants from df
-MIN_DATE = df['day'].min()
-MAX_DATE = df['day'].max()
-TOTAL_NUM_TWEETS = df.shape[0]
-NUM_TWEETERS = df['username'].nunique()
-NUM_HASHTAGS = len(set(df['hashtags'].str.cat(sep=' ').split(' ')))
-
-del(df)
-
 # Dash setup
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']  # https://codepen.io/chriddyp/pen/bWLwgP
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 app.title = 'The 2019 Canadian Federal Election on Twitter'
 server = app.server
+Compress(server)  # gzip for callback responses; the layout is served precompressed, see serve_cached_layout below
+
+# Leader profiles: served from disk, refreshed from Twitter in the background (LEADER_PROFILE_BACKEND=stub offline)
+try:
+    profile_backend = make_backend()
+except ImportError as e:  # no tweepy or no secrets.py
+    print("Leader profiles from the stub backend: {}".format(e))
+    profile_backend = StubProfileBackend()
+leader_profiles = LeaderProfileStore(LEADER_USERNAMES, profile_backend)
 
-# Twitter authentication
-auth = tweepy.OAuthHandler(consumer_key, consumer_secret)
-auth.set_access_token(access_key, access_secret)
-api = tweepy.API(auth)
 
 # Top header
 header = html.Div(children=[
@@ -58,262 +48,31 @@ header = html.Div(children=[
     html.Label(['Dashboard by ', html.A('@mathemakitten', href='https://twitter.com/mathemakitten', target='_blank')]),
 ])
 
-# Graph: volume of tweets over time
-volume_graph = html.Div(children=[
-    dcc.Graph(id='example-graph',
-              figure={'data': [{'x': tweet_volume_df.index, 'y': tweet_volume_df['num_tweets'],  'type': 'line',
-                                'hover_name': tweet_volume_df.index, 'hovertext': tweet_volume_df['day_of_week'],}
-                               ],
-                      'layout': {'title': 'Tweets about Canadian Politics from July - October 2019'}
-                      })], className="six columns")
-
-# Table: General overview stats
-overview_stats = html.Div(children=[
-    html.H1(children='Overview'),
-    html.P(html.Span(children=[html.B('Date range: '), '{} to {}'.format(MIN_DATE, MAX_DATE)])),
-    html.P(html.Span(children=[html.B('Criteria: '), 'tweets in any language containing the official hashtags ',
-                               '#cdnpoli, #elxn43, #polcan, #ItsOurVote, #CestNotreVote,', ' or tweets from official party leaders ',
-                               html.A('@JustinTrudeau', href='http://www.twitter.com/JustinTrudeau', target='_blank'), ', ',
-                               html.A('@AndrewScheer', href='http://www.twitter.com/AndrewScheer', target='_blank'),  ', ',
-                               html.A('@ElizabethMay', href='http://www.twitter.com/ElizabethMay', target='_blank'), ', ',
-                               html.A('@theJagmeetSingh', href='http://www.twitter.com/theJagmeetSingh', target='_blank'), ', ',
-                               # html.A('@MaximeBernier', href='http://www.twitter.com/AndrewScheer', target='_blank'), ', ',
-                               html.A('@yfblanchet', href='http://www.twitter.com/yfblanchet', target='_blank'),
-                               ])),
-    html.P(html.Span(children=[html.B('Total number of tweets: '), TOTAL_NUM_TWEETS])),
-    html.P(html.Span(children=[html.B('Number of distinct tweeters: '), NUM_TWEETERS])),
-    html.Span(children=[html.B('Number of distinct hashtags: '), NUM_HASHTAGS]),
-], className="six columns")
-
-
-# Graph: Top 10 Accounts by Tweet Volume
-top10_accounts_by_tweets = html.Div(children=[
-    dcc.Graph(id='top10_accounts_by_tweets',
-              figure=go.Figure(data=go.Bar(y=top10_accounts_by_tweets_df.index.tolist(),
-                                           x=top10_accounts_by_tweets_df['username'], # this is actually count
-                                           orientation='h',
-                                           marker_color='#07889B'
-                                           ),
-                               layout=go.Layout(title='Top 10 Accounts by Number of Tweets',
-                                                hovermode='closest',
-                                                xaxis={'title': 'number of tweets'}, yaxis={'autorange': 'reversed'},
-                                                font={'family': 'Arial', 'size': 14}
-                                                )),
-              ), html.Span(children=[html.P('Who talks the most?')], style={'text-align': 'center'})],
-    className="six columns")
-
-# Graph: Top 10 mentions by Twitter handles
-top10_mentions = html.Div(children=[
-    dcc.Graph(id='top10_mentions',
-              figure=go.Figure(data=go.Bar(y=mentions_df['mentions'], x=mentions_df['count'], orientation='h',
-                                           marker_color='#51abb9'
-                                           ),
-                               layout=go.Layout(title='Top 10 Accounts @Mentioned',
-                                                hovermode='closest',
-                                                xaxis={'title': 'user', 'tickangle': -60},
-                                                yaxis={'title': 'times mentioned', 'autorange': 'reversed'},
-                                                font={'family': 'Arial', 'size': 14}
-                                                )),
-              ), html.Span(children=[html.P('Who do people talk to/about the most?')], style={'text-align': 'center'})
-], className="six columns")
-
-
-#  Graph: Top 10 Accounts by Favorites
-top10_accounts_by_faves = html.Div(children=[
-    dcc.Graph(id='top10_accounts_by_faves',
-              figure=go.Figure(data=go.Bar(
-                  y=top10_accounts_faves_df.index.tolist(),
-                  x=top10_accounts_faves_df['favorites'],
-                  marker_color=HEADER_COLOR,
-                  orientation='h'),
-                  layout=go.Layout(title='Top 10 Accounts by Favourites',
-                                   hovermode='closest',
-                                   xaxis={'title': 'times tweets favourited by others'},
-                                   yaxis={'autorange': 'reversed'},
-                                   font={'family': 'Arial', 'size': 14}
-                                   )),
-              ),
-    html.Span(children=[html.P('This graph aims to capture tweeters who tweet highly-faved Canadian political content.')],
-              style={'text-align': 'center'})
-], className="six columns")
-
-# Graph: Top 10 Accounts by Retweets
-top10_accounts_by_retweets = html.Div(children=[
-    dcc.Graph(id='top10_accounts_by_retweets',
-              figure=go.Figure(data=go.Bar(
-                  y=top10_accounts_retweets_df.index.tolist(),
-                  x=top10_accounts_retweets_df['retweets'],
-                  marker_color='#b4dbe1',
-                  orientation='h'),
-                  layout=go.Layout(title='Top 10 Accounts by Retweets',
-                                   hovermode='closest',
-                                   xaxis={'title': 'times tweets retweeted by others'},
-                                   yaxis={'autorange': 'reversed'},
-                                   font={'family': 'Arial', 'size': 14}
-                                   )),
-              ),
-    html.Span(children=[html.P('This graph captures people who tweet highly-retweeted Canadian political content.')],
-              style={'text-align': 'center'})
-], className="six columns")
-
-# Graph: Top 10 Accounts by Retweets
-top10_tweets_by_retweets = html.Div([
-    html.H5(children='Top 10 tweets by retweets'),
-    html.Div(children=[dash_table.DataTable(id='top10_tweets_by_retweets',
-                                            columns=[{"name": i, "id": i} for i in retweet_df.columns],
-                                            data=retweet_df.to_dict('records'),
-                                            style_table={'overflowX': 'scroll'},
-                                            style_cell={'height': 'auto',
-                                                        'minWidth': '0px', 'Width': '500px',
-                                                        'whiteSpace': 'normal',
-                                                        'font-family': "Arial",
-                                                        'font-size': 14
-                                                        },
-                                            style_as_list_view=True,
-                                            style_header={'backgroundColor': HEADER_COLOR, 'fontWeight': 'bold'}
-                                            )],
-             style={'overflowX': 'scroll', 'Width': '2000px', 'Height': '400px', 'font-family': 'Open Sans'}
-             )],
-    style={'padding-top': '50px', 'padding-right': '50px', 'padding-bottom': '50px', 'padding-left': '50px'})
-
-top10_tweets_by_favorites = html.Div([
-    html.H5(children='Top 10 tweets by favorites'),
-    html.Div(children=[dash_table.DataTable(id='top10_tweets_by_favorites',
-                                            columns=[{"name": i, "id": i} for i in favorites_df.columns],
-                                            data=favorites_df.to_dict('records'),
-                                            style_table={'overflowX': 'scroll'},
-                                            style_cell={'height': 'auto',
-                                                        'minWidth': '0px', 'Width': '500px',
-                                                        'whiteSpace': 'normal',
-                                                        'font-family': "Arial", 'font-size': 14
-                                                        },
-                                            style_as_list_view=True,
-                                            style_header={'backgroundColor': HEADER_COLOR,
-                                                          'fontWeight': 'bold'})],
-             style={'overflowX': 'scroll', 'Width': '2000px', 'Height': '400px', 'font-family': 'Open Sans'}
-             )],
-    style={'padding-top': '10px', 'padding-right': '50px', 'padding-bottom': '50px', 'padding-left': '50px'})
-
-# Top 25 hashtags
-top25_hashtags = html.Div(children=[
-    html.Span(html.H5(children='Top 25 Popular Hashtags'), style={'text-align': 'center'}),
-    dcc.Graph(
-        id='top25_hashtags',
-        figure=go.Figure(data=go.Bar(y=hashtag_counts_df['count'],
-                                     x=hashtag_counts_df['hashtag'],
-                                     marker_color='#07889b'
-                                     ),
-                         layout=go.Layout(hovermode='closest',
-                                          xaxis={'tickangle': -60}, yaxis={'title': 'number of times tweeted'},
-                                          font={'family': 'Arial'}, margin=dict(l=50, r=50, t=20, b=20)
-                                          )),
-    )], className="six columns", style={'padding-top': '10px', 'padding-right': '50px', 'padding-bottom': '50px', 'padding-left': '50px'})
-
-
-# Average number of tweets by time of day (EST)
-
-tweet_volume_hourly = html.Div(children=[
-    dcc.Graph(
-        id='tweet_volume_by_hour',
-        figure={'data': [{'x': [hour_dict[x] for x in average_number_of_tweets_per_hour.index.tolist()],
-                          'y': [int(item) for item in average_number_of_tweets_per_hour.values],
-                          'type': 'line', 'hovertext': 'tweets'},
-                         ],
-                'layout': {'title': 'Average Tweet Volume by Time of Day (Eastern Standard Time)', 'xaxis': {'tickangle': -60}}
-                }),
-    html.Span(children=[html.P('When does the conversation happen across Canada?')], style={'text-align': 'center'}),
-], className="six columns", style={'padding-bottom': '50px'})
-
-# Top external links
-top10_links = html.Div([
-    html.H5(children='Top 10 External Links'),
-    html.Span(children=[html.P('What are people sharing on Twitter?')]),
-    html.Div(children=[dash_table.DataTable(id='top10_links',
-                                            columns=[{"name": i, "id": i} for i in links_df.columns],
-                                            data=links_df.to_dict('records'),
-                                            style_table={'overflowX': 'scroll'},
-                                            style_cell={'height': 'auto', 'minWidth': '0px', 'Width': '500px', 'whiteSpace': 'normal',
-                                                        'font-family': "Arial", 'font-size': 14, 'text-align': 'left'},
-                                            style_as_list_view=True,
-                                            style_header={'backgroundColor': HEADER_COLOR, 'fontWeight': 'bold'}
-                                            )],
-             style={'overflowX': 'scroll', 'Width': '2000px', 'Height': '400px', 'font-family': 'Open Sans'}
-             ),
-],  className="six columns",
-    style={'padding-top': '0px', 'padding-right': '5px', 'padding-bottom': '50px', 'padding-left': '20px'})
-
-
-# Top 10 domains linked
-
-top10_domains = html.Div(children=[
-    html.Span(html.H5(children='Top 10 External Domains'), style={'text-align': 'center'}),
-    dcc.Graph(id='top10_domains',
-              figure=go.Figure(data=go.Bar(y=domains_df['domain'], x=domains_df['count'], orientation='h',
-                                           marker_color='#07889B'
-                                           ),
-                               layout=go.Layout(hovermode='closest',
-                                                xaxis={'title': 'times linked'}, yaxis={'autorange': 'reversed'},
-                                                font={'family': 'Arial', 'size': 14},
-                                                margin=dict(l=25, r=50, t=20, b=0), height=350
-                                                )),
-              ),
-    html.Span(children=[html.P('Which websites do people link to the most?')], style={'text-align': 'center'})
-], className="six columns", style={'height': '400px'})
 
 header_politician = html.Div(children=[html.H3(children='Breakdown by Political Party Leader')], style={'padding-left': '50px', 'padding-top': '20px', 'padding-bottom': '20px'})
 
+
 # POLITICAL PARTY LEADERS
 
-leader_id_cards = []
-leader_profile = {}
-
-for leader in LEADER_USERNAMES:
-    user = api.get_user(leader)
-    leader_profile[leader] = user
-    leader_id_cards.append(html.Div([
-        html.P([html.B([user.name])]),
-        html.Img(src=user.profile_image_url.replace('_normal', ''), style={'max-width': '50%'}),
-        html.P("Location: {}".format(user.location)),
-        html.P("Followers: {}".format(user.followers_count)),
-        html.P("Tweets: {}".format(user.statuses_count)),
-    ], className="two columns", style={'padding-left': '50px', 'font-family': 'system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Ubuntu, "Helvetica Neue", sans-serif;'}))
-
-
-# Graph: Tweet volume by political party leader over time
-leader_tweet_volume = html.Div([
-    dcc.Graph(id='graph-with-slider'),
-    dcc.RangeSlider(id='day-slider',
-                    min=leader_df['days_until_election'].min(), max=leader_df['days_until_election'].max(),
-                    value=[leader_df['days_until_election'].min(), leader_df['days_until_election'].max()],
-                    marks={str(day): {'label': str(-day), 'style': {"transform": "rotate(-90deg)", 'fontSize': 10}} for day in sorted([x for x in leader_df['days_until_election'].unique() if x % 5 == 0])},
-                    step=None
-                    )
-], style={'padding-left': '50px', 'padding-right': '50px', 'padding-top': '50px', 'padding-bottom': '20px'})
+def leader_id_cards():
+    # rebuilt on every page load so refreshed profiles show up without a restart
+    cards = []
+    for leader in LEADER_USERNAMES:
+        user = leader_profiles.get(leader)
+        cards.append(html.Div([
+            html.P([html.B([user['name']])]),
+            html.Img(src=user['profile_image_url'], style={'max-width': '50%'}),
+            html.P("Location: {}".format(user['location'])),
+            html.P("Followers: {}".format(user['followers_count'])),
+            html.P("Tweets: {}".format(user['statuses_count'])),
+        ], className="two columns", style={'padding-left': '50px', 'font-family': 'system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Ubuntu, "Helvetica Neue", sans-serif;'}))
+    return cards
 
 
 # Header for hashtags by politicians
 hashtags_politician_header = html.Div(children=[html.H3(children='Top 10 Hashtags by Political Party Leader')], style={'padding-left': '50px', 'padding-top': '50px', 'padding-bottom': '10px'})
 
 
-# What are the politicians tweeting about? (hashtags)
-hashtag_leader_cards = []
-for leader in LEADER_USERNAMES:
-    hashtag_leader_cards.append(html.Div([html.P(children=[leader]),
-                                          html.Div(children=[dash_table.DataTable(id='top_hashtags_by_leader_{}'.format(leader),
-                                                columns=[{"name": i, "id": i} for i in ['hashtag', 'count']],
-                                                data=leader_hashtag_counts[leader].to_dict('records'),
-                                                style_table={'overflowX': 'scroll'},
-                                                style_cell={'height': 'auto', 'minWidth': '0px', 'maxWidth': '90px', #'whiteSpace': 'normal',
-                                                            'font-family': "Arial", 'font-size': 14},
-                                                style_cell_conditional=[{'if': {'column_id': 'count'}, 'width': '20%'}],
-                                                style_as_list_view=True,
-                                                style_header={'backgroundColor': color_dict[leader],
-                                                              'fontWeight': 'bold', 'font-color': 'white'}
-                                                )], style={'overflowX': 'scroll', 'Height': '400px', 'font-family': 'Open Sans', 'maxWidth':'200px'}
-                                                   )
-                                          ], style={'padding-left': '25px'}, className="two columns",))
-
-
 # Table: Top 10 tweets by leader by likes
 top10_tweets_by_leader_likes = html.Div([
     html.H5(children='Top 10 tweets by Leader, by Favorites'),
@@ -322,6 +81,7 @@ top10_tweets_by_leader_likes = html.Div([
                  value=1,
                  ),
     dash_table.DataTable(id='leader-likes-graph', columns=[{"name": i, "id": i} for i in ['day', 'text', 'favorites']],
+                         page_action='custom', page_current=0, page_size=10,  # pages served by update_leader_likes
                          style_table={'overflowX': 'scroll'},
                          style_cell={'height': 'auto',
                                      'minWidth': '100px', 'Width': '500px', 'whiteSpace': 'normal',
@@ -340,6 +100,7 @@ top10_tweets_by_leader_retweets = html.Div([
                  value=1,
                  ),
     dash_table.DataTable(id='leader-retweets-graph', columns=[{"name": i, "id": i} for i in ['day', 'text', 'retweets']],
+                         page_action='custom', page_current=0, page_size=10,  # pages served by update_leader_retweets
                          style_table={'overflowX': 'scroll'},
                          style_cell={'height': 'auto', 'minWidth': '100px', 'Width': '500px', 'whiteSpace': 'normal',
                                      'font-family': "Arial", 'font-size': 14
@@ -350,13 +111,34 @@ top10_tweets_by_leader_retweets = html.Div([
 ], style={'padding-left': '50px', 'padding-right': '50px', 'padding-top': '50px', 'padding-bottom': '20px'})
 
 
+# NLP results are only unpickled, once per worker, when a visitor opens the named entity panels
+@functools.lru_cache(maxsize=1)
+def load_named_entities():
+    with open('nlp_results/named_entities.pkl', 'rb') as f:
+        return pickle.load(f).head(20)
+
+
+@functools.lru_cache(maxsize=1)
+def load_politician_entities():
+    """
+    Top entities per leader as [username, entity, count], written by named_entity_resolution.py; counted from the
+    leaders' tweets in df_politician.pkl when only an older run's output is there
+    """
+    if os.path.isfile('nlp_results/leader_entities.pkl'):
+        with open('nlp_results/leader_entities.pkl', 'rb') as f:
+            return pickle.load(f)
+    with open('nlp_results/df_politician.pkl', 'rb') as f:
+        df_politician = pickle.load(f).head(10)
+    return pd.DataFrame([(leader, entity, count) for leader, entities in df_politician.groupby('username')['named_entity']
+                         for entity, count in Counter(e for tweet in entities for e in tweet).most_common(10)],
+                        columns=['username', 'entity', 'count'])
+
+
 # Table: Named entity detection
-entity_df = pickle.load(open('nlp_results/named_entities.pkl', 'rb')).head(20)
 top10_named_entities = html.Div([
     html.H5(children='Top 20 Most Common Named Entities'),
     html.P(children='* Entities extracted with natural language methods; performance is variable'),
     dash_table.DataTable(id='common-entities', columns=[{"name": i, "id": i} for i in ['entity', 'count']],
-                         data=entity_df.to_dict('records'),
                          style_table={'overflowX': 'scroll'},
                          style_cell={'height': 'auto', 'maxHeight': '300px', 'minWidth': '100px', 'Width': '500px', 'whiteSpace': 'normal',
                                      'font-family': "Arial", 'font-size': 14
@@ -368,7 +150,7 @@ top10_named_entities = html.Div([
 
 
 # Table: Named entity detection broken down by politician
-entity_leader_df = pickle.load(open('nlp_results/df_politician.pkl', 'rb')).head(10)
+ENTITY_VERSION = fingerprint_files(['nlp_results/leader_entities.pkl', 'nlp_results/df_politician.pkl'])  # not part of the dashboard snapshot
 named_entities_by_leader = html.Div([
     html.H5(children='Most Common Named Entities Mentioned by Leader'),
     html.P(children='* Entities extracted with natural language methods; performance is variable'),
@@ -387,6 +169,37 @@ named_entities_by_leader = html.Div([
                          ),
 ], style={'padding-right': '50px', 'padding-top': '50px', 'padding-bottom': '20px'}, className="six columns")
 
+entity_panels = html.Div([
+    html.Button('Show named entities', id='show-entities', n_clicks=0, style={'margin-left': '50px'}),
+    html.Div(id='entity-panels', children=[top10_named_entities, named_entities_by_leader], className="row",
+             style={'display': 'none'}),
+])
+
+
+# Keyword search over every tweet (python search_index.py), the index is memory-mapped on the first search
+SEARCH_INDEX_VERSION = fingerprint_files([os.path.join(SEARCH_INDEX_PATH, 'manifest.json')])
+
+
+@functools.lru_cache(maxsize=1)
+def load_keyword_index():
+    return load_search_index()
+
+
+keyword_search = html.Div([
+    html.H3(children='Search the Conversation'),
+    dcc.Input(id='search-query', type='text', placeholder='e.g. climate change', debounce=True),
+    html.P(id='search-summary'),
+    dcc.Graph(id='search-volume-graph', figure={'data': [], 'layout': {'title': 'Tweets mentioning the search terms'}}),
+    dash_table.DataTable(id='search-samples', columns=[{"name": i, "id": i} for i in ['day', 'username', 'text']],
+                         style_table={'overflowX': 'scroll'},
+                         style_cell={'height': 'auto', 'maxHeight': '300px', 'minWidth': '100px', 'Width': '500px', 'whiteSpace': 'normal',
+                                     'font-family': "Arial", 'font-size': 14
+                                     },
+                         style_as_list_view=True,
+                         style_header={'backgroundColor': HEADER_COLOR, 'fontWeight': 'bold'}
+                         ),
+], style={'padding-left': '50px', 'padding-right': '50px', 'padding-top': '50px', 'padding-bottom': '20px'})
+
 
 # Top header
 footer = html.Div(children=[
@@ -396,42 +209,348 @@ footer = html.Div(children=[
 ], style={'padding-left': '50px'})
 
 
+# Everything drawn from the snapshot (python dashboard_snapshot.py), built once per snapshot version off the request path
+def build_snapshot_sections(snapshot):
+    aggregates = snapshot.tables
+    tweet_volume_df = aggregates['tweet_volume_df']
+    top10_accounts_by_tweets_df = aggregates['top10_accounts_by_tweets_df']
+    mentions_df = aggregates['mentions_df']
+    top10_accounts_faves_df = aggregates['top10_accounts_faves_df']
+    top10_accounts_retweets_df = aggregates['top10_accounts_retweets_df']
+    retweet_df = aggregates['retweet_df']
+    favorites_df = aggregates['favorites_df']
+    hashtag_counts_df = aggregates['hashtag_counts_df']
+    average_number_of_tweets_per_hour = aggregates['average_number_of_tweets_per_hour']
+    links_df = aggregates['links_df']
+    domains_df = aggregates['domains_df']
+    leader_cube = snapshot.leader_cube
+    leader_hashtag_counts = aggregates['leader_hashtag_counts']
+
+    # Overview constants
+    MIN_DATE = aggregates['overview']['min_date']
+    MAX_DATE = aggregates['overview']['max_date']
+    TOTAL_NUM_TWEETS = aggregates['overview']['total_num_tweets']
+    NUM_TWEETERS = aggregates['overview']['num_tweeters']
+    NUM_HASHTAGS = aggregates['overview']['num_hashtags']
+
+    # Graph: volume of tweets over time
+    tweet_volume_df = tweet_volume_df.iloc[downsample_indices(tweet_volume_df['num_tweets'])]
+    volume_graph = html.Div(children=[
+        dcc.Graph(id='example-graph',
+                  figure={'data': [{'x': tweet_volume_df.index, 'y': tweet_volume_df['num_tweets'],  'type': 'line',
+                                    'hover_name': tweet_volume_df.index, 'hovertext': tweet_volume_df['day_of_week'],}
+                                   ],
+                          'layout': {'title': 'Tweets about Canadian Politics from July - October 2019'}
+                          })], className="six columns")
+
+    # Table: General overview stats
+    overview_stats = html.Div(children=[
+        html.H1(children='Overview'),
+        html.P(html.Span(children=[html.B('Date range: '), '{} to {}'.format(MIN_DATE, MAX_DATE)])),
+        html.P(html.Span(children=[html.B('Criteria: '), 'tweets in any language containing the official hashtags ',
+                                   '#cdnpoli, #elxn43, #polcan, #ItsOurVote, #CestNotreVote,', ' or tweets from official party leaders ',
+                                   html.A('@JustinTrudeau', href='http://www.twitter.com/JustinTrudeau', target='_blank'), ', ',
+                                   html.A('@AndrewScheer', href='http://www.twitter.com/AndrewScheer', target='_blank'),  ', ',
+                                   html.A('@ElizabethMay', href='http://www.twitter.com/ElizabethMay', target='_blank'), ', ',
+                                   html.A('@theJagmeetSingh', href='http://www.twitter.com/theJagmeetSingh', target='_blank'), ', ',
+                                   # html.A('@MaximeBernier', href='http://www.twitter.com/AndrewScheer', target='_blank'), ', ',
+                                   html.A('@yfblanchet', href='http://www.twitter.com/yfblanchet', target='_blank'),
+                                   ])),
+        html.P(html.Span(children=[html.B('Total number of tweets: '), TOTAL_NUM_TWEETS])),
+        html.P(html.Span(children=[html.B('Number of distinct tweeters: '), NUM_TWEETERS])),
+        html.Span(children=[html.B('Number of distinct hashtags: '), NUM_HASHTAGS]),
+    ], className="six columns")
+
+
+    # Graph: Top 10 Accounts by Tweet Volume
+    top10_accounts_by_tweets = html.Div(children=[
+        dcc.Graph(id='top10_accounts_by_tweets',
+                  figure=go.Figure(data=go.Bar(y=top10_accounts_by_tweets_df.index.tolist(),
+                                               x=top10_accounts_by_tweets_df['username'], # this is actually count
+                                               orientation='h',
+                                               marker_color='#07889B'
+                                               ),
+                                   layout=go.Layout(title='Top 10 Accounts by Number of Tweets',
+                                                    hovermode='closest',
+                                                    xaxis={'title': 'number of tweets'}, yaxis={'autorange': 'reversed'},
+                                                    font={'family': 'Arial', 'size': 14}
+                                                    )),
+                  ), html.Span(children=[html.P('Who talks the most?')], style={'text-align': 'center'})],
+        className="six columns")
+
+    # Graph: Top 10 mentions by Twitter handles
+    top10_mentions = html.Div(children=[
+        dcc.Graph(id='top10_mentions',
+                  figure=go.Figure(data=go.Bar(y=mentions_df['mentions'], x=mentions_df['count'], orientation='h',
+                                               marker_color='#51abb9'
+                                               ),
+                                   layout=go.Layout(title='Top 10 Accounts @Mentioned',
+                                                    hovermode='closest',
+                                                    xaxis={'title': 'user', 'tickangle': -60},
+                                                    yaxis={'title': 'times mentioned', 'autorange': 'reversed'},
+                                                    font={'family': 'Arial', 'size': 14}
+                                                    )),
+                  ), html.Span(children=[html.P('Who do people talk to/about the most?')], style={'text-align': 'center'})
+    ], className="six columns")
+
+
+    #  Graph: Top 10 Accounts by Favorites
+    top10_accounts_by_faves = html.Div(children=[
+        dcc.Graph(id='top10_accounts_by_faves',
+                  figure=go.Figure(data=go.Bar(
+                      y=top10_accounts_faves_df.index.tolist(),
+                      x=top10_accounts_faves_df['favorites'],
+                      marker_color=HEADER_COLOR,
+                      orientation='h'),
+                      layout=go.Layout(title='Top 10 Accounts by Favourites',
+                                       hovermode='closest',
+                                       xaxis={'title': 'times tweets favourited by others'},
+                                       yaxis={'autorange': 'reversed'},
+                                       font={'family': 'Arial', 'size': 14}
+                                       )),
+                  ),
+        html.Span(children=[html.P('This graph aims to capture tweeters who tweet highly-faved Canadian political content.')],
+                  style={'text-align': 'center'})
+    ], className="six columns")
+
+    # Graph: Top 10 Accounts by Retweets
+    top10_accounts_by_retweets = html.Div(children=[
+        dcc.Graph(id='top10_accounts_by_retweets',
+                  figure=go.Figure(data=go.Bar(
+                      y=top10_accounts_retweets_df.index.tolist(),
+                      x=top10_accounts_retweets_df['retweets'],
+                      marker_color='#b4dbe1',
+                      orientation='h'),
+                      layout=go.Layout(title='Top 10 Accounts by Retweets',
+                                       hovermode='closest',
+                                       xaxis={'title': 'times tweets retweeted by others'},
+                                       yaxis={'autorange': 'reversed'},
+                                       font={'family': 'Arial', 'size': 14}
+                                       )),
+                  ),
+        html.Span(children=[html.P('This graph captures people who tweet highly-retweeted Canadian political content.')],
+                  style={'text-align': 'center'})
+    ], className="six columns")
+
+    # Graph: Top 10 Accounts by Retweets
+    top10_tweets_by_retweets = html.Div([
+        html.H5(children='Top 10 tweets by retweets'),
+        html.Div(children=[dash_table.DataTable(id='top10_tweets_by_retweets',
+                                                columns=[{"name": i, "id": i} for i in retweet_df.columns],
+                                                style_table={'overflowX': 'scroll'},
+                                                style_cell={'height': 'auto',
+                                                            'minWidth': '0px', 'Width': '500px',
+                                                            'whiteSpace': 'normal',
+                                                            'font-family': "Arial",
+                                                            'font-size': 14
+                                                            },
+                                                style_as_list_view=True,
+                                                style_header={'backgroundColor': HEADER_COLOR, 'fontWeight': 'bold'}
+                                                )],
+                 style={'overflowX': 'scroll', 'Width': '2000px', 'Height': '400px', 'font-family': 'Open Sans'}
+                 )],
+        style={'padding-top': '50px', 'padding-right': '50px', 'padding-bottom': '50px', 'padding-left': '50px'})
+
+    top10_tweets_by_favorites = html.Div([
+        html.H5(children='Top 10 tweets by favorites'),
+        html.Div(children=[dash_table.DataTable(id='top10_tweets_by_favorites',
+                                                columns=[{"name": i, "id": i} for i in favorites_df.columns],
+                                                style_table={'overflowX': 'scroll'},
+                                                style_cell={'height': 'auto',
+                                                            'minWidth': '0px', 'Width': '500px',
+                                                            'whiteSpace': 'normal',
+                                                            'font-family': "Arial", 'font-size': 14
+                                                            },
+                                                style_as_list_view=True,
+                                                style_header={'backgroundColor': HEADER_COLOR,
+                                                              'fontWeight': 'bold'})],
+                 style={'overflowX': 'scroll', 'Width': '2000px', 'Height': '400px', 'font-family': 'Open Sans'}
+                 )],
+        style={'padding-top': '10px', 'padding-right': '50px', 'padding-bottom': '50px', 'padding-left': '50px'})
+
+    # Top 25 hashtags
+    top25_hashtags = html.Div(children=[
+        html.Span(html.H5(children='Top 25 Popular Hashtags'), style={'text-align': 'center'}),
+        dcc.Graph(
+            id='top25_hashtags',
+            figure=go.Figure(data=go.Bar(y=hashtag_counts_df['count'],
+                                         x=hashtag_counts_df['hashtag'],
+                                         marker_color='#07889b'
+                                         ),
+                             layout=go.Layout(hovermode='closest',
+                                              xaxis={'tickangle': -60}, yaxis={'title': 'number of times tweeted'},
+                                              font={'family': 'Arial'}, margin=dict(l=50, r=50, t=20, b=20)
+                                              )),
+        )], className="six columns", style={'padding-top': '10px', 'padding-right': '50px', 'padding-bottom': '50px', 'padding-left': '50px'})
+
+
+    # Average number of tweets by time of day (EST)
+
+    tweet_volume_hourly = html.Div(children=[
+        dcc.Graph(
+            id='tweet_volume_by_hour',
+            figure={'data': [{'x': [hour_dict[x] for x in average_number_of_tweets_per_hour.index.tolist()],
+                              'y': [int(item) for item in average_number_of_tweets_per_hour.values],
+                              'type': 'line', 'hovertext': 'tweets'},
+                             ],
+                    'layout': {'title': 'Average Tweet Volume by Time of Day (Eastern Standard Time)', 'xaxis': {'tickangle': -60}}
+                    }),
+        html.Span(children=[html.P('When does the conversation happen across Canada?')], style={'text-align': 'center'}),
+    ], className="six columns", style={'padding-bottom': '50px'})
+
+    # Top external links
+    top10_links = html.Div([
+        html.H5(children='Top 10 External Links'),
+        html.Span(children=[html.P('What are people sharing on Twitter?')]),
+        html.Div(children=[dash_table.DataTable(id='top10_links',
+                                                columns=[{"name": i, "id": i} for i in links_df.columns],
+                                                data=links_df.to_dict('records'),
+                                                style_table={'overflowX': 'scroll'},
+                                                style_cell={'height': 'auto', 'minWidth': '0px', 'Width': '500px', 'whiteSpace': 'normal',
+                                                            'font-family': "Arial", 'font-size': 14, 'text-align': 'left'},
+                                                style_as_list_view=True,
+                                                style_header={'backgroundColor': HEADER_COLOR, 'fontWeight': 'bold'}
+                                                )],
+                 style={'overflowX': 'scroll', 'Width': '2000px', 'Height': '400px', 'font-family': 'Open Sans'}
+                 ),
+    ],  className="six columns",
+        style={'padding-top': '0px', 'padding-right': '5px', 'padding-bottom': '50px', 'padding-left': '20px'})
+
+
+    # Top 10 domains linked
+
+    top10_domains = html.Div(children=[
+        html.Span(html.H5(children='Top 10 External Domains'), style={'text-align': 'center'}),
+        dcc.Graph(id='top10_domains',
+                  figure=go.Figure(data=go.Bar(y=domains_df['domain'], x=domains_df['count'], orientation='h',
+                                               marker_color='#07889B'
+                                               ),
+                                   layout=go.Layout(hovermode='closest',
+                                                    xaxis={'title': 'times linked'}, yaxis={'autorange': 'reversed'},
+                                                    font={'family': 'Arial', 'size': 14},
+                                                    margin=dict(l=25, r=50, t=20, b=0), height=350
+                                                    )),
+                  ),
+        html.Span(children=[html.P('Which websites do people link to the most?')], style={'text-align': 'center'})
+    ], className="six columns", style={'height': '400px'})
+
+
+    # Graph: Tweet volume by political party leader over time
+    leader_tweet_volume = html.Div([
+        dcc.Graph(id='graph-with-slider'),
+        dcc.RangeSlider(id='day-slider',
+                        min=leader_cube.first_day, max=leader_cube.last_day,
+                        value=[leader_cube.first_day, leader_cube.last_day],
+                        marks={str(day): {'label': str(-day), 'style': {"transform": "rotate(-90deg)", 'fontSize': 10}} for day in leader_cube.active_days() if day % 5 == 0},
+                        step=None
+                        )
+    ], style={'padding-left': '50px', 'padding-right': '50px', 'padding-top': '50px', 'padding-bottom': '20px'})
+
+
+    # What are the politicians tweeting about? (hashtags)
+    hashtag_leader_cards = []
+    for leader in LEADER_USERNAMES:
+        hashtag_leader_cards.append(html.Div([html.P(children=[leader]),
+                                              html.Div(children=[dash_table.DataTable(id='top_hashtags_by_leader_{}'.format(leader),
+                                                    columns=[{"name": i, "id": i} for i in ['hashtag', 'count']],
+                                                    data=leader_hashtag_counts[leader].to_dict('records'),
+                                                    style_table={'overflowX': 'scroll'},
+                                                    style_cell={'height': 'auto', 'minWidth': '0px', 'maxWidth': '90px', #'whiteSpace': 'normal',
+                                                                'font-family': "Arial", 'font-size': 14},
+                                                    style_cell_conditional=[{'if': {'column_id': 'count'}, 'width': '20%'}],
+                                                    style_as_list_view=True,
+                                                    style_header={'backgroundColor': color_dict[leader],
+                                                                  'fontWeight': 'bold', 'font-color': 'white'}
+                                                    )], style={'overflowX': 'scroll', 'Height': '400px', 'font-family': 'Open Sans', 'maxWidth':'200px'}
+                                                       )
+                                              ], style={'padding-left': '25px'}, className="two columns",))
+
+    return {
+        'volume_graph': volume_graph,
+        'overview_stats': overview_stats,
+        'top10_accounts_by_tweets': top10_accounts_by_tweets,
+        'top10_mentions': top10_mentions,
+        'top10_accounts_by_faves': top10_accounts_by_faves,
+        'top10_accounts_by_retweets': top10_accounts_by_retweets,
+        'top10_tweets_by_retweets': top10_tweets_by_retweets,
+        'top10_tweets_by_favorites': top10_tweets_by_favorites,
+        'top25_hashtags': top25_hashtags,
+        'tweet_volume_hourly': tweet_volume_hourly,
+        'top10_links': top10_links,
+        'top10_domains': top10_domains,
+        'leader_tweet_volume': leader_tweet_volume,
+        'hashtag_leader_cards': hashtag_leader_cards,
+    }
+
+
+# Swapped for a new snapshot version by a background watcher; callbacks read live_snapshot.current() once per call
+live_snapshot = LiveSnapshot(prepare=build_snapshot_sections)
+print("Loaded dashboard snapshot {}".format(live_snapshot.current().version))
+
+
+@server.route('/snapshot')
+def snapshot_status():
+    return flask.jsonify(live_snapshot.status())
+
+
+# Callback latency / response size / errors on /metrics; SLOW_CALLBACK_SECONDS sets the slow callback log threshold
+metrics = instrument_dash_app(app, slow_callback_seconds=float(os.environ.get('SLOW_CALLBACK_SECONDS', 1.0)))
+metrics.add_gauge('dashboard_snapshot_reload_seconds', lambda: live_snapshot.reload_seconds or 0,
+                  'Time the last hot reload of the dashboard snapshot took')
+metrics.add_gauge('dashboard_snapshot_reloads', lambda: live_snapshot.num_reloads,
+                  'Dashboard snapshots hot-reloaded by this worker')
+
+
 # Main container
-app.layout = html.Div([
-    header,
-    html.Div(children=[volume_graph, overview_stats], className="row"),
-    html.Div(children=[top10_accounts_by_tweets, top10_mentions], className="row"),
-    html.Div(children=[top10_accounts_by_faves, top10_accounts_by_retweets], className="row"),
-    top10_tweets_by_retweets,
-    top10_tweets_by_favorites,
-    html.Div(children=[top25_hashtags, tweet_volume_hourly], className="row"),
-    html.Div(children=[top10_links, top10_domains], className="row"),
-    header_politician,
-    html.Div(children=leader_id_cards, className="row"),
-    leader_tweet_volume,
-    hashtags_politician_header,
-    html.Div(children=hashtag_leader_cards, className="row"),
-    top10_tweets_by_leader_likes,
-    top10_tweets_by_leader_retweets,
-    html.Div(children=[top10_named_entities, named_entities_by_leader], className="row"),
-    footer
-
-], style={'padding-left': '50px', 'padding-right': '50px', 'padding-top': '50px', 'padding-bottom': '50px'})
+def serve_layout():
+    sections = live_snapshot.current().prepared
+    return html.Div([
+        dcc.Location(id='url', refresh=False),
+        header,
+        html.Div(children=[sections['volume_graph'], sections['overview_stats']], className="row"),
+        html.Div(children=[sections['top10_accounts_by_tweets'], sections['top10_mentions']], className="row"),
+        html.Div(children=[sections['top10_accounts_by_faves'], sections['top10_accounts_by_retweets']], className="row"),
+        sections['top10_tweets_by_retweets'],
+        sections['top10_tweets_by_favorites'],
+        html.Div(children=[sections['top25_hashtags'], sections['tweet_volume_hourly']], className="row"),
+        html.Div(children=[sections['top10_links'], sections['top10_domains']], className="row"),
+        header_politician,
+        html.Div(children=leader_id_cards(), className="row"),
+        sections['leader_tweet_volume'],
+        hashtags_politician_header,
+        html.Div(children=sections['hashtag_leader_cards'], className="row"),
+        top10_tweets_by_leader_likes,
+        top10_tweets_by_leader_retweets,
+        entity_panels,
+        keyword_search,
+        footer
+    ], style={'padding-left': '50px', 'padding-right': '50px', 'padding-top': '50px', 'padding-bottom': '50px'})
+
+
+app.layout = serve_layout
+# serialized + compressed once per snapshot / leader profile version, with an ETag
+serve_cached_layout(app, lambda: (live_snapshot.current().version, leader_profiles.version()))
 
 
 # CALLBACKS
 @app.callback(
     Output('graph-with-slider', 'figure'),
     [Input('day-slider', 'value')])
+@memoize_callback(lambda: live_snapshot.current().version)
 def update_figure(selected_day):
-    filtered_leader_df = leader_df[(leader_df.days_until_election >= selected_day[0]) & (leader_df.days_until_election <= selected_day[1])]
+    leader_cube = live_snapshot.current().leader_cube
     traces = []
-    for i in filtered_leader_df.username.unique():
-        df_by_leader = filtered_leader_df[filtered_leader_df['username'] == i]
+    totals = leader_cube.totals(*selected_day)
+    for i, total in zip(LEADER_USERNAMES, totals):
+        if not total:  # no tweets from this leader in the range
+            continue
+        days, counts = leader_cube.series(i, *selected_day)
+        keep = downsample_indices(counts)
+        days, counts = [days[k] for k in keep], [counts[k] for k in keep]
         traces.append(go.Scatter(
-            x=df_by_leader.groupby(['day'])['day'].count().index.tolist(),
-            y=df_by_leader.groupby(['day'])['day'].count(),
-            text=df_by_leader['username'],
+            x=days,
+            y=counts,
+            text=[i] * len(days),
             mode='lines+markers',
             opacity=0.7,
             marker={'size': 7, 'line': {'width': 0.5, 'color': 'white'}, 'color': color_dict[i]},
@@ -451,28 +570,95 @@ def update_figure(selected_day):
     }
 
 
-@app.callback(Output('leader-likes-graph', 'data'), [Input('leader-likes-dd', 'value')])
-def update_leader_likes(leader):
-    filtered_leader_df = leader_df[(leader_df['username'] == leader)].sort_values(by=['favorites'], ascending=False)[['day', 'text', 'favorites']].head(10).sort_values(by=['favorites'], ascending=False)
-    return filtered_leader_df.to_dict('records')
+@app.callback([Output('top10_tweets_by_retweets', 'data'), Output('top10_tweets_by_favorites', 'data')],
+              [Input('url', 'pathname')])
+def load_top_tweets(pathname):
+    # sent after the first page render instead of inlined in the layout
+    tables = live_snapshot.current().tables
+    return tables['retweet_df'].to_dict('records'), tables['favorites_df'].to_dict('records')
+
+
+@app.callback([Output('entity-panels', 'style'), Output('common-entities', 'data')],
+              [Input('show-entities', 'n_clicks')])
+def show_entity_panels(n_clicks):
+    if not n_clicks:
+        return {'display': 'none'}, []
+    return {}, load_named_entities().to_dict('records')
 
 
-@app.callback(Output('leader-retweets-graph', 'data'), [Input('leader-retweets-dd', 'value')])
-def update_leader_retweets(leader):
-    filtered_leader_df = leader_df[(leader_df['username'] == leader)].sort_values(by=['retweets'], ascending=False)[['day', 'text', 'retweets']].head(10).sort_values(by=['retweets'], ascending=False)
-    return filtered_leader_df.to_dict('records')
+def top_leader_tweets(leader, col, page_current=0, page_size=10):
+    # one page of the leader's tweets ranked by col, sliced from the pre-sorted index in the snapshot
+    if leader not in LEADER_USERNAMES:  # the dropdowns start without a selection
+        return []
+    snapshot = live_snapshot.current()
+    start = (page_current or 0) * page_size
+    rows = snapshot.leader_rankings[col].rows(leader, start, start + page_size)
+    return snapshot.leader.frame(['day', 'text', col], rows).to_dict('records')
+
+
+@app.callback(Output('leader-likes-graph', 'data'),
+              [Input('leader-likes-dd', 'value'), Input('leader-likes-graph', 'page_current'),
+               Input('leader-likes-graph', 'page_size')])
+@memoize_callback(lambda: live_snapshot.current().version)
+def update_leader_likes(leader, page_current, page_size):
+    return top_leader_tweets(leader, 'favorites', page_current, page_size)
+
+
+@app.callback(Output('leader-retweets-graph', 'data'),
+              [Input('leader-retweets-dd', 'value'), Input('leader-retweets-graph', 'page_current'),
+               Input('leader-retweets-graph', 'page_size')])
+@memoize_callback(lambda: live_snapshot.current().version)
+def update_leader_retweets(leader, page_current, page_size):
+    return top_leader_tweets(leader, 'retweets', page_current, page_size)
 
 
 @app.callback(Output('common-entities-leader', 'data'), [Input('leader-entities-dd', 'value')])
-def update_leader_retweets(leader):
-    filtered_leader_df = entity_leader_df[entity_leader_df['username'] == leader] #.sort_values(by=['retweets'], ascending=False)[['day', 'text', 'retweets']].head(10).sort_values(by=['retweets'], ascending=False)
-    # parse out entities
-    entity_count = filtered_leader_df['named_entity'].tolist()
-    entity_count = [i for j in entity_count for i in j]
-    leader_entities_df = pd.DataFrame(Counter(entity_count).most_common(10), columns=['entity', 'count'])
+@memoize_callback(lambda: ENTITY_VERSION)
+def update_leader_entities(leader):
+    if leader not in LEADER_USERNAMES:  # nothing selected yet, don't load the entities
+        return []
+    entity_leader_df = load_politician_entities()
+    leader_entities_df = entity_leader_df[entity_leader_df['username'] == leader][['entity', 'count']].head(10)
     return leader_entities_df.to_dict('records')
 
 
+@app.callback([Output('search-summary', 'children'), Output('search-volume-graph', 'figure'),
+               Output('search-samples', 'data')],
+              [Input('search-query', 'value')])
+@memoize_callback(lambda: SEARCH_INDEX_VERSION)
+def search_tweets(query):
+    figure = {'data': [], 'layout': {'title': 'Tweets mentioning the search terms'}}
+    if not query:
+        return '', figure, []
+    index = load_keyword_index()
+    if index is None:
+        return 'Search is not available yet: the search index has not been built.', figure, []
+    result = index.search(query)
+    figure['data'] = [{'x': [str(day) for day in result['days']], 'y': result['counts'].tolist(), 'type': 'line',
+                       'marker': {'color': '#07889B'}}]
+    figure['layout']['title'] = 'Tweets mentioning {}'.format(' + '.join(result['terms']) or query)
+    summary = '{:,} tweets contain {}'.format(result['num_tweets'], ', '.join(result['terms']) or 'no searchable words')
+    if result['dropped']:
+        summary += ' (ignored: {})'.format(', '.join(result['dropped']))
+    return summary, figure, [{k: sample[k] for k in ['day', 'username', 'text']} for sample in result['samples']]
+
+
+def start_background_threads():
+    leader_profiles.start_background_refresh()
+    live_snapshot.start_watcher()
+
+
+# gunicorn -c gunicorn.conf.py imports this module once in the master and forks the workers from it: the snapshot, its
+# memory-mapped leader columns and the NLP results are then shared copy-on-write instead of loaded by every worker.
+# Threads don't survive fork(), so in that mode the post_fork hook starts them in each worker.
+if os.environ.get('DASHBOARD_PRELOAD'):
+    load_named_entities()
+    load_politician_entities()
+    load_keyword_index()
+else:
+    start_background_threads()
+
+
 if __name__ == '__main__':
     app.run_server(host='0.0.0.0', port=8050)
     #app.run_server()
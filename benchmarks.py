@@ -0,0 +1,470 @@
+# python benchmarks.py tweet_store
+import datetime
+import multiprocessing
+import os
+import resource
+from time import time
+
+import numpy as np
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_measured(func, args, queue):
+    rss_before = _peak_rss_mb()
+    start = time()
+    result = func(*args)
+    elapsed = time() - start
+    frame_mb = result.memory_usage(deep=True).sum() / 1024 ** 2 if hasattr(result, 'memory_usage') else None
+    queue.put({'seconds': elapsed, 'peak_rss_mb': _peak_rss_mb() - rss_before, 'frame_mb': frame_mb,
+               'rows': len(result) if hasattr(result, '__len__') else None})
+
+
+def measure(func, *args):
+    """
+    Run func(*args) in a fresh process so peak RSS isn't polluted by earlier runs
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_measured, args=(func, args, queue))
+    process.start()
+    stats = queue.get()
+    process.join()
+    return stats
+
+
+def report(name, stats):
+    frame_mb = '{:.1f}'.format(stats['frame_mb']) if stats.get('frame_mb') is not None else '-'
+    print("{:<40} {:>8.2f}s  peak rss +{:>8.1f} MB  frame {:>8} MB  rows {}".format(
+        name, stats['seconds'], stats['peak_rss_mb'], frame_mb, stats.get('rows')))
+
+
+def bench_tweet_store():
+    from tweet_store import read_csv_archive, read_tweets, list_partitions
+
+    columns = ['username', 'text', 'retweets', 'favorites', 'date', 'mentions', 'hashtags', 'urls']
+    partitions = list_partitions()
+    last_week = partitions[-7][0] if len(partitions) >= 7 else None
+
+    report('csv, all columns', measure(read_csv_archive))
+    report('parquet, all columns', measure(read_tweets))
+    report('csv, dashboard columns', measure(read_csv_archive, columns))
+    report('parquet, dashboard columns', measure(read_tweets, columns))
+    report('csv, username only', measure(read_csv_archive, ['username']))
+    report('parquet, username only', measure(read_tweets, ['username']))
+    if last_week is not None:
+        report('csv, last 7 days', measure(read_csv_archive, columns, last_week))
+        report('parquet, last 7 days', measure(read_tweets, columns, last_week))
+
+
+def _legacy_load_and_clean_data():
+    # load_and_clean_data as it was before the compact loader, without the pickle cache
+    import glob
+    import pandas as pd
+    from data_prep import USE_COLS
+
+    files = glob.glob('tweets/cdnpoli_*.csv')
+    df = pd.read_csv(files[0], usecols=USE_COLS)
+    for file in files[1:]:
+        df_tmp = pd.read_csv(file, usecols=USE_COLS)
+        df = pd.concat([df, df_tmp])
+
+    df['day'] = pd.to_datetime(df['date']).dt.date
+    df['day_of_week'] = [x.weekday() for x in df['day']]
+    df['hour'] = pd.to_datetime(df['date']).dt.strftime('%H')
+    df['days_until_election'] = [(x - datetime.date(2019, 10, 21)).days for x in df['day']]
+    return df
+
+
+def _compact_load_and_clean_data(source, workers):
+    from data_prep import USE_COLS, clean_data
+    from tweet_store import read_csv_archive, read_tweets
+
+    read = read_csv_archive if source == 'csv' else read_tweets
+    return clean_data(read(USE_COLS, workers=workers))
+
+
+def bench_loader():
+    report('legacy loader (csv, concat per file)', measure(_legacy_load_and_clean_data))
+    report('compact loader (csv, 1 thread)', measure(_compact_load_and_clean_data, 'csv', 1))
+    report('compact loader (csv, all cpus)', measure(_compact_load_and_clean_data, 'csv', None))
+    report('compact loader (parquet, 1 thread)', measure(_compact_load_and_clean_data, 'parquet', 1))
+    report('compact loader (parquet, all cpus)', measure(_compact_load_and_clean_data, 'parquet', None))
+
+
+def _timed(func, *args):
+    start = time()
+    result = func(*args)
+    return result, time() - start
+
+
+def _legacy_token_counts(df):
+    # one str.cat + split per column, then the frame re-filtered and re-joined for every leader
+    from collections import Counter
+    from data_prep import LEADER_USERNAMES
+
+    counters = {col: Counter(df[col].dropna().str.cat(sep=' ').split(' ')) for col in ['hashtags', 'mentions', 'urls']}
+    leaders = {leader: Counter(df.loc[df['leader'] == leader, 'hashtags'].dropna().str.cat(sep=' ').split(' '))
+               for leader in LEADER_USERNAMES}
+    return counters, leaders
+
+
+def _vectorized_token_counts(df):
+    from collections import Counter
+    from data_prep import LEADER_USERNAMES
+    from token_counts import TokenCounter
+
+    counters = {col: TokenCounter(df[col]).to_counter() for col in ['hashtags', 'mentions', 'urls']}
+    by_leader = TokenCounter(df['hashtags']).counters_by(df['leader'])
+    leaders = {leader: by_leader.get(leader, Counter()) for leader in LEADER_USERNAMES}
+    return counters, leaders
+
+
+def bench_token_counts():
+    from data_prep import load_and_clean_data
+
+    df = load_and_clean_data()
+    (legacy, legacy_leaders), legacy_seconds = _timed(_legacy_token_counts, df)
+    (vectorized, vectorized_leaders), vectorized_seconds = _timed(_vectorized_token_counts, df)
+
+    for col, counter in legacy.items():
+        same = counter.most_common(100) == vectorized[col].most_common(100)
+        print("{:<10} {:>10,} tokens {:>9,} unique  top 100 {}".format(
+            col, sum(counter.values()), len(counter), 'identical' if same else 'MISMATCH'))
+    same = all(legacy_leaders[l].most_common(100) == vectorized_leaders[l].most_common(100) for l in legacy_leaders)
+    print("per-leader hashtags top 100 {}".format('identical' if same else 'MISMATCH'))
+    print("{:<40} {:>8.2f}s".format('str.cat + split + Counter', legacy_seconds))
+    print("{:<40} {:>8.2f}s".format('TokenCounter (factorize + bincount)', vectorized_seconds))
+
+
+def _full_frame_startup():
+    # what app.py did at import before the snapshot: the whole frame, then every data_prep_* table
+    from data_prep import OUTPUTS, compute_partials, clean_data, USE_COLS
+    from engagement import apply_latest_engagement
+    from tweet_store import load_tweets
+
+    partials = compute_partials(apply_latest_engagement(clean_data(load_tweets(USE_COLS))))
+    return {name: finalize(partials) for name, finalize in OUTPUTS.items()}
+
+
+def _daily_partials_startup():
+    from daily_aggregates import build_dashboard_aggregates
+    return build_dashboard_aggregates()
+
+
+def _snapshot_startup():
+    from dashboard_snapshot import load_dashboard_snapshot
+
+    snapshot = load_dashboard_snapshot()
+    snapshot.leader.frame(['username', 'day', 'days_until_election'])  # what app.py materializes
+    return snapshot.tables
+
+
+def bench_dashboard_startup():
+    """
+    Data loading part of a worker's cold start, each in a fresh process; app.py itself also needs Twitter credentials
+    """
+    import daily_aggregates, dashboard_snapshot  # imported once up front so the runs only time loading
+    report('full frame + data_prep (no cache)', measure(_full_frame_startup))
+    report('daily partials (cached)', measure(_daily_partials_startup))
+    report('dashboard snapshot (mmap)', measure(_snapshot_startup))
+
+
+def _legacy_leader_series(leader_df, start, end):
+    # the data part of update_figure before the cube: filter, then groupby('day') per leader (twice)
+    filtered = leader_df[(leader_df.days_until_election >= start) & (leader_df.days_until_election <= end)]
+    series = {}
+    for leader in filtered.username.unique():
+        by_leader = filtered[filtered['username'] == leader]
+        series[leader] = (by_leader.groupby(['day'])['day'].count().index.tolist(),
+                          by_leader.groupby(['day'])['day'].count().tolist())
+    return series
+
+
+def _cube_leader_series(cube, start, end):
+    from data_prep import LEADER_USERNAMES
+    return {leader: cube.series(leader, start, end)
+            for leader, total in zip(LEADER_USERNAMES, cube.totals(start, end)) if total}
+
+
+def _latencies_ms(func, arg, ranges):
+    latencies = []
+    for start, end in ranges:
+        begin = time()
+        func(arg, start, end)
+        latencies.append((time() - begin) * 1000)
+    return np.percentile(latencies, [50, 95, 99])
+
+
+def bench_leader_volume(scale=10, num_ranges=200):
+    """
+    update_figure at `scale` times the current leader tweet volume, for random slider ranges
+    (plotly trace construction is the same in both paths and left out)
+    """
+    import pandas as pd
+    from dashboard_snapshot import load_dashboard_snapshot
+    from leader_cube import LeaderDayCube
+
+    snapshot = load_dashboard_snapshot()
+    leader_df = snapshot.leader.frame(['username', 'day', 'days_until_election'])
+    leader_df = pd.concat([leader_df] * scale, ignore_index=True)
+    leader_df['username'] = leader_df['username'].astype(str)
+
+    start = time()
+    cube = LeaderDayCube.from_columns(np.tile(snapshot.leader['username'], scale),
+                                      np.tile(snapshot.leader['days_until_election'], scale))
+    build_seconds = time() - start
+
+    rng = np.random.RandomState(0)
+    ranges = [sorted(rng.randint(cube.first_day, cube.last_day + 1, size=2).tolist()) for _ in range(num_ranges)]
+    for start, end in ranges[:20]:
+        if _legacy_leader_series(leader_df, start, end) != _cube_leader_series(cube, start, end):
+            print("MISMATCH for range {} to {}".format(start, end))
+
+    print("{:,} leader tweets ({}x), cube {} built in {:.3f}s".format(len(leader_df), scale, cube.counts.shape, build_seconds))
+    for name, func, arg in [('filter + groupby', _legacy_leader_series, leader_df),
+                            ('count cube slice', _cube_leader_series, cube)]:
+        p50, p95, p99 = _latencies_ms(func, arg, ranges)
+        print("{:<20} p50 {:>8.3f} ms  p95 {:>8.3f} ms  p99 {:>8.3f} ms".format(name, p50, p95, p99))
+
+
+def _smaps_mb(pid):
+    # Rss counts shared pages in every process that maps them, Pss splits them between those processes
+    with open('/proc/{}/smaps_rollup'.format(pid)) as f:
+        fields = dict(line.split()[:2] for line in f if line.split()[0] in ('Rss:', 'Pss:'))
+    return int(fields['Rss:']) / 1024, int(fields['Pss:']) / 1024
+
+
+def _load_worker_data(private):
+    from dashboard_snapshot import LEADER_COLS, load_dashboard_snapshot
+
+    snapshot = load_dashboard_snapshot()
+    if private:  # every worker holding its own leader frame, like leader_df before the snapshot
+        return snapshot, snapshot.leader.frame(list(LEADER_COLS) + ['text'])
+    for col in LEADER_COLS:  # fault the mapped pages in, as the callbacks would
+        np.asarray(snapshot.leader[col]).view('uint8').sum()
+    np.frombuffer(snapshot.leader.text_bytes, dtype='uint8').sum()
+    return snapshot, None
+
+
+def _hold_worker(preloaded, private, ready, done):
+    data = preloaded if preloaded is not None else _load_worker_data(private)
+    if preloaded is not None:
+        _load_worker_data(private=False)  # attach like a worker would; the pages are already shared
+    ready.put(len(data))
+    done.wait()
+
+
+def _workers_memory(num_workers, mode):
+    import gc
+
+    preloaded = None
+    if mode == 'preload':
+        preloaded = _load_worker_data(private=False)
+        if hasattr(gc, 'freeze'):
+            gc.freeze()
+    ready, done = multiprocessing.Queue(), multiprocessing.Event()
+    workers = [multiprocessing.Process(target=_hold_worker, args=(preloaded, mode == 'private', ready, done))
+               for _ in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        ready.get()
+    rss, pss = map(sum, zip(*[_smaps_mb(worker.pid) for worker in workers]))
+    done.set()
+    for worker in workers:
+        worker.join()
+    return rss, pss
+
+
+def bench_worker_memory(worker_counts=(1, 4, 8)):
+    """
+    Total worker memory for 1, 4 and 8 workers (forked like gunicorn's) when each worker:
+        private: loads the leader tweets into its own dataframe
+        mmap: maps the snapshot columns itself
+        preload: inherits the snapshot mapped by the master before the fork (gunicorn -c gunicorn.conf.py)
+    Pss is the number to compare: shared pages are split between the workers instead of counted in each.
+    """
+    for mode in ['private', 'mmap', 'preload']:
+        for num_workers in worker_counts:
+            rss, pss = _workers_memory(num_workers, mode)
+            print("{:<8} {} workers  rss {:>8.1f} MB  pss {:>8.1f} MB  pss per worker {:>7.1f} MB".format(
+                mode, num_workers, rss, pss, pss / num_workers))
+
+
+def _scan_search(texts, terms):
+    mask = np.ones(len(texts), dtype=bool)
+    for term in terms:
+        mask &= texts.str.contains(r'\b{}\b'.format(term), regex=True).values
+    return int(mask.sum())
+
+
+def bench_search(num_queries=50):
+    """
+    Keyword lookups in the search index against a regex scan of every lowercased tweet text, for random index terms
+    (the scan matches whole words in the raw text, so its counts can differ slightly from the cleaned-text index)
+    """
+    from search_index import load_search_index
+    from tweet_store import load_tweets
+
+    index = load_search_index()
+    if index is None:
+        print("No search index, build it with `python search_index.py`")
+        return
+    texts = load_tweets(['text'])['text'].fillna('').str.lower()
+    rng = np.random.RandomState(0)
+    terms = [index._term(i) for i in rng.randint(0, index.manifest['num_terms'], size=num_queries)]
+    print("{:,} tweets, {:,} terms, {:,} postings".format(
+        index.manifest['num_tweets'], index.manifest['num_terms'], index.manifest['num_postings']))
+    for name, func in [('inverted index', lambda term: index.search(term)['num_tweets']),
+                       ('full text scan', lambda term: _scan_search(texts, [term]))]:
+        latencies = []
+        for term in terms:
+            begin = time()
+            func(term)
+            latencies.append((time() - begin) * 1000)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print("{:<20} p50 {:>8.3f} ms  p95 {:>8.3f} ms  p99 {:>8.3f} ms".format(name, p50, p95, p99))
+
+
+def bench_ner_scaling(num_tweets=20000, core_counts=(1, 2, 4, 8)):
+    """
+    Named entity extraction throughput on the first num_tweets tweets with 1, 2, 4 and 8 processes; every run is checked
+    against the serial path, and a sample of that against plain nltk.ne_chunk(nltk.pos_tag(...))
+    """
+    import nltk
+    import named_entity_resolution as ner
+    from data_prep import load_and_clean_data
+
+    tweets = [ner.normalize_tweet(text) for text in load_and_clean_data()['text'].head(num_tweets)]
+    serial = None
+    for workers in core_counts:
+        entities, seconds = _timed(lambda: list(ner.iter_entities(tweets, workers)))
+        if serial is None:
+            serial, serial_seconds = entities, seconds
+            reference = [[" ".join(w for w, t in elt) for elt in nltk.ne_chunk(nltk.pos_tag(nltk.word_tokenize(tweet)))
+                          if isinstance(elt, nltk.Tree)] for tweet in tweets[:200]]
+            print("first 200 tweets vs nltk.ne_chunk: {}".format('identical' if reference == serial[:200] else 'MISMATCH'))
+        print("{} workers {:>8.1f}s {:>8.0f} tweets/s  speedup {:.2f}x  {}".format(
+            workers, seconds, len(tweets) / seconds, serial_seconds / seconds,
+            'identical' if entities == serial else 'MISMATCH'))
+
+
+def bench_ner_cache(num_tweets=20000):
+    """
+    Entity extraction for the first num_tweets tweets with an empty entity cache, then again with the cache warm
+    (a rerun with no new tweets), in a throwaway cache file
+    """
+    import tempfile
+    import named_entity_resolution as ner
+    from data_prep import load_and_clean_data
+    from entity_cache import EntityCache
+
+    df = load_and_clean_data().head(num_tweets)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'entities.npz')
+        cold_cache = EntityCache('bench', path)
+        cold, cold_seconds = _timed(ner.extract_named_entities, df, None, ner.CHUNK_SIZE, cold_cache)
+        cold_cache.save()
+        cache = EntityCache('bench', path)
+        warm, warm_seconds = _timed(ner.extract_named_entities, df, None, ner.CHUNK_SIZE, cache)
+    print("{:,} tweets, {:,} distinct texts, warm run {}".format(
+        len(df), len(cache), 'identical' if warm == cold else 'MISMATCH'))
+    print("{:<30} {:>8.2f}s".format('empty cache', cold_seconds))
+    print("{:<30} {:>8.2f}s  hit rate {:.1%}".format('warm cache', warm_seconds, cache.hit_rate()))
+
+
+def bench_dedup(num_tweets=20000):
+    """
+    Share of duplicate texts in the corpus, and named entity extraction on the first num_tweets tweets row by row
+    against once per distinct text
+    """
+    import named_entity_resolution as ner
+    from data_prep import load_and_clean_data
+    from text_dedup import TextDedup
+
+    df = load_and_clean_data()
+    dedup, seconds = _timed(TextDedup, df['text'])
+    print("{:,} tweets, {:,} distinct texts ({:.1%} duplicates), dedup took {:.2f}s".format(
+        len(dedup), len(dedup.unique_texts), dedup.ratio(), seconds))
+
+    df = df.head(num_tweets)
+    per_row, row_seconds = _timed(lambda: list(ner.iter_entities([ner.normalize_tweet(t) for t in df['text']], 1)))
+    deduped, dedup_seconds = _timed(ner.extract_named_entities, df, 1, ner.CHUNK_SIZE, None, None)
+    print("{:<30} {:>8.2f}s".format('NER every row', row_seconds))
+    print("{:<30} {:>8.2f}s  {}".format('NER once per text', dedup_seconds, 'identical' if per_row == deduped else 'MISMATCH'))
+
+
+def bench_language_id():
+    """
+    Language detection over the whole corpus, and the tweets per language the NER pipeline tags or skips
+    """
+    import pandas as pd
+    import named_entity_resolution as ner
+    from language_id import detect_languages
+    from tweet_store import load_tweets
+
+    texts = load_tweets(['text'])['text']
+    langs, seconds = _timed(detect_languages, texts)
+    print("{:,} tweets in {:.2f}s ({:,.0f} tweets/s)".format(len(texts), seconds, len(texts) / seconds))
+    for lang, count in pd.Series(langs).value_counts().items():
+        print("{:<5} {:>10,} tweets  {:>6.1%}  {}".format(
+            lang, count, count / len(texts), 'tagged' if lang in ner.NER_LANGUAGES else 'skipped by NER'))
+
+
+def _in_memory_ner(path):
+    # the pre-streaming script: every tweet text, entity list and the entity frame held at once
+    import named_entity_resolution as ner
+    from tweet_store import load_tweets
+
+    df = load_tweets(['id', 'username', 'text'])
+    df['named_entity'] = ner.extract_named_entities(df, 1)
+    entities = df[['id', 'named_entity']].explode('named_entity').dropna()
+    entities.rename(columns={'named_entity': 'entity'}).to_parquet(path)
+    return entities
+
+
+def _streamed_ner(path, batch_size):
+    import named_entity_resolution as ner
+    ner.stream_named_entities(path, workers=1, batch_size=batch_size)
+
+
+def bench_ner_stream(batch_size=50000):
+    """
+    Peak memory and time of named entity extraction over the whole corpus, all in memory vs streamed in batches
+    (serial, no entity cache)
+    """
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        report('in memory', measure(_in_memory_ner, os.path.join(tmp_dir, 'in_memory.parquet')))
+        report('streamed, {:,} tweets per batch'.format(batch_size),
+               measure(_streamed_ner, os.path.join(tmp_dir, 'streamed.parquet'), batch_size))
+
+
+BENCHMARKS = {
+    'tweet_store': bench_tweet_store,
+    'loader': bench_loader,
+    'token_counts': bench_token_counts,
+    'dashboard_startup': bench_dashboard_startup,
+    'leader_volume': bench_leader_volume,
+    'worker_memory': bench_worker_memory,
+    'search': bench_search,
+    'ner_scaling': bench_ner_scaling,
+    'ner_cache': bench_ner_cache,
+    'dedup': bench_dedup,
+    'language_id': bench_language_id,
+    'ner_stream': bench_ner_stream,
+}
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run performance benchmarks against the local tweet data')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    args = parser.parse_args()
+
+    BENCHMARKS[args.benchmark]()
@@ -0,0 +1,228 @@
+# Pickle cache for the data_prep_* artifacts, keyed on what they were built from:
+#   the tweet partitions + engagement snapshots on disk, the source of the function's module (and of the helper
+#   modules it depends on) and its arguments.
+# Adding a day of tweets, refreshing engagement or editing the code changes the key, so stale aggregates are never served.
+import functools
+import glob
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import tempfile
+import threading
+from collections import defaultdict
+
+from engagement import SNAPSHOT_PATH
+from tweet_store import STORE_PATH, CSV_GLOB
+
+CACHE_DIR = 'cache'
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+# Dash callback results, shared by every gunicorn worker on the machine
+CALLBACK_CACHE_DIR = os.path.join(CACHE_DIR, 'callbacks')
+MAX_CALLBACK_CACHE_BYTES = 256 * 1024 ** 2
+
+TWEET_INPUTS = [os.path.join(STORE_PATH, 'day=*', 'part-*.parquet'), CSV_GLOB]
+# inputs of everything built from load_and_clean_data(), which also joins in the engagement snapshots
+ENGAGEMENT_INPUTS = [os.path.join(SNAPSHOT_PATH, 'snapshot=*.parquet')]
+DEFAULT_INPUTS = TWEET_INPUTS + ENGAGEMENT_INPUTS
+
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_stats_lock = threading.Lock()
+
+
+def fingerprint_files(patterns):
+    """
+    Hash of (path, size, mtime) for every file matching the glob patterns; cheap enough to do on every call
+    """
+    digest = hashlib.sha1()
+    for pattern in patterns:
+        for file in sorted(glob.glob(pattern)):
+            stat = os.stat(file)
+            digest.update('{}|{}|{}\n'.format(file, stat.st_size, stat.st_mtime_ns).encode())
+    return digest.hexdigest()
+
+
+def _describe_arg(arg):
+    # frames, big lists and counters are derived from the inputs, so key on their shape rather than hashing every row
+    if hasattr(arg, 'shape') and hasattr(arg, 'columns'):
+        return 'DataFrame{}{}'.format(arg.shape, list(arg.columns))
+    if hasattr(arg, 'shape'):
+        return '{}{}'.format(type(arg).__name__, arg.shape)
+    if isinstance(arg, (list, tuple, set, dict)) and len(arg) > 100:
+        return '{}[{}]'.format(type(arg).__name__, len(arg))
+    return repr(arg)
+
+
+def _code_hash(func, depends=()):
+    """
+    Hash of the source of the function's whole module and of the `depends` modules: results are often built by
+    helpers next to the function, which its own source doesn't show
+    """
+    digest = hashlib.sha1()
+    for module in [sys.modules.get(func.__module__)] + list(depends):
+        try:
+            digest.update(inspect.getsource(module).encode())
+        except (OSError, TypeError):  # no source file, e.g. defined in a REPL
+            digest.update(func.__code__.co_code + repr(func.__code__.co_consts).encode())
+    return digest.hexdigest()
+
+
+def _make_key(name, code_hash, inputs, args, kwargs):
+    parts = [name, code_hash, fingerprint_files(inputs)]
+    parts.extend(_describe_arg(arg) for arg in args)
+    parts.extend('{}={}'.format(k, _describe_arg(v)) for k, v in sorted(kwargs.items()))
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+
+def _atomic_dump(obj, path):
+    # a temp file of its own per writer: threads of one worker can store the same key at once
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, keep=None):
+    """
+    Delete least recently used entries until the cache fits in max_bytes; hits bump the file mtime
+    """
+    entries = []
+    for path in glob.glob(os.path.join(cache_dir, '*-*.pkl')):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:  # evicted by another process
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            print("Evicted {} from cache".format(path))
+        except FileNotFoundError:
+            pass
+
+
+def cached(name=None, inputs=DEFAULT_INPUTS, depends=(), cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Decorator: @cached('tweet_volume_df') memoizes the function's result in cache/tweet_volume_df-<key>.pkl
+    inputs: glob patterns of the files the result is built from, or a function of the call's arguments returning them
+    depends: other modules whose code builds the result; the function's own module is always part of the key
+    The undecorated function stays available as func.uncached
+    """
+    def decorator(func):
+        artifact = name or func.__name__
+        code_hash = _code_hash(func, depends)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            patterns = inputs(*args, **kwargs) if callable(inputs) else inputs
+            key = _make_key(artifact, code_hash, patterns, args, kwargs)
+            path = os.path.join(cache_dir, '{}-{}.pkl'.format(artifact, key[:16]))
+
+            if os.path.isfile(path):
+                try:
+                    with open(path, 'rb') as f:
+                        result = pickle.load(f)
+                    os.utime(path)
+                    _record(artifact, hit=True)
+                    print("Loading {} from cache".format(path))
+                    return result
+                except (EOFError, pickle.UnpicklingError, FileNotFoundError):
+                    print("Cache entry {} unreadable, rebuilding".format(path))
+
+            _record(artifact, hit=False)
+            result = func(*args, **kwargs)
+            os.makedirs(cache_dir, exist_ok=True)
+            _atomic_dump(result, path)
+            evict(cache_dir, max_bytes, keep=path)
+            return result
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def _purge_other_versions(cache_dir, artifact, version_tag):
+    # only this callback's entries: other callbacks take their version from other data
+    for path in glob.glob(os.path.join(cache_dir, '{}-*-*.pkl'.format(glob.escape(artifact)))):
+        if os.path.basename(path)[len(artifact) + 1:].split('-')[0] != version_tag:
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # another worker got there first
+                pass
+
+
+def memoize_callback(version, name=None, cache_dir=CALLBACK_CACHE_DIR, max_bytes=MAX_CALLBACK_CACHE_BYTES):
+    """
+    Decorator for Dash callbacks: results are stored in cache/callbacks/<name>-<version>-<key>.pkl, keyed on the
+    callback, its input values and the data version, so all workers share them. Entries are LRU-evicted past
+    max_bytes, and the callback's entries of other versions are deleted the first time a worker sees a new version.
+    :param version: function returning the version of the data the callback reads, e.g. lambda: snapshot.version
+    """
+    def decorator(func):
+        artifact = name or func.__name__
+        code_hash = _code_hash(func)
+        seen_versions = set()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            current = version()
+            version_tag = hashlib.sha1(str(current).encode()).hexdigest()[:8]
+            if version_tag not in seen_versions:
+                seen_versions.add(version_tag)
+                _purge_other_versions(cache_dir, artifact, version_tag)
+
+            key = _make_key(artifact, code_hash, [], args, kwargs)
+            path = os.path.join(cache_dir, '{}-{}-{}.pkl'.format(artifact, version_tag, key[:16]))
+            try:
+                with open(path, 'rb') as f:
+                    result = pickle.load(f)
+                os.utime(path)
+                _record(artifact, hit=True)
+                return result
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                pass
+
+            _record(artifact, hit=False)
+            result = func(*args, **kwargs)
+            if version() != current:  # data swapped mid-call, the result may mix versions
+                return result
+            os.makedirs(cache_dir, exist_ok=True)
+            _atomic_dump(result, path)
+            evict(cache_dir, max_bytes, keep=path)
+            return result
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+
+def _record(artifact, hit):
+    with _stats_lock:
+        _stats[artifact]['hits' if hit else 'misses'] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        return {artifact: dict(counts) for artifact, counts in _stats.items()}
+
+
+def report_cache_stats():
+    stats = cache_stats()
+    hits = sum(s['hits'] for s in stats.values())
+    misses = sum(s['misses'] for s in stats.values())
+    for artifact, counts in sorted(stats.items()):
+        print("{:<35} hits {:>4}  misses {:>4}".format(artifact, counts['hits'], counts['misses']))
+    print("Cache total: {} hits, {} misses".format(hits, misses))
+    return stats
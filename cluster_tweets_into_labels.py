@@ -1,9 +1,11 @@
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 from sklearn.cluster import KMeans, DBSCAN
 
 from get_tweets import remove_tweets_by_user
+from text_dedup import TextDedup
 from tf_hub_sentence_encoding import embed_tweets
 from tweets_labeler import manual_map_cluster_to_category
 
@@ -24,8 +26,9 @@ def _cluster_unlabeled_data(unlabeled_data_file_path, remove_user, n_cluster):
     unlabeled_tweets = pd.read_csv(unlabeled_data_file_path)
     unlabeled_tweets = remove_tweets_by_user(unlabeled_tweets, user=remove_user)
 
-    tweet_to_embed = list(unlabeled_tweets['cleaned_text'])
-    tweets_embedding = embed_tweets(tweet_to_embed)
+    # embed each distinct text once and fan the vectors back out to the rows
+    dedup = TextDedup(unlabeled_tweets['cleaned_text'])
+    tweets_embedding = np.asarray(dedup.run('Sentence embedding', embed_tweets))
 
     predictions = _cluster_data(tweets_embedding, n_cluster)
     unlabeled_tweets['cluster'] = predictions
@@ -0,0 +1,97 @@
+# Dashboard aggregates merged from per-day partials, so ingesting a new day costs one day of work.
+# Partials live in cache/ (daily_counts-*.pkl, daily_engagement-*.pkl) keyed on that day's files; only new or
+# re-scraped days are recomputed, and only the engagement partials are rebuilt after an engagement refresh.
+# python daily_aggregates.py           build the partials and print the overview
+# python daily_aggregates.py --verify  check the merged outputs against a full rebuild from load_and_clean_data()
+import functools
+
+import pandas as pd
+
+import data_prep
+import engagement
+import language_id
+import token_counts
+from cache_manager import cached, fingerprint_files, ENGAGEMENT_INPUTS
+from data_prep import (USE_COLS, PARTIALS, ENGAGEMENT_PARTIALS, OUTPUTS, clean_data, compute_partials,
+                       merge_partials, load_and_clean_data)
+from engagement import apply_latest_engagement, read_latest_engagement
+from language_id import day_languages, languages_of
+from tweet_store import list_input_files, load_tweets
+
+COUNT_PARTIALS = [name for name in PARTIALS if name not in ENGAGEMENT_PARTIALS]
+# the partials are computed by data_prep's code, so its edits must invalidate them too
+PARTIAL_MODULES = [data_prep, token_counts, engagement, language_id]
+
+
+def _read_day(day, files):
+    # the same frame as data_prep._load_clean_tweets, for one day
+    df = clean_data(load_tweets(USE_COLS, start_day=day, end_day=day, workers=1))
+    df['lang'] = languages_of(df['id'], [day_languages(day, files)])
+    return df
+
+
+@functools.lru_cache(maxsize=1)
+def _latest_engagement(snapshots_fingerprint):
+    return read_latest_engagement()
+
+
+@cached('daily_counts', inputs=lambda day, files: files, depends=PARTIAL_MODULES)
+def daily_count_partials(day, files):
+    return compute_partials(_read_day(day, files), COUNT_PARTIALS)
+
+
+@cached('daily_engagement', inputs=lambda day, files: files + ENGAGEMENT_INPUTS, depends=PARTIAL_MODULES)
+def daily_engagement_partials(day, files):
+    latest = _latest_engagement(fingerprint_files(ENGAGEMENT_INPUTS))
+    return compute_partials(apply_latest_engagement(_read_day(day, files), latest=latest), ENGAGEMENT_PARTIALS)
+
+
+def build_partials():
+    partials = []
+    for day, files in list_input_files():
+        if not files:
+            continue
+        partial = daily_count_partials(day, files)
+        partial.update(daily_engagement_partials(day, files))
+        partials.append(partial)
+    return partials
+
+
+def build_dashboard_aggregates():
+    """
+    Every dashboard table from OUTPUTS (plus 'overview'), identical to running data_prep_* on the full frame
+    """
+    merged = merge_partials(build_partials())
+    return {name: finalize(merged) for name, finalize in OUTPUTS.items()}
+
+
+def _same(a, b):
+    if isinstance(a, (pd.DataFrame, pd.Series)):
+        return a.equals(b) and list(a.index) == list(b.index)
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    return a == b
+
+
+def verify_against_full_rebuild():
+    incremental = build_dashboard_aggregates()
+    full_partials = compute_partials(load_and_clean_data())
+    mismatches = [name for name, finalize in OUTPUTS.items() if not _same(incremental[name], finalize(full_partials))]
+    for name in OUTPUTS:
+        print("{:<35} {}".format(name, 'MISMATCH' if name in mismatches else 'ok'))
+    return mismatches
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build per-day dashboard aggregates')
+    parser.add_argument('--verify', action='store_true', help='compare against a full rebuild')
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatches = verify_against_full_rebuild()
+        if mismatches:
+            raise SystemExit("Incremental aggregates differ from the full rebuild: {}".format(mismatches))
+    else:
+        print(build_dashboard_aggregates()['overview'])
@@ -0,0 +1,123 @@
+# Latency, response size and error counts for every Dash callback, served on /metrics in Prometheus text format.
+# Measured around Dash's /_dash-update-component requests, so the numbers include JSON serialization.
+# Each gunicorn worker keeps its own counters; the `worker` label tells them apart.
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+
+import flask
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+SIZE_BUCKETS = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+UPDATE_PATH = '/_dash-update-component'
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for le, count in zip([repr(float(b)) for b in self.buckets] + ['+Inf'], self.counts):
+            cumulative += count
+            yield '{}_bucket{{{},le="{}"}} {}'.format(name, labels, le, cumulative)
+        yield '{}_sum{{{}}} {}'.format(name, labels, self.sum)
+        yield '{}_count{{{}}} {}'.format(name, labels, self.count)
+
+
+class CallbackMetrics(object):
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, size_buckets=SIZE_BUCKETS):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(lambda: Histogram(latency_buckets))
+        self.size = defaultdict(lambda: Histogram(size_buckets))
+        self.errors = defaultdict(int)
+        self.gauges = {}
+
+    def record(self, callback, seconds, num_bytes, error=False):
+        with self.lock:
+            self.latency[callback].observe(seconds)
+            if num_bytes is not None:
+                self.size[callback].observe(num_bytes)
+            self.errors[callback] += int(error)
+
+    def add_gauge(self, name, func, help_text=''):
+        """
+        Export func() as a gauge on every scrape, e.g. the snapshot reload time
+        """
+        self.gauges[name] = (func, help_text)
+
+    def render(self):
+        worker = 'worker="{}"'.format(os.getpid())
+        lines = ['# HELP dash_callback_duration_seconds Time to run a Dash callback and serialize its response',
+                 '# TYPE dash_callback_duration_seconds histogram']
+        with self.lock:
+            for callback, histogram in sorted(self.latency.items()):
+                lines.extend(histogram.lines('dash_callback_duration_seconds', '{},callback="{}"'.format(worker, callback)))
+            lines += ['# HELP dash_callback_response_bytes Size of the serialized callback response',
+                      '# TYPE dash_callback_response_bytes histogram']
+            for callback, histogram in sorted(self.size.items()):
+                lines.extend(histogram.lines('dash_callback_response_bytes', '{},callback="{}"'.format(worker, callback)))
+            lines += ['# HELP dash_callback_errors_total Callbacks that raised',
+                      '# TYPE dash_callback_errors_total counter']
+            for callback, errors in sorted(self.errors.items()):
+                lines.append('dash_callback_errors_total{{{},callback="{}"}} {}'.format(worker, callback, errors))
+        for name, (func, help_text) in sorted(self.gauges.items()):
+            lines += ['# HELP {} {}'.format(name, help_text), '# TYPE {} gauge'.format(name),
+                      '{}{{{}}} {}'.format(name, worker, func())]
+        return '\n'.join(lines) + '\n'
+
+
+def _callback_name(app, output):
+    # the callback's function name when Dash kept it, else the output it updates, e.g. 'graph-with-slider.figure'
+    callback = app.callback_map.get(output, {}).get('callback')
+    return getattr(callback, '__name__', None) or output
+
+
+def instrument_dash_app(app, metrics=None, slow_callback_seconds=None, path='/metrics'):
+    """
+    Time every callback request of a Dash app and serve the metrics on app.server at `path`
+    :param slow_callback_seconds: log callbacks slower than this, with their inputs
+    """
+    metrics = metrics if metrics is not None else CallbackMetrics()
+    server = app.server
+
+    @server.before_request
+    def start_timer():
+        if flask.request.path.endswith(UPDATE_PATH):
+            flask.g.callback_start = time.time()
+
+    @server.after_request
+    def record_size(response):
+        if 'callback_start' in flask.g:
+            flask.g.callback_bytes = response.calculate_content_length()
+            flask.g.callback_failed = response.status_code >= 500
+        return response
+
+    @server.teardown_request
+    def record_callback(exception=None):
+        if 'callback_start' not in flask.g:
+            return
+        seconds = time.time() - flask.g.callback_start
+        body = flask.request.get_json(silent=True) or {}
+        callback = _callback_name(app, body.get('output', ''))
+        failed = exception is not None or flask.g.get('callback_failed', False)
+        metrics.record(callback, seconds, flask.g.get('callback_bytes'), error=failed)
+        if slow_callback_seconds is not None and seconds > slow_callback_seconds:
+            print("Slow callback {} took {:.3f}s, {} bytes, inputs {}".format(
+                callback, seconds, flask.g.get('callback_bytes'), body.get('inputs')))
+
+    @server.route(path)
+    def serve_metrics():
+        return flask.Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return metrics
@@ -0,0 +1,275 @@
+# Versioned dashboard snapshot, built offline so app.py starts without touching the tweet store:
+# every aggregate table plus the party leaders' tweets as flat column files that workers memory-map.
+# python dashboard_snapshot.py         build a new version and make it current
+# python dashboard_snapshot.py --list  show the versions on disk
+#
+# dashboard/
+#   CURRENT                          name of the live version, swapped atomically
+#   v=20191001T120000-<inputs>/
+#     manifest.json                  format, version, input fingerprint, row counts
+#     tables.pkl                     OUTPUTS except leader_df (a few hundred small rows)
+#     leader_<col>.npy               fixed-width leader columns, np.load(mmap_mode='r')
+#     leader_text.bin                utf-8 tweet texts back to back, sliced with leader_text_offsets.npy
+#     leader_day_counts.npy          leader x days_until_election tweet counts for the slider graph
+#     leader_order_<col>.npy         leader rows grouped by leader and sorted by favorites / retweets
+import datetime
+import glob
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from cache_manager import fingerprint_files, DEFAULT_INPUTS
+from data_prep import LEADER_USERNAMES
+from leader_cube import LeaderDayCube
+from leader_index import LeaderTopIndex
+
+DASHBOARD_PATH = 'dashboard'
+CURRENT_FILE = 'CURRENT'
+VERSION_FORMAT = 'v=%Y%m%dT%H%M%S'
+FORMAT_VERSION = 3
+# leader columns used by the callbacks; username is stored as int8 codes into LEADER_USERNAMES
+LEADER_COLS = {'username': 'int8', 'id': 'int64', 'day': 'datetime64[D]', 'days_until_election': 'int16',
+               'favorites': 'int32', 'retweets': 'int32'}
+RANKED_COLS = ['favorites', 'retweets']
+
+
+def _write_leader_columns(leader_df, version_path):
+    codes = pd.Categorical(leader_df['username'], categories=LEADER_USERNAMES).codes
+    columns = {'username': codes, 'id': leader_df['id'].values,
+               'day': pd.to_datetime(leader_df['day']).values,
+               'days_until_election': leader_df['days_until_election'].values,
+               'favorites': leader_df['favorites'].values, 'retweets': leader_df['retweets'].values}
+    for col, dtype in LEADER_COLS.items():
+        np.save(os.path.join(version_path, 'leader_{}.npy'.format(col)), np.asarray(columns[col]).astype(dtype))
+
+    texts = [text.encode('utf-8') for text in leader_df['text'].fillna('')]
+    offsets = np.zeros(len(texts) + 1, dtype='int64')
+    offsets[1:] = np.cumsum([len(text) for text in texts])
+    np.save(os.path.join(version_path, 'leader_text_offsets.npy'), offsets)
+    with open(os.path.join(version_path, 'leader_text.bin'), 'wb') as f:
+        f.write(b''.join(texts))
+
+    cube = LeaderDayCube.from_columns(codes, leader_df['days_until_election'].values)
+    np.save(os.path.join(version_path, 'leader_day_counts.npy'), cube.counts)
+    for col in RANKED_COLS:
+        ranking = LeaderTopIndex.from_columns(codes, leader_df[col].values)
+        np.save(os.path.join(version_path, 'leader_order_{}.npy'.format(col)), ranking.order)
+    return cube
+
+
+def build_dashboard_snapshot(path=DASHBOARD_PATH, aggregates=None):
+    """
+    Write a new snapshot version and point CURRENT at it; readers of the old version are unaffected
+    :param aggregates: build_dashboard_aggregates() result, built here when not given
+    :return: version name
+    """
+    if aggregates is None:
+        from daily_aggregates import build_dashboard_aggregates
+        aggregates = build_dashboard_aggregates()
+
+    inputs_fingerprint = fingerprint_files(DEFAULT_INPUTS)
+    version = '{}-{}'.format(datetime.datetime.utcnow().strftime(VERSION_FORMAT), inputs_fingerprint[:8])
+    version_path = os.path.join(path, version)
+    tmp_path = version_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    tables = {name: value for name, value in aggregates.items() if name != 'leader_df'}
+    with open(os.path.join(tmp_path, 'tables.pkl'), 'wb') as f:
+        pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+    cube = _write_leader_columns(aggregates['leader_df'], tmp_path)
+
+    manifest = {'format': FORMAT_VERSION, 'version': version, 'inputs': inputs_fingerprint,
+                'built_at': datetime.datetime.utcnow().isoformat(), 'num_leader_tweets': len(aggregates['leader_df']),
+                'total_num_tweets': aggregates['overview']['total_num_tweets'], 'leader_first_day': cube.first_day}
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    os.rename(tmp_path, version_path)
+    _set_current(path, version)
+    print("Wrote dashboard snapshot {} ({:,} leader tweets)".format(version_path, manifest['num_leader_tweets']))
+    return version
+
+
+def _set_current(path, version):
+    tmp_file = os.path.join(path, CURRENT_FILE + '.tmp')
+    with open(tmp_file, 'w') as f:
+        f.write(version)
+    os.replace(tmp_file, os.path.join(path, CURRENT_FILE))
+
+
+def current_version(path=DASHBOARD_PATH):
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(path=DASHBOARD_PATH):
+    # the build time leads the name, so this sorts chronologically
+    return sorted(os.path.basename(p) for p in glob.glob(os.path.join(path, 'v=*')) if not p.endswith('.tmp'))
+
+
+class LeaderColumns(object):
+    """
+    The party leaders' tweets as memory-mapped arrays; pages are shared by every worker through the page cache
+    """
+    def __init__(self, version_path):
+        self.columns = {col: np.load(os.path.join(version_path, 'leader_{}.npy'.format(col)), mmap_mode='r')
+                        for col in LEADER_COLS}
+        self.text_offsets = np.load(os.path.join(version_path, 'leader_text_offsets.npy'), mmap_mode='r')
+        text_path = os.path.join(version_path, 'leader_text.bin')
+        # np.memmap refuses empty files
+        self.text_bytes = np.memmap(text_path, dtype='uint8', mode='r') if os.path.getsize(text_path) else b''
+
+    def __len__(self):
+        return len(self.columns['username'])
+
+    def __getitem__(self, col):
+        return self.columns[col]
+
+    def text(self, rows):
+        return [bytes(self.text_bytes[self.text_offsets[i]:self.text_offsets[i + 1]]).decode('utf-8') for i in rows]
+
+    def frame(self, columns, rows=None):
+        """
+        Materialize some columns (and optionally some rows) as a leader_df-style dataframe:
+        username as a categorical of names, day as datetime.date
+        """
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype='int64')
+        data = {}
+        for col in columns:
+            if col == 'text':
+                data[col] = self.text(rows)
+            elif col == 'username':
+                data[col] = pd.Categorical.from_codes(self.columns[col][rows], categories=LEADER_USERNAMES)
+            elif col == 'day':
+                data[col] = pd.to_datetime(self.columns[col][rows]).date
+            else:
+                data[col] = np.asarray(self.columns[col][rows])
+        return pd.DataFrame(data, columns=columns)
+
+
+class DashboardSnapshot(object):
+    def __init__(self, path=DASHBOARD_PATH, version=None):
+        version = version or current_version(path)
+        if version is None:
+            raise FileNotFoundError("No dashboard snapshot in {}/, build one with `python dashboard_snapshot.py`".format(path))
+        self.version = version
+        self.path = os.path.join(path, version)
+        with open(os.path.join(self.path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        if self.manifest['format'] != FORMAT_VERSION:
+            raise ValueError("Dashboard snapshot {} has format {}, expected {}; rebuild it".format(
+                version, self.manifest['format'], FORMAT_VERSION))
+        with open(os.path.join(self.path, 'tables.pkl'), 'rb') as f:
+            self.tables = pickle.load(f)
+        self.leader = LeaderColumns(self.path)
+        self.leader_cube = LeaderDayCube(np.load(os.path.join(self.path, 'leader_day_counts.npy'), mmap_mode='r'),
+                                         self.manifest['leader_first_day'])
+        offsets = LeaderTopIndex.leader_offsets(self.leader['username'])
+        self.leader_rankings = {col: LeaderTopIndex(np.load(os.path.join(self.path, 'leader_order_{}.npy'.format(col)),
+                                                            mmap_mode='r'), offsets)
+                                for col in RANKED_COLS}
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+
+def load_dashboard_snapshot(path=DASHBOARD_PATH, version=None):
+    return DashboardSnapshot(path, version)
+
+
+class LiveSnapshot(object):
+    """
+    The current DashboardSnapshot, reloaded by a background watcher when CURRENT points at a new version.
+    The new snapshot and whatever prepare(snapshot) derives from it (e.g. layout sections) are built first and
+    swapped in with one assignment, so a caller that reads current() once sees a single consistent version.
+    """
+    def __init__(self, path=DASHBOARD_PATH, prepare=None):
+        self.path = path
+        self.prepare = prepare
+        self.lock = threading.Lock()  # one reload at a time
+        self.num_reloads = 0
+        self.reload_seconds = None
+        self._current = self._load(current_version(path))
+        self.loaded_at = time.time()
+
+    def _load(self, version):
+        snapshot = DashboardSnapshot(self.path, version)
+        snapshot.prepared = self.prepare(snapshot) if self.prepare is not None else None
+        return snapshot
+
+    def current(self):
+        return self._current
+
+    def reload_if_changed(self):
+        """
+        :return: True if a new version was swapped in
+        """
+        with self.lock:
+            version = current_version(self.path)
+            if version is None or version == self._current.version:
+                return False
+            start = time.time()
+            snapshot = self._load(version)
+            self._current = snapshot
+            self.reload_seconds = time.time() - start
+            self.loaded_at = time.time()
+            self.num_reloads += 1
+        print("Reloaded dashboard snapshot {} in {:.2f}s".format(version, self.reload_seconds))
+        return True
+
+    def start_watcher(self, interval=30):
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_if_changed()
+                except Exception as e:  # half-written or pruned version, keep serving the current one
+                    print("Dashboard snapshot reload failed: {}".format(e))
+
+        thread = threading.Thread(target=run, name='snapshot-watcher', daemon=True)
+        thread.start()
+        return thread
+
+    def status(self):
+        return {'version': self._current.version, 'built_at': self._current.manifest['built_at'],
+                'loaded_at': datetime.datetime.utcfromtimestamp(self.loaded_at).isoformat(),
+                'num_reloads': self.num_reloads, 'reload_seconds': self.reload_seconds}
+
+
+def prune_versions(path=DASHBOARD_PATH, keep=3):
+    """
+    Delete all but the `keep` newest versions, never the current one
+    """
+    current = current_version(path)
+    for version in list_versions(path)[:-keep]:
+        if version != current:
+            shutil.rmtree(os.path.join(path, version), ignore_errors=True)
+            print("Removed dashboard snapshot {}".format(version))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build the dashboard snapshot that app.py loads at startup')
+    parser.add_argument('--path', type=str, default=DASHBOARD_PATH)
+    parser.add_argument('--keep', type=int, default=3, help='number of versions to keep on disk')
+    parser.add_argument('--list', action='store_true', help='list the versions on disk and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        current = current_version(args.path)
+        for version in list_versions(args.path):
+            print('{} {}'.format('*' if version == current else ' ', version))
+    else:
+        build_dashboard_snapshot(args.path)
+        prune_versions(args.path, args.keep)
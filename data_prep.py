@@ -1,9 +1,15 @@
-import glob
+import numpy as np
 import pandas as pd
 from collections import Counter
-import datetime
-import os
-import pickle
+
+import language_id
+import token_counts
+import tweet_store
+from cache_manager import cached, TWEET_INPUTS
+from engagement import apply_latest_engagement
+from language_id import load_languages
+from token_counts import TokenCounter
+from tweet_store import load_tweets
 
 # Constants
 day_of_week_mapping = {0: 'Monday', 1: 'Tuesday', 2: 'Wednesday', 3: 'Thursday', 4: 'Friday', 5: 'Saturday', 6: 'Sunday'}
@@ -14,194 +20,266 @@ hour_dict = {'00': 'Midnight', '01': '1:00 AM', '02': '2:00 AM', '03': '3:00 AM'
              '13': '1:00 PM', '14': '2:00 PM', '15': '3:00 PM', '16': '4:00 PM', '17': '5:00 PM', '18': '6:00 PM',
              '19': '7:00 PM', '20': '8:00 PM', '21': '9:00 PM', '22': '10:00 PM', '23': '11:00 PM'}
 
-# TODO CACHE ALL OF THESE
+ELECTION_DAY = pd.Timestamp(2019, 10, 21)
+
+USE_COLS = ['username', #'to',
+            'text', 'retweets', 'favorites', 'id', #'replies',
+   #'permalink', 'author_id', 'formatted_date',
+            'date', 'mentions',
+            'hashtags',  #'geo',
+            'urls']
+
+
+def clean_data(df):
+    """
+    Compact dtypes and add the derived date columns, all vectorized:
+        day: tweet date at midnight (datetime64), day_of_week: categorical name, hour: int8 (UTC),
+        days_until_election: int16, leader: categorical username for party leaders, NaN otherwise
+    """
+    df = df.reset_index(drop=True)
+    df['username'] = df['username'].astype('category')
+    df['leader'] = pd.Categorical(df['username'].where(df['username'].isin(LEADER_USERNAMES)), categories=LEADER_USERNAMES)
+    # int32 rather than the smallest fit so refreshed engagement counters can't overflow
+    for col in ['retweets', 'favorites']:
+        df[col] = df[col].fillna(0).astype('int32')
+
+    date = pd.to_datetime(df['date'], utc=True).dt.tz_convert(None)
+    df['date'] = date
+    df['day'] = date.dt.normalize()
+    df['day_of_week'] = pd.Categorical.from_codes(date.dt.dayofweek, categories=[day_of_week_mapping[i] for i in range(7)])
+    df['hour'] = date.dt.hour.astype('int8')
+    df['days_until_election'] = (df['day'] - ELECTION_DAY).dt.days.astype('int16')
+    return df
 
-def load_and_clean_data():
 
-    THIS_FILE = 'cache/df.pkl'
+def load_and_clean_data(workers=None):
+    df = _load_clean_tweets(workers)
+    # favorites/retweets keep growing after the scrape, pick up the latest refreshed counters
+    df = apply_latest_engagement(df)
+    return df
 
-    USE_COLS = ['username', #'to',
-                'text', 'retweets', 'favorites', #'replies', 'id',
-       #'permalink', 'author_id', 'formatted_date',
-                'date', 'mentions',
-                'hashtags',  #'geo',
-                'urls']
 
-    if not os.path.isfile(THIS_FILE):
-        files = glob.glob('tweets/cdnpoli_*.csv') #[0:30] #TODO get rid of this sample
-        df = pd.read_csv(files[0], usecols=USE_COLS)
+@cached('df_compact', inputs=TWEET_INPUTS, depends=[tweet_store, language_id])
+def _load_clean_tweets(workers=None):
+    df = clean_data(load_tweets(USE_COLS, workers=workers))
+    df['lang'] = load_languages(df['id'])  # routes the NLP scripts' per-language pipelines
+    return df
 
-        for file in files[1:]:
-            df_tmp = pd.read_csv(file, usecols=USE_COLS)
-            df = pd.concat([df, df_tmp])
 
-        df['day'] = pd.to_datetime(df['date']).dt.date
-        df['day_of_week'] = [x.weekday() for x in df['day']]
-        df.replace({'day_of_week': day_of_week_mapping})
+# Dashboard aggregates are built in two steps so they can be computed one day at a time (see daily_aggregates.py):
+#   PARTIALS[name](df) -> a mergeable partial (Counter, histogram or candidate rows) for a slice of tweets
+#   OUTPUTS[name](merged partials) -> the table shown on the dashboard
+# Counters keep keys in first-seen order, so merging days in load order breaks most_common() ties like one full pass.
 
-        pickle.dump(df, open(THIS_FILE, 'wb'))
-    else:
-        print("Loading {} from cache".format(THIS_FILE))
-        df = pickle.load(open(THIS_FILE, 'rb'))
-    return df
+def _count_tokens(series):
+    return TokenCounter(series).to_counter()
 
 
-def data_prep_calculate_tweet_volume(df):
+def _counts_first_seen(values, weights=None):
+    counts = values.value_counts() if weights is None else weights.groupby(values, observed=True).sum()
+    counts.index = counts.index.astype(object)
+    first_seen = values.dropna().drop_duplicates().astype(object).tolist()
+    return Counter(dict(zip(first_seen, counts.reindex(first_seen).tolist())))
 
-    THIS_FILE = 'cache/tweet_volume_df.pkl'
 
-    if not os.path.isfile(THIS_FILE):
-        tweet_volume_df = pd.DataFrame(data={'num_tweets': df['day'].value_counts().sort_index(),
-                                             'day_of_week': pd.to_datetime(df['day'].value_counts().sort_index().index).dayofweek.map(day_of_week_mapping)},
-                                       index=df['day'].value_counts().sort_index().index)
-        pickle.dump(tweet_volume_df, open(THIS_FILE, 'wb'))
-    else:
-        print("Loading {} from cache".format(THIS_FILE))
-        tweet_volume_df = pickle.load(open(THIS_FILE, 'rb'))
-    return tweet_volume_df
+def _top_rows(df, col, n=10):
+    return df.nlargest(n, col)[['username', 'day', 'text', col]]
 
 
-def data_prep_accounts_by_tweet_volume(df):
-    volume_df = df['username'].value_counts().head(10).to_frame()
-    return volume_df
+def _leader_rows(df):
+    leader_df = df[df['leader'].notna()].copy()
+    # small frame, plain values keep the dash tables and groupbys the same as before
+    leader_df['username'] = leader_df['username'].astype(str)
+    leader_df['day'] = leader_df['day'].dt.date
+    return leader_df
 
 
-def data_prep_retweet_df(df):
+def _leader_hashtags(df):
+    counters = TokenCounter(df['hashtags']).counters_by(df['leader'])
+    return {leader: counters.get(leader, Counter()) for leader in LEADER_USERNAMES}
 
-    THIS_FILE = 'cache/retweet_df.pkl'
 
-    if not os.path.isfile(THIS_FILE):
-        retweet_df = df.sort_values(by=['retweets'], ascending=False)[['username', 'day', 'text', 'retweets']].head(10)
-        pickle.dump(retweet_df, open(THIS_FILE, 'wb'))
-    else:
-        print("Loading {} from cache".format(THIS_FILE))
-        retweet_df = pickle.load(open(THIS_FILE, 'rb'))
-    return retweet_df
+PARTIALS = {
+    'days': lambda df: Counter(df['day'].value_counts().to_dict()),
+    'hours': lambda df: np.bincount(df['hour'], minlength=24),
+    'usernames': lambda df: _counts_first_seen(df['username']),
+    'mentions': lambda df: _count_tokens(df['mentions']),
+    'hashtags': lambda df: _count_tokens(df['hashtags']),
+    'urls': lambda df: _count_tokens(df['urls']),
+    'leader_hashtags': _leader_hashtags,
+    # the partials below read favorites/retweets, which change with every engagement refresh
+    'favorites_by_user': lambda df: _counts_first_seen(df['username'], df['favorites']),
+    'retweets_by_user': lambda df: _counts_first_seen(df['username'], df['retweets']),
+    'top_favorites': lambda df: _top_rows(df, 'favorites'),
+    'top_retweets': lambda df: _top_rows(df, 'retweets'),
+    'leader_rows': _leader_rows,
+}
+ENGAGEMENT_PARTIALS = ['favorites_by_user', 'retweets_by_user', 'top_favorites', 'top_retweets', 'leader_rows']
 
 
-def data_prep_favorites_df(df):
-    faves_df = df.sort_values(by=['favorites'], ascending=False)[['username', 'day', 'text', 'favorites']].head(10)
-    return faves_df
+def compute_partials(df, names=None):
+    names = names if names is not None else list(PARTIALS)
+    return {name: PARTIALS[name](df) for name in names}
 
 
-def data_prep_top10_mentions(df):
+def _merge_values(values):
+    first = values[0]
+    if isinstance(first, Counter):
+        merged = Counter()
+        for value in values:
+            merged.update(value)
+        return merged
+    if isinstance(first, dict):
+        return {key: _merge_values([value[key] for value in values]) for key in first}
+    if isinstance(first, pd.DataFrame):
+        return pd.concat(values, ignore_index=True, sort=False)
+    return sum(values[1:], first)
 
-    THIS_FILE = 'cache/mentions_df.pkl'
 
-    if not os.path.isfile(THIS_FILE):
-        all_mentions = df['mentions'].str.cat(sep=' ').split(' ')
-        mentions_df = pd.DataFrame(Counter(all_mentions).most_common(10), columns=['mentions', 'count'])
-        pickle.dump(mentions_df, open(THIS_FILE, 'wb'))
-    else:
-        print("Loading {} from cache".format(THIS_FILE))
-        mentions_df = pickle.load(open(THIS_FILE, 'rb'))
-    return mentions_df
+def merge_partials(partials):
+    """
+    Merge a list of compute_partials() dicts, in the order the tweets were loaded
+    """
+    return {name: _merge_values([p[name] for p in partials]) for name in partials[0]}
 
 
-def data_prep_top10_accounts_fave(df):
+def finalize_tweet_volume(p):
+    days = pd.DatetimeIndex(sorted(p['days']))
+    return pd.DataFrame(data={'num_tweets': [p['days'][day] for day in days],
+                              'day_of_week': days.dayofweek.map(day_of_week_mapping)},
+                        index=days.date)
 
-    THIS_FILE = 'cache/top10_accounts_faves_df.pkl'
 
-    if not os.path.isfile(THIS_FILE):
-        top10_accounts_faves_df = df.groupby(['username']).agg({'favorites': sum}).sort_values('favorites', ascending=False).head(10)
-        pickle.dump(top10_accounts_faves_df, open(THIS_FILE, 'wb'))
-    else:
-        print("Loading {} from cache".format(THIS_FILE))
-        top10_accounts_faves_df = pickle.load(open(THIS_FILE, 'rb'))
+def finalize_accounts_by_tweet_volume(p):
+    top = p['usernames'].most_common(10)
+    return pd.DataFrame({'username': [count for _, count in top]}, index=[user for user, _ in top])
 
-    return top10_accounts_faves_df
 
+def _finalize_top_rows(rows, col):
+    top = rows.reset_index(drop=True).nlargest(10, col).reset_index(drop=True)
+    top['username'] = top['username'].astype(str)
+    top['day'] = pd.to_datetime(top['day']).dt.date
+    return top
 
-def data_prep_top10_accounts_retweets(df):
 
-    THIS_FILE = 'cache/top10_accounts_retweets_df.pkl'
+def _finalize_top_accounts(counts, col):
+    top = pd.DataFrame(counts.most_common(10), columns=['username', col])
+    return top.set_index('username')
 
-    if not os.path.isfile(THIS_FILE):
-        top10_accounts_retweets_df = df.groupby(['username']).agg({'retweets': sum}).sort_values('retweets', ascending=False).head(10)
-        pickle.dump(top10_accounts_retweets_df, open(THIS_FILE, 'wb'))
-    else:
-        print("Loading {} from cache".format(THIS_FILE))
-        top10_accounts_retweets_df = pickle.load(open(THIS_FILE, 'rb'))
 
-    return top10_accounts_retweets_df
+def finalize_tweets_by_time(p):
+    hours = p['hours']
+    average_number_of_tweets_per_hour = pd.Series(hours[hours > 0] / len(p['days']), name='hour',
+                                                  index=['{:02d}'.format(hour) for hour in np.nonzero(hours)[0]])
+    return average_number_of_tweets_per_hour
 
 
-def data_prep_hashtag_counts_df(df):
+def finalize_links(p):
+    links = Counter({link: count for link, count in p['urls'].items() if 'twitter' not in link})
+    return pd.DataFrame(links.most_common(10), columns=['link', 'count'])
+
+
+def finalize_domains(p):
+    from urllib.parse import urlparse
+    domains = Counter()
+    for link, count in p['urls'].items():
+        if all(x not in link for x in ['twitter', 'bit.ly', 'ow.ly']):
+            domains[urlparse(link).netloc] += count
+    return pd.DataFrame(domains.most_common(10), columns=['domain', 'count'])
+
+
+def finalize_overview(p):
+    days = sorted(p['days'])
+    return {'min_date': days[0].date() if days else None, 'max_date': days[-1].date() if days else None,
+            'total_num_tweets': sum(p['days'].values()), 'num_tweeters': len(p['usernames']),
+            'num_hashtags': len(p['hashtags'])}
+
+
+OUTPUTS = {
+    'tweet_volume_df': finalize_tweet_volume,
+    'top10_accounts_by_tweets_df': finalize_accounts_by_tweet_volume,
+    'mentions_df': lambda p: pd.DataFrame(p['mentions'].most_common(10), columns=['mentions', 'count']),
+    'top10_accounts_faves_df': lambda p: _finalize_top_accounts(p['favorites_by_user'], 'favorites'),
+    'top10_accounts_retweets_df': lambda p: _finalize_top_accounts(p['retweets_by_user'], 'retweets'),
+    'retweet_df': lambda p: _finalize_top_rows(p['top_retweets'], 'retweets'),
+    'favorites_df': lambda p: _finalize_top_rows(p['top_favorites'], 'favorites'),
+    'hashtag_counts_df': lambda p: pd.DataFrame(p['hashtags'].most_common(25), columns=['hashtag', 'count']),
+    'average_number_of_tweets_per_hour': finalize_tweets_by_time,
+    'links_df': finalize_links,
+    'domains_df': finalize_domains,
+    'leader_df': lambda p: p['leader_rows'].reset_index(drop=True),
+    'leader_hashtag_counts': lambda p: {leader: pd.DataFrame(counts.most_common(10), columns=['hashtag', 'count'])
+                                        for leader, counts in p['leader_hashtags'].items()},
+    'overview': finalize_overview,
+}
+
+
+# the keys cover this module's source, so editing PARTIALS, OUTPUTS or a finalize_* function rebuilds these
+@cached('tweet_volume_df', depends=[token_counts])
+def data_prep_calculate_tweet_volume(df):
+    return finalize_tweet_volume(compute_partials(df, ['days']))
 
-    THIS_FILE = 'cache/hashtag_counts_df.pkl'
 
-    if not os.path.isfile(THIS_FILE):
-        all_hashtags = df['hashtags'].str.cat(sep=' ').split(' ')
-        hashtag_counts_df = pd.DataFrame(Counter(all_hashtags).most_common(25), columns=['hashtag', 'count'])
-        pickle.dump(hashtag_counts_df, open(THIS_FILE, 'wb'))
-    else:
-        print("Loading {} from cache".format(THIS_FILE))
-        hashtag_counts_df = pickle.load(open(THIS_FILE, 'rb'))
-    return hashtag_counts_df
+@cached('accounts_by_tweet_volume_df', depends=[token_counts])
+def data_prep_accounts_by_tweet_volume(df):
+    return finalize_accounts_by_tweet_volume(compute_partials(df, ['usernames']))
 
 
-def data_prep_tweets_by_time(df):
+@cached('retweet_df', depends=[token_counts])
+def data_prep_retweet_df(df):
+    return OUTPUTS['retweet_df'](compute_partials(df, ['top_retweets']))
 
-    THIS_FILE = 'cache/average_number_of_tweets_per_hour.pkl'
 
-    if not os.path.isfile(THIS_FILE):
-        df['date'] = pd.to_datetime(df['date'])
-        df['hour'] = df['date'].dt.strftime('%H')
-        average_number_of_tweets_per_hour = df.groupby(['hour'])['hour'].count() / df['day'].nunique()
-        pickle.dump(average_number_of_tweets_per_hour, open(THIS_FILE, 'wb'))
-    else:
-        print("Loading {} from cache".format(THIS_FILE))
-        average_number_of_tweets_per_hour = pickle.load(open(THIS_FILE, 'rb'))
-    return average_number_of_tweets_per_hour
+@cached('favorites_df', depends=[token_counts])
+def data_prep_favorites_df(df):
+    return OUTPUTS['favorites_df'](compute_partials(df, ['top_favorites']))
 
 
-def data_prep_links_df(df):
-    # TODO: cache this, maybe (needs to return 2 things)
-    links_to_keep = []
-    all_urls = df['urls'].str.cat(sep=' ').split(' ')
-    for link in all_urls:
-        if 'twitter' not in link:
-            links_to_keep.append(link)
-    links_df = pd.DataFrame(Counter(links_to_keep).most_common(10), columns=['link', 'count'])
-    return links_df, all_urls
+@cached('mentions_df', depends=[token_counts])
+def data_prep_top10_mentions(df):
+    return OUTPUTS['mentions_df'](compute_partials(df, ['mentions']))
 
 
-def data_prep_domains_df(all_urls):
+@cached('top10_accounts_faves_df', depends=[token_counts])
+def data_prep_top10_accounts_fave(df):
+    return OUTPUTS['top10_accounts_faves_df'](compute_partials(df, ['favorites_by_user']))
+
+
+@cached('top10_accounts_retweets_df', depends=[token_counts])
+def data_prep_top10_accounts_retweets(df):
+    return OUTPUTS['top10_accounts_retweets_df'](compute_partials(df, ['retweets_by_user']))
+
+
+@cached('hashtag_counts_df', depends=[token_counts])
+def data_prep_hashtag_counts_df(df):
+    return OUTPUTS['hashtag_counts_df'](compute_partials(df, ['hashtags']))
+
+
+@cached('average_number_of_tweets_per_hour', depends=[token_counts])
+def data_prep_tweets_by_time(df):
+    return finalize_tweets_by_time(compute_partials(df, ['hours', 'days']))
+
+
+@cached('links_df', depends=[token_counts])
+def data_prep_links_df(df):
+    """
+    :return: top 10 links, and the url counts to pass on to data_prep_domains_df
+    """
+    p = compute_partials(df, ['urls'])
+    return finalize_links(p), p['urls']
 
-    THIS_FILE = 'cache/domains_df.pkl'
 
-    if not os.path.isfile(THIS_FILE):
-        from urllib.parse import urlparse
-        domains = []
-        for link in all_urls:
-            if all(x not in link for x in ['twitter', 'bit.ly', 'ow.ly']):
-                domains.append(urlparse(link).netloc)
-        domains_df = pd.DataFrame(Counter(domains).most_common(10), columns=['domain', 'count'])
-        pickle.dump(domains_df, open(THIS_FILE, 'wb'))
-    else:
-        print("Loading {} from cache".format(THIS_FILE))
-        domains_df = pickle.load(open(THIS_FILE, 'rb'))
-    return domains_df
+@cached('domains_df', depends=[token_counts])
+def data_prep_domains_df(all_urls):
+    all_urls = all_urls if isinstance(all_urls, Counter) else Counter(all_urls)
+    return finalize_domains({'urls': all_urls})
 
 
+@cached('leader_df', depends=[token_counts])
 def data_prep_leader_df(df):
-    leader_df = df[df['username'].isin(LEADER_USERNAMES)]
-    leader_df['days_until_election'] = [(x - datetime.date(2019, 10, 21)).days for x in pd.to_datetime(leader_df['day']).dt.date]
-    return leader_df
+    return OUTPUTS['leader_df'](compute_partials(df, ['leader_rows']))
 
 
+@cached('leader_hashtag_counts', depends=[token_counts])
 def data_prep_count_hashtags_by_leader(df):
-
-    THIS_FILE = 'cache/leader_hashtag_counts.pkl'
-
-    if not os.path.isfile(THIS_FILE):
-        leader_hashtag_counts = {}
-        for leader in LEADER_USERNAMES:
-            leader_hashtags = df[df['username'] == leader]['hashtags'].str.cat(sep=' ').split(' ')
-            leader_hashtag_counts_df = pd.DataFrame(Counter(leader_hashtags).most_common(10), columns=['hashtag', 'count'])
-            leader_hashtag_counts[leader] = leader_hashtag_counts_df
-        pickle.dump(leader_hashtag_counts, open(THIS_FILE, 'wb'))
-    else:
-        print("Loading {} from cache".format(THIS_FILE))
-        leader_hashtag_counts = pickle.load(open(THIS_FILE, 'rb'))
-    return leader_hashtag_counts
+    return OUTPUTS['leader_hashtag_counts'](compute_partials(df, ['leader_hashtags']))
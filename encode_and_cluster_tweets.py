@@ -1,11 +1,13 @@
 import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
-import glob
 import pandas as pd
 import numpy as np
 import seaborn as sns
 from utils import get_logger, check_gpu
+from tweet_store import load_tweets
+from text_dedup import TextDedup
+from language_id import load_languages, route_by_language
 from sklearn.cluster import KMeans
 
 import tensorflow_hub as hub
@@ -43,6 +45,40 @@ def embed_tweets(tweets_to_encode):
     return tweets_embeddings
 
 
+def embed_in_batches(texts, batch_size=200000):
+    # logger.info("Splitting sentences into batches")
+    sentences_batched = list(split_sentences(texts, batch_size))
+    logger.info("Done batching tweets")
+
+    texts_embedded = []
+
+    logger.info("Embedding tweets")
+    for i, tweet_batch in enumerate(sentences_batched):
+        logger.info("Batch {} of {}".format(i, len(sentences_batched)))
+        tweets_embedding = embed_tweets([str(tweet) for tweet in tweet_batch])
+        texts_embedded.extend(tweets_embedding)
+    return np.array(texts_embedded)
+
+
+def clean_and_embed(texts):
+    """
+    (cleaned text, embedding) of each text: retweets and copy-pasted messages are tokenized and embedded once
+    """
+    dedup = TextDedup(texts)
+
+    logger.info("Tokenizing with NLTK's TweetTokenizer")
+    detokenizer = TreebankWordDetokenizer()
+    tweet_tokenizer = TweetTokenizer(preserve_case=False, strip_handles=False, reduce_len=False)
+    texts_clean = dedup.apply('Tokenization', lambda texts: [detokenizer.detokenize(tweet_tokenizer.tokenize(str(tweet)))
+                                                             for tweet in texts])
+
+    # the embeddings are computed for the cleaned version of each unique text it is given
+    clean_by_text = dict(zip(dedup.unique_texts, texts_clean))
+    embeddings = dedup.apply('Sentence embedding',
+                             lambda unique_texts: embed_in_batches([clean_by_text[text] for text in unique_texts]))
+    return list(zip(dedup.expand(texts_clean), dedup.expand(embeddings)))
+
+
 def plot_similarity(labels, features, rotation):
     print("Calculating inner product of embedding vectors")
     corr = np.inner(features, features)
@@ -64,17 +100,15 @@ check_gpu()
 module_url = 'https://tfhub.dev/google/universal-sentence-encoder/2'
 tf_hub_embedder = hub.Module(module_url)
 
+# the encoder's languages; undetermined tweets are mostly names, hashtags and links
+ENCODER_LANGUAGES = ['en', 'und']
+
 # Hyperparameter search for number of clusters for k-means
 n_clusters = [5, 10, 12, 14, 16]
 clustering_method = 'kmeans'
 
 logger.info("Loading data")
-files = glob.glob('tweets/cdnpoli_*.csv')
-df = pd.read_csv(files[0])
-
-for file in files[1:]:
-    df_tmp = pd.read_csv(file)
-    df = pd.concat([df, df_tmp])
+df = load_tweets()
 
 # Add a date column without timestamps
 df['day'] = pd.to_datetime(df['date']).dt.date
@@ -82,32 +116,31 @@ df['day'] = pd.to_datetime(df['date']).dt.date
 logger.info("Data successfully loaded")
 #df = df.head(100) # TODO REMOVE THIS!!!
 
-if not os.path.isfile('cache/all_tweets_embedded.pkl'):
+# the language detected once per day of the store (language_id.py)
+df['lang'] = load_languages(df['id'])
+
+if not os.path.isfile('cache/english_tweets_embedded_by_id.pkl'):
     logger.info("Running sentence embedding")
     os.environ['CLASSPATH'] = 'stanford-postagger-2018-10-16'
 
-    logger.info("Tokenizing with NLTK's TweetTokenizer")
-    # TODO figure out how much of this will be poor performance due to the French
-    detokenizer = TreebankWordDetokenizer()
-    tweet_tokenizer = TweetTokenizer(preserve_case=False, strip_handles=False, reduce_len=False)
-    df['text_clean'] = [detokenizer.detokenize(tweet_tokenizer.tokenize(str(tweet))) for tweet in df['text']]
-
-    # logger.info("Splitting sentences into batches")
-    tweets_to_embed = list(df['text_clean'])
-    sentences_batched = list(split_sentences(tweets_to_embed, 200000))
-    logger.info("Done batching tweets")
-
-    all_tweets_embedded = []
-
-    logger.info("Embedding tweets")
-    for i, tweet_batch in enumerate(sentences_batched):
-        logger.info("Batch {} of {}".format(i, len(sentences_batched)))
-        tweets_embedding = embed_tweets([str(tweet) for tweet in tweet_batch])
-        all_tweets_embedded.extend(tweets_embedding)
-    pickle.dump(all_tweets_embedded, open('cache/all_tweets_embedded.pkl', 'wb'))
+    # the Universal Sentence Encoder is English-only: French tweets are skipped and left out of the clustering
+    embedded, _ = route_by_language(df['lang'], df['text'], {lang: clean_and_embed for lang in ENCODER_LANGUAGES},
+                                    name='Sentence embedding')
+    keep = np.array([result is not None for result in embedded], dtype=bool)
+    df = df[keep].reset_index(drop=True)
+    df['text_clean'] = [result[0] for result in embedded if result is not None]
+    all_tweets_embedded = np.array([result[1] for result in embedded if result is not None])
+    pickle.dump((df['id'].values, all_tweets_embedded), open('cache/english_tweets_embedded_by_id.pkl', 'wb'))
 else:
     logger.info("Loaded embedded tweets from cache")
-    all_tweets_embedded = pickle.load(open('cache/all_tweets_embedded.pkl', 'rb'))
+    embedded_ids, all_tweets_embedded = pickle.load(open('cache/english_tweets_embedded_by_id.pkl', 'rb'))
+    # tweets removed from the store since the embeddings were cached are left out of the clustering
+    in_store = np.isin(embedded_ids, df['id'].values)
+    if not in_store.all():
+        logger.warning("{:,} of {:,} cached embeddings are of tweets no longer in the store, skipping them".format(
+            (~in_store).sum(), len(embedded_ids)))
+        embedded_ids, all_tweets_embedded = embedded_ids[in_store], all_tweets_embedded[in_store]
+    df = df.set_index('id').loc[embedded_ids].reset_index()
 
 # TODO try other clustering techniques
 # logger.info("Clustering method: {}".format(clustering_method))
@@ -0,0 +1,109 @@
+# Refresh favorites/retweets for tweets we already have, without re-scraping text and metadata.
+# python engagement.py --since 2019-09-01
+import datetime
+import glob
+import os
+
+import pandas as pd
+
+from tweet_store import load_tweets
+
+SNAPSHOT_PATH = 'tweets/engagement'
+SNAPSHOT_FORMAT = 'snapshot=%Y%m%dT%H%M%S.parquet'
+ENGAGEMENT_COLS = ['retweets', 'favorites']
+
+
+def lookup_engagement_tweepy(api, ids, rate_limiter=None):
+    """
+    Current counters for up to 100 tweet ids via statuses/lookup; deleted or protected tweets are left out
+    """
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    statuses = api.statuses_lookup(list(ids), include_entities=False, trim_user=True)
+    return [{'id': s.id, 'retweets': s.retweet_count, 'favorites': s.favorite_count} for s in statuses]
+
+
+def write_snapshot(engagement_df, snapshot_time=None, snapshot_path=SNAPSHOT_PATH):
+    snapshot_time = snapshot_time if snapshot_time is not None else datetime.datetime.utcnow()
+    os.makedirs(snapshot_path, exist_ok=True)
+    file_path = os.path.join(snapshot_path, snapshot_time.strftime(SNAPSHOT_FORMAT))
+
+    engagement_df = engagement_df[['id'] + ENGAGEMENT_COLS].astype('int64')
+    tmp_path = file_path + '.tmp'
+    engagement_df.to_parquet(tmp_path, engine='pyarrow', index=False)
+    os.replace(tmp_path, file_path)
+    return file_path
+
+
+def list_snapshots(snapshot_path=SNAPSHOT_PATH):
+    # the timestamp in the file name sorts chronologically
+    return sorted(glob.glob(os.path.join(snapshot_path, 'snapshot=*.parquet')))
+
+
+def read_latest_engagement(snapshot_path=SNAPSHOT_PATH):
+    """
+    Most recent counters per tweet id across all snapshots (a refresh may only cover some days)
+    """
+    snapshots = list_snapshots(snapshot_path)
+    if not snapshots:
+        return pd.DataFrame(columns=['id'] + ENGAGEMENT_COLS)
+    engagement_df = pd.concat([pd.read_parquet(f, engine='pyarrow') for f in snapshots], ignore_index=True)
+    return engagement_df.drop_duplicates(subset=['id'], keep='last')
+
+
+def apply_latest_engagement(df, snapshot_path=SNAPSHOT_PATH, latest=None):
+    """
+    Overwrite the scraped retweets/favorites in df with the latest snapshot, joined on tweet id
+    :param latest: read_latest_engagement() result, to avoid re-reading the snapshots for every day
+    """
+    latest = latest if latest is not None else read_latest_engagement(snapshot_path)
+    if latest.empty:
+        return df
+    latest = latest.set_index('id')
+    for col in ENGAGEMENT_COLS:
+        if col in df.columns:
+            df[col] = df['id'].map(latest[col]).fillna(df[col]).astype(df[col].dtype)
+    return df
+
+
+def refresh_engagement(lookup, start_day=None, end_day=None, batch_size=100, snapshot_path=SNAPSHOT_PATH):
+    """
+    :param lookup: function(list of ids) -> list of {'id', 'retweets', 'favorites'} dicts
+    :param start_day: only refresh tweets from this day on (the old ones have mostly stopped moving)
+    :return: path of the new snapshot
+    """
+    ids = load_tweets(['id'], start_day, end_day)['id'].drop_duplicates().tolist()
+    print("Refreshing engagement for {:,} tweets".format(len(ids)))
+
+    rows = []
+    for i in range(0, len(ids), batch_size):
+        if i % (batch_size * 100) == 0:
+            print("Looked up {:,} of {:,} tweets".format(i, len(ids)))
+        rows.extend(lookup(ids[i:i + batch_size]))
+
+    file_path = write_snapshot(pd.DataFrame(rows, columns=['id'] + ENGAGEMENT_COLS), snapshot_path=snapshot_path)
+    print("Wrote {:,} engagement counters to {}".format(len(rows), file_path))
+    return file_path
+
+
+if __name__ == '__main__':
+    import argparse
+    from functools import partial
+
+    import tweepy
+    from secrets import consumer_key, consumer_secret, access_key, access_secret
+    from scrape_scheduler import TokenBucket
+
+    parser = argparse.ArgumentParser(description='Refresh favorites/retweets for already scraped tweets')
+    parser.add_argument('--since', type=str, default=None)
+    parser.add_argument('--until', type=str, default=None)
+    # statuses/lookup allows 900 calls per 15 minute window
+    parser.add_argument('--rate', type=float, default=1.0, help='max lookups per second')
+    args = parser.parse_args()
+
+    auth = tweepy.OAuthHandler(consumer_key, consumer_secret)
+    auth.set_access_token(access_key, access_secret)
+    api = tweepy.API(auth, wait_on_rate_limit=True)
+
+    refresh_engagement(partial(lookup_engagement_tweepy, api, rate_limiter=TokenBucket(args.rate)),
+                       start_day=args.since, end_day=args.until)
@@ -0,0 +1,104 @@
+# Named entities already extracted, keyed on a hash of the normalized tweet text, so named_entity_resolution.py only
+# tags tweets that are new or whose text changed.
+# cache/ner_entities-<model>.npz: sorted int64 text hashes, and each text's entities tab-separated in one utf-8 blob
+import hashlib
+import os
+
+import numpy as np
+
+from cache_manager import CACHE_DIR
+from text_dedup import normalize_text
+
+ENTITY_CACHE_PATH = os.path.join(CACHE_DIR, 'ner_entities-{}.npz')
+SEPARATOR = '\t'  # entities are space-joined tokens, never contain a tab
+
+
+def text_key(text):
+    """
+    64-bit hash of the normalized text
+    """
+    text = normalize_text(text)
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def _encode(entities_per_text):
+    encoded = [SEPARATOR.join(entities).encode('utf-8') for entities in entities_per_text]
+    offsets = np.zeros(len(encoded) + 1, dtype='int64')
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+    return offsets, np.frombuffer(b''.join(encoded), dtype='uint8')
+
+
+class EntityCache(object):
+    """
+    text hash -> entities, loaded whole; add() buffers new entries and save() merges them into the file.
+    One writer at a time.
+    """
+    def __init__(self, model, path=None):
+        self.path = path or ENTITY_CACHE_PATH.format(model)
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.isfile(self.path):
+            with np.load(self.path) as data:
+                self.keys, self.offsets, self.blob = data['keys'], data['offsets'], data['blob']
+        else:
+            self.keys, self.offsets, self.blob = np.empty(0, dtype='int64'), np.zeros(1, dtype='int64'), np.empty(0, dtype='uint8')
+
+    def __len__(self):
+        return len(self.keys) + len(self.pending)
+
+    def _entities(self, i):
+        text = bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+        return text.split(SEPARATOR) if text else []
+
+    def get_many(self, keys):
+        """
+        Entities of each key, None where they were never extracted; counted in hits / misses
+        """
+        keys = np.asarray(keys, dtype='int64')
+        results = [None] * len(keys)
+        if len(self.keys):
+            pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+            for i in np.flatnonzero(self.keys[pos] == keys):
+                results[i] = self._entities(pos[i])
+        for i, key in enumerate(keys.tolist()):
+            if results[i] is None and key in self.pending:
+                results[i] = self.pending[key]
+        found = sum(result is not None for result in results)
+        self.hits += found
+        self.misses += len(keys) - found
+        return results
+
+    def add(self, keys, entities_per_text):
+        self.pending.update(zip(np.asarray(keys, dtype='int64').tolist(), entities_per_text))
+
+    def save(self):
+        if not self.pending:
+            return
+        pending = {key: entities for key, entities in self.pending.items()
+                   if not len(self.keys) or self.keys[min(np.searchsorted(self.keys, key), len(self.keys) - 1)] != key}
+        new_keys = np.array(list(pending), dtype='int64')
+        new_offsets, new_blob = _encode(list(pending.values()))
+        keys = np.concatenate([self.keys, new_keys])
+        lengths = np.concatenate([np.diff(self.offsets), np.diff(new_offsets)])
+        blob = np.concatenate([self.blob, new_blob])
+        starts = np.concatenate([self.offsets[:-1], new_offsets[:-1] + len(self.blob)])
+
+        order = np.argsort(keys, kind='stable')
+        keys, starts, lengths = keys[order], starts[order], lengths[order]
+        offsets = np.zeros(len(keys) + 1, dtype='int64')
+        np.cumsum(lengths, out=offsets[1:])
+        # gather each entry's bytes in key order
+        byte_index = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        self.keys, self.offsets, self.blob = keys, offsets, blob[byte_index]
+        self.pending = {}
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, keys=self.keys, offsets=self.offsets, blob=self.blob)
+        os.replace(tmp_path, self.path)
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
@@ -0,0 +1,102 @@
+# Local stand-in for GetOldTweets3's TweetManager so the scraper can be exercised offline:
+#   manager = FakeTweetManager(make_canned_tweets('2019-10-01', '2019-10-06'), latency=0.05)
+#   python scrape_twitter_daily.py --fake
+import datetime
+import random
+import re
+import threading
+import time
+
+TWITTER_EPOCH_MS = 1288834974657
+
+
+class FakeTweet(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeTweetManager(object):
+    """
+    Replays canned tweets for TweetCriteria (since/until, maxTweets and a `max_id:` search operator)
+    :param tweets: list of FakeTweet (or anything with `id` and `date` attributes)
+    :param latency: seconds slept per page of `page_size` tweets, to mimic Twitter's paging
+    :param failure_rate: probability that a call raises, to exercise retries
+    """
+    page_size = 20
+
+    def __init__(self, tweets, latency=0.0, failure_rate=0.0, seed=0):
+        self.tweets = sorted(tweets, key=lambda t: t.id, reverse=True)  # search results are newest first
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.num_calls = 0
+
+    def _matches(self, tweet, since, until, max_id):
+        day = tweet.date.strftime('%Y-%m-%d')
+        if since and day < since:
+            return False
+        if until and day >= until:
+            return False
+        return max_id is None or tweet.id <= max_id
+
+    def getTweets(self, tweetCriteria, receiveBuffer=None, bufferLength=100, proxy=None, debug=False):
+        with self.lock:
+            self.num_calls += 1
+            fail = self.random.random() < self.failure_rate
+        if fail:
+            time.sleep(self.latency)
+            raise ConnectionError('FakeTweetManager: simulated failure')
+
+        query = getattr(tweetCriteria, 'querySearch', '')
+        max_id = re.search(r'max_id:(\d+)', query)
+        max_id = int(max_id.group(1)) if max_id else None
+        since = getattr(tweetCriteria, 'since', None)
+        until = getattr(tweetCriteria, 'until', None)
+        max_tweets = getattr(tweetCriteria, 'maxTweets', 0)
+
+        results = []
+        buffer = []
+        for tweet in self.tweets:
+            if not self._matches(tweet, since, until, max_id):
+                continue
+            if len(results) % self.page_size == 0:
+                time.sleep(self.latency)
+            results.append(tweet)
+            buffer.append(tweet)
+            if receiveBuffer and len(buffer) >= bufferLength:
+                receiveBuffer(buffer)
+                buffer = []
+            if max_tweets and len(results) >= max_tweets:
+                break
+        if receiveBuffer and buffer:
+            receiveBuffer(buffer)
+        return results
+
+
+def make_canned_tweets(since, until, tweets_per_day=500, seed=0):
+    """
+    Synthetic tweets for every day in [since, until], with the same attributes GetOldTweets3 returns
+    """
+    rng = random.Random(seed)
+    usernames = ['JustinTrudeau', 'AndrewScheer', 'ElizabethMay', 'theJagmeetSingh', 'yfblanchet'] + \
+                ['user{}'.format(i) for i in range(200)]
+    hashtags = ['#cdnpoli', '#elxn43', '#polcan', '#ItsOurVote', '#CestNotreVote', '#CanadaDebates2019']
+
+    day = datetime.datetime.strptime(since, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+    last_day = datetime.datetime.strptime(until, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+    tweets = []
+    while day <= last_day:
+        for _ in range(tweets_per_day):
+            date = day + datetime.timedelta(seconds=rng.randrange(86400))
+            # ids increase with time like real snowflake ids
+            tweet_id = (int(date.timestamp() * 1000) - TWITTER_EPOCH_MS) << 22 | rng.randrange(1 << 22)
+            username = rng.choice(usernames)
+            tweets.append(FakeTweet(
+                id=tweet_id, permalink='https://twitter.com/{}/status/{}'.format(username, tweet_id),
+                username=username, to=None, text='canned tweet {} {}'.format(tweet_id, rng.choice(hashtags)),
+                date=date, retweets=rng.randrange(100), favorites=rng.randrange(500), replies=rng.randrange(20),
+                mentions='@' + rng.choice(usernames), hashtags=rng.choice(hashtags), geo='', urls='',
+                author_id=usernames.index(username) + 1, formatted_date=date.strftime('%a %b %d %H:%M:%S +0000 %Y')))
+        day += datetime.timedelta(days=1)
+    return tweets
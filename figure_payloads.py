@@ -0,0 +1,88 @@
+# The dashboard layout (every static figure and table) serialized and compressed once per data version instead of
+# on every page load, served with an ETag so returning visitors get a 304. Also server-side downsampling for
+# time series longer than a chart can draw.
+import gzip
+import hashlib
+import threading
+
+import flask
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+MAX_POINTS = 1000  # about one point per horizontal pixel of a full-width graph
+
+
+class PrecompressedPayload(object):
+    def __init__(self, body, mimetype='application/json'):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()[:16]
+        self.encoded = {'gzip': gzip.compress(body, compresslevel=9)}
+        if brotli is not None:
+            self.encoded['br'] = brotli.compress(body)
+
+    def response(self, request):
+        if self.etag in request.if_none_match:
+            response = flask.Response(status=304)
+        else:
+            accepted = request.accept_encodings
+            encoding = next((e for e in ['br', 'gzip'] if e in self.encoded and accepted[e]), None)
+            response = flask.Response(self.encoded[encoding] if encoding else self.body, mimetype=self.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding  # also keeps Flask-Compress from compressing it again
+        response.set_etag(self.etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'no-cache'  # always revalidate, the data can change under the same url
+        return response
+
+
+class PayloadCache(object):
+    """
+    One PrecompressedPayload per version key; build(version) is only called when the key changes
+    """
+    def __init__(self, build):
+        self.build = build
+        self.lock = threading.Lock()
+        self.key = None
+        self.payload = None
+
+    def get(self, key):
+        with self.lock:
+            if key != self.key:
+                self.payload = PrecompressedPayload(self.build())
+                self.key = key
+            return self.payload
+
+
+def serve_cached_layout(app, version):
+    """
+    Answer Dash's /_dash-layout requests from a PayloadCache keyed on version(), e.g. the snapshot version
+    """
+    cache = PayloadCache(lambda: app.serve_layout().get_data())
+
+    @app.server.before_request
+    def cached_layout():
+        if flask.request.path.endswith('/_dash-layout'):
+            return cache.get(version()).response(flask.request)
+
+    return cache
+
+
+def downsample_indices(y, max_points=MAX_POINTS):
+    """
+    Positions to keep so a line chart of y looks the same: the min and max of each of max_points / 2 buckets
+    in order, so spikes survive. Series that already fit are kept whole.
+    """
+    y = np.asarray(y)
+    if len(y) <= max_points:
+        return np.arange(len(y))
+    edges = np.linspace(0, len(y), max_points // 2 + 1).astype('int64')
+    keep = set()
+    for start, end in zip(edges[:-1], edges[1:]):
+        segment = y[start:end]
+        keep.update([start + int(segment.argmin()), start + int(segment.argmax())])
+    return np.array(sorted(keep))
@@ -176,15 +176,43 @@ def _create_search_criteria(query_string, time_since, time_until, max_tweets):
     return tweetCriteria
 
 
-def _get_tweet_object(tweet_criteria):
+def _get_tweet_object(tweet_criteria, tweet_manager=None):
+    """
+    tweet_manager: anything with GetOldTweets3's TweetManager.getTweets signature, e.g. fake_tweet_manager.FakeTweetManager
+    """
+    tweet_manager = tweet_manager if tweet_manager is not None else got.manager.TweetManager
     with Timer('Get tweets'):
         current_time = datetime.datetime.now().replace(microsecond=0)
         print(f'Start tweet query at: {current_time}')
-        tweets = got.manager.TweetManager.getTweets(tweet_criteria)
+        tweets = tweet_manager.getTweets(tweet_criteria)
         print(f'Done query, {len(tweets):,} tweets returned')
     return tweets
 
 
+def _iter_tweet_chunks(query_string, time_since, time_until, chunk_size=1000, max_id=None, tweet_manager=None,
+                       rate_limiter=None):
+    """
+    Yield lists of at most chunk_size tweets, newest first, so only one chunk is ever held in memory.
+    Each chunk is its own query capped with maxTweets and continued below the last id with `max_id:`.
+    :param max_id: resume below this tweet id (from a checkpoint), None to start at the newest tweet
+    """
+    tweet_manager = tweet_manager if tweet_manager is not None else got.manager.TweetManager
+    while True:
+        query = query_string if max_id is None else f'{query_string} max_id:{max_id}'
+        tweet_criteria = (got.manager.TweetCriteria().setQuerySearch(query)
+                          .setSince(time_since)
+                          .setUntil(time_until)
+                          .setMaxTweets(chunk_size))
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        tweets = tweet_manager.getTweets(tweet_criteria)
+        if len(tweets) > 0:
+            yield tweets
+        if len(tweets) < chunk_size:
+            return
+        max_id = min(t.id for t in tweets) - 1
+
+
 # def _get_tweet_object(tweet_criteria):
 #     import signal
 #
@@ -0,0 +1,21 @@
+# gunicorn -c gunicorn.conf.py app:server
+# Preloads app.py in the master so workers share its data copy-on-write (see the end of app.py)
+import gc
+import os
+
+bind = '0.0.0.0:{}'.format(os.environ.get('PORT', 8050))
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+preload_app = True
+raw_env = ['DASHBOARD_PRELOAD=1']  # set before the app is imported
+
+
+def pre_fork(server, worker):
+    # move everything loaded so far out of the collector's reach, so gc passes in the workers
+    # don't write to (and un-share) the preloaded objects
+    if hasattr(gc, 'freeze'):  # python 3.7+
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    app.start_background_threads()
@@ -0,0 +1,99 @@
+import datetime
+import os
+import threading
+
+import numpy as np
+
+INDEX_FILE = '_id_index.npz'
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class TweetIdIndex(object):
+    """
+    Every tweet id in the store and the day partition that owns it, as sorted int64 ids + int32 day ordinals.
+    Writes go through claim(), which drops ids already stored, so overlapping scrapes never store the same tweet
+    twice; claims are in memory until save(), called once per committed day. Thread-safe within a process; one
+    scraper process per store.
+    """
+    def __init__(self, path, load=True):
+        self.path = path
+        self.lock = threading.Lock()
+        self.num_duplicates = 0
+        if load and os.path.isfile(path):
+            with np.load(path) as data:
+                self.ids, self.days = data['ids'], data['days']
+        else:
+            self.ids, self.days = np.empty(0, dtype='int64'), np.empty(0, dtype='int32')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _lookup(self, ids):
+        if len(self.ids) == 0:
+            return np.zeros(len(ids), dtype=bool), np.zeros(len(ids), dtype='int32')
+        pos = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return self.ids[pos] == ids, self.days[pos]
+
+    def _release(self, day_ordinal):
+        keep = self.days != day_ordinal
+        self.ids, self.days = self.ids[keep], self.days[keep]
+
+    def save(self):
+        """
+        Write every claim made so far, including those of days other threads are still scraping: a crashed day is
+        released and claims its written parts again when it resumes (tweet_store.read_checkpoint)
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with self.lock:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, ids=self.ids, days=self.days)
+            os.replace(tmp_path, self.path)
+
+    def claim(self, ids, day, replace_day=False):
+        """
+        Register ids as belonging to `day`
+        :param replace_day: forget the ids `day` owned before (the day is being re-scraped from scratch)
+        :return: boolean mask of the rows to keep: first occurrence of each id not stored yet, under any day
+        """
+        ids = np.asarray(ids, dtype='int64')
+        day_ordinal = day.toordinal()
+        with self.lock:
+            if replace_day:
+                self._release(day_ordinal)
+
+            keep = np.zeros(len(ids), dtype=bool)
+            keep[np.unique(ids, return_index=True)[1]] = True
+            keep &= ~self._lookup(ids)[0]
+
+            new_ids = np.sort(ids[keep])
+            positions = np.searchsorted(self.ids, new_ids)
+            self.ids = np.insert(self.ids, positions, new_ids)
+            self.days = np.insert(self.days, positions, np.full(len(new_ids), day_ordinal, dtype='int32'))
+
+            self.num_duplicates += int((~keep).sum())
+        return keep
+
+    def release_day(self, day):
+        with self.lock:
+            self._release(day.toordinal())
+
+    def day_of(self, tweet_id):
+        found, owners = self._lookup(np.asarray([tweet_id], dtype='int64'))
+        return datetime.date.fromordinal(int(owners[0])) if found[0] else None
+
+
+def get_id_index(store_path):
+    # one shared instance per store so concurrent scraper threads see each other's claims
+    with _indexes_lock:
+        if store_path not in _indexes:
+            _indexes[store_path] = TweetIdIndex(os.path.join(store_path, INDEX_FILE))
+        return _indexes[store_path]
+
+
+def reset_id_index(store_path):
+    with _indexes_lock:
+        _indexes[store_path] = TweetIdIndex(os.path.join(store_path, INDEX_FILE), load=False)
+        return _indexes[store_path]
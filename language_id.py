@@ -0,0 +1,113 @@
+# Tweet language (English / French / undetermined) from function-word and accent counts, vectorized over the whole
+# corpus: words are exploded and integer-coded once, so scoring is a vocabulary lookup plus a bincount per language.
+# Detected once per version of each day's files and kept in cache/ as an id -> language column (day_languages), which
+# the NLP scripts read with their tweets; route_by_language() sends each language to its own NLP pipeline and skips
+# the ones without a pipeline.
+import copy
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from cache_manager import cached
+from tweet_store import list_input_files, load_tweets
+
+LANGUAGES = ['en', 'fr', 'und']
+EN_WORDS = {'the', 'and', 'is', 'are', 'was', 'were', 'be', 'been', 'of', 'to', 'in', 'for', 'with', 'that', 'this',
+            'it', 'he', 'she', 'they', 'we', 'you', 'his', 'her', 'their', 'our', 'your', 'not', 'but', 'or', 'if',
+            'at', 'by', 'from', 'have', 'has', 'had', 'will', 'would', 'can', 'should', 'about', 'what', 'who', 'how',
+            'why', 'when', 'just', 'all', 'no', 'do', 'does', 'did', 'an', 'my', 'me', 'him', 'them', 'there', 'than'}
+FR_WORDS = {'le', 'la', 'les', 'un', 'une', 'des', 'du', 'de', 'et', 'est', 'sont', 'dans', 'pour', 'avec', 'sur',
+            'pas', 'ne', 'que', 'qui', 'ce', 'cette', 'ces', 'il', 'elle', 'ils', 'nous', 'vous', 'je', 'au', 'aux',
+            'mais', 'ou', 'plus', 'son', 'sa', 'ses', 'leur', 'leurs', 'notre', 'votre', 'être', 'avoir', 'fait',
+            'comme', 'tout', 'tous', 'aussi', 'très', 'même', 'lui', 'y', 'qu', 'd', 'l', 'j', 'c', 'n'}
+FRENCH_CHARS = 'àâæçéèêëîïôœùûüÿ'
+
+
+def detect_languages(texts):
+    """
+    :param texts: series or list of tweet texts
+    :return: categorical of LANGUAGES, one per text: the language with more function words (accented words count as
+        French); 'und' on a tie, e.g. tweets made of names, hashtags and links only
+    """
+    texts = pd.Series(texts).reset_index(drop=True).fillna('').astype(str)
+    words = (texts.str.lower()
+             .str.replace(r'https?://\S+|[@#]\w+', ' ', regex=True)  # links, handles and hashtags are language-neutral
+             .str.findall(r'[^\W\d_]+')
+             .explode()
+             .dropna())
+    rows = words.index.values.astype('int64')
+    codes, vocabulary = pd.factorize(words.values)
+    vocabulary = pd.Index(vocabulary, dtype=object)
+
+    is_en = vocabulary.isin(EN_WORDS)
+    is_fr = vocabulary.isin(FR_WORDS) | vocabulary.str.contains('[{}]'.format(FRENCH_CHARS), regex=True)
+    en_score = np.bincount(rows, weights=is_en[codes], minlength=len(texts))
+    fr_score = np.bincount(rows, weights=is_fr[codes], minlength=len(texts))
+
+    lang = np.full(len(texts), LANGUAGES.index('und'), dtype='int8')
+    lang[en_score > fr_score] = LANGUAGES.index('en')
+    lang[fr_score > en_score] = LANGUAGES.index('fr')
+    return pd.Categorical.from_codes(lang, categories=LANGUAGES)
+
+
+@cached('tweet_languages', inputs=lambda day, files: files)
+def day_languages(day, files):
+    """
+    Language of one day's tweets: {'ids': int64, 'codes': int8 positions in LANGUAGES}
+    """
+    df = load_tweets(['id', 'text'], start_day=day, end_day=day, workers=1)
+    return {'ids': df['id'].values.astype('int64'), 'codes': np.asarray(detect_languages(df['text']).codes, dtype='int8')}
+
+
+def languages_of(ids, languages):
+    """
+    :param languages: day_languages() results covering the ids
+    :return: categorical of LANGUAGES aligned with ids, 'und' for ids not covered
+    """
+    if not languages:
+        codes = pd.Series(dtype='int8')
+    else:
+        codes = pd.Series(np.concatenate([l['codes'] for l in languages]),
+                          index=np.concatenate([l['ids'] for l in languages]))
+        codes = codes[~codes.index.duplicated()]
+    positions = pd.Series(np.asarray(ids, dtype='int64')).map(codes).fillna(LANGUAGES.index('und')).astype('int8')
+    return pd.Categorical.from_codes(positions.values, categories=LANGUAGES)
+
+
+def load_languages(ids):
+    """
+    Stored language of every tweet id, over the whole store
+    """
+    return languages_of(ids, [day_languages(day, files) for day, files in list_input_files() if files])
+
+
+def route_by_language(langs, items, pipelines, default=None, name='Pipeline'):
+    """
+    Run each language's rows through its pipeline and put the results back in row order
+    :param langs: language of each item, e.g. df['lang']
+    :param pipelines: {language: func(list of items) -> one result per item}; other languages are skipped
+    :param default: result for the skipped rows, copied for each row so a mutable default ([], {}) isn't shared
+    :return: list of results aligned with items, and {language: {'count', 'seconds'}}
+    """
+    langs = np.asarray(langs, dtype=object)
+    items = list(items)
+    results = [None] * len(items)
+    stats = {}
+    for lang in sorted(set(langs.tolist())):
+        rows = np.flatnonzero(langs == lang)
+        if lang not in pipelines:
+            for i in rows:
+                results[i] = copy.copy(default)
+            print("{} [{}]: skipped {:,} tweets".format(name, lang, len(rows)))
+            stats[lang] = {'count': len(rows), 'seconds': 0.0, 'skipped': True}
+            continue
+        start = time()
+        lang_results = pipelines[lang]([items[i] for i in rows])
+        seconds = time() - start
+        for i, result in zip(rows, lang_results):
+            results[i] = result
+        stats[lang] = {'count': len(rows), 'seconds': seconds, 'skipped': False}
+        print("{} [{}]: {:,} tweets in {:.1f}s ({:,.0f} tweets/s)".format(
+            name, lang, len(rows), seconds, len(rows) / seconds if seconds else float('inf')))
+    return results, stats
@@ -0,0 +1,59 @@
+import numpy as np
+
+from data_prep import LEADER_USERNAMES, ELECTION_DAY
+
+
+class LeaderDayCube(object):
+    """
+    Tweet counts per party leader per day, indexed by days_until_election, with prefix sums along the days:
+    a slider range is a slice of the counts and a range total is two lookups, however many tweets there are.
+    :param counts: (len(LEADER_USERNAMES), num_days) array; column 0 is days_until_election == first_day
+    """
+    def __init__(self, counts, first_day):
+        self.counts = counts
+        self.first_day = int(first_day)
+        self.last_day = self.first_day + counts.shape[1] - 1
+        self.cumulative = np.zeros((counts.shape[0], counts.shape[1] + 1), dtype='int64')
+        np.cumsum(counts, axis=1, out=self.cumulative[:, 1:])
+        offsets = np.arange(self.first_day, self.last_day + 1).astype('timedelta64[D]')
+        self.dates = (np.datetime64(ELECTION_DAY.date()) + offsets).astype(object)  # datetime.date for the x axis
+
+    @classmethod
+    def from_columns(cls, leader_codes, days_until_election):
+        """
+        :param leader_codes: index into LEADER_USERNAMES for every leader tweet
+        :param days_until_election: same length, one value per tweet
+        """
+        days_until_election = np.asarray(days_until_election, dtype='int64')
+        if len(days_until_election) == 0:
+            return cls(np.zeros((len(LEADER_USERNAMES), 0), dtype='int32'), 0)
+        first_day = days_until_election.min()
+        num_days = days_until_election.max() - first_day + 1
+        flat = np.asarray(leader_codes, dtype='int64') * num_days + (days_until_election - first_day)
+        counts = np.bincount(flat, minlength=len(LEADER_USERNAMES) * num_days)
+        return cls(counts.reshape(len(LEADER_USERNAMES), num_days).astype('int32'), first_day)
+
+    def _columns(self, start, end):
+        start = max(int(start), self.first_day) - self.first_day
+        end = min(int(end), self.last_day) - self.first_day + 1
+        return start, max(start, end)
+
+    def active_days(self):
+        # days_until_election values where any leader tweeted
+        return np.flatnonzero(self.counts.sum(axis=0)) + self.first_day
+
+    def totals(self, start, end):
+        """
+        Tweets per leader with start <= days_until_election <= end
+        """
+        start, end = self._columns(start, end)
+        return self.cumulative[:, end] - self.cumulative[:, start]
+
+    def series(self, leader, start, end):
+        """
+        (dates, counts) for the days in [start, end] the leader tweeted on, like groupby('day').count()
+        """
+        start, end = self._columns(start, end)
+        counts = self.counts[LEADER_USERNAMES.index(leader), start:end]
+        nonzero = np.flatnonzero(counts)
+        return self.dates[start:end][nonzero].tolist(), counts[nonzero].tolist()
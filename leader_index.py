@@ -0,0 +1,40 @@
+import numpy as np
+
+from data_prep import LEADER_USERNAMES
+
+
+class LeaderTopIndex(object):
+    """
+    Leader tweet row numbers grouped by leader, each group sorted by one column (descending, ties in row order),
+    so a leader's top n, or any page further down, is a slice instead of a filter + sort.
+    :param order: row numbers, LEADER_USERNAMES[0]'s rows first
+    :param offsets: len(LEADER_USERNAMES) + 1 boundaries of each leader's rows in order
+    """
+    def __init__(self, order, offsets):
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def from_columns(cls, leader_codes, values):
+        leader_codes = np.asarray(leader_codes, dtype='int64')
+        # lexsort is stable: by leader, then by value descending, ties keep their row order
+        order = np.lexsort((-np.asarray(values, dtype='int64'), leader_codes))
+        return cls(order, cls.leader_offsets(leader_codes))
+
+    @staticmethod
+    def leader_offsets(leader_codes):
+        offsets = np.zeros(len(LEADER_USERNAMES) + 1, dtype='int64')
+        np.cumsum(np.bincount(leader_codes, minlength=len(LEADER_USERNAMES)), out=offsets[1:])
+        return offsets
+
+    def num_rows(self, leader):
+        i = LEADER_USERNAMES.index(leader)
+        return int(self.offsets[i + 1] - self.offsets[i])
+
+    def rows(self, leader, start=0, stop=10):
+        """
+        Row numbers of the leader's tweets ranked start to stop - 1 (0 is the top tweet)
+        """
+        i = LEADER_USERNAMES.index(leader)
+        first, last = self.offsets[i], self.offsets[i + 1]
+        return self.order[min(first + start, last):min(first + stop, last)]
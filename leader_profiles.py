@@ -0,0 +1,160 @@
+# Party leader profiles (name, picture, followers...) for the dashboard cards, kept in a small json file with a TTL.
+# app.py renders whatever is on disk at startup and a background thread refreshes stale profiles, so workers
+# never wait on the Twitter API and the dashboard still boots offline.
+# LEADER_PROFILE_BACKEND=stub gunicorn app:server   canned profiles, no network or credentials needed
+# python leader_profiles.py                        refresh the file once from Twitter
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROFILE_PATH = 'cache/leader_profiles.json'
+PROFILE_TTL = 6 * 3600  # seconds
+PROFILE_FIELDS = ['name', 'profile_image_url', 'location', 'followers_count', 'statuses_count']
+
+
+class TweepyProfileBackend(object):
+    def __init__(self, api):
+        self.api = api
+
+    @classmethod
+    def from_secrets(cls):
+        import tweepy
+        from secrets import consumer_key, consumer_secret, access_key, access_secret
+
+        auth = tweepy.OAuthHandler(consumer_key, consumer_secret)
+        auth.set_access_token(access_key, access_secret)
+        return cls(tweepy.API(auth))
+
+    def fetch(self, username):
+        user = self.api.get_user(username)
+        profile = {field: getattr(user, field) for field in PROFILE_FIELDS}
+        profile['profile_image_url'] = profile['profile_image_url'].replace('_normal', '')  # full size picture
+        return profile
+
+
+class StubProfileBackend(object):
+    """
+    Canned profiles for offline and test runs
+    """
+    def __init__(self, profiles=None):
+        self.profiles = profiles or {}
+
+    def fetch(self, username):
+        return self.profiles.get(username, {'name': username, 'profile_image_url': '', 'location': 'Canada',
+                                            'followers_count': 0, 'statuses_count': 0})
+
+
+BACKENDS = {'tweepy': TweepyProfileBackend.from_secrets, 'stub': StubProfileBackend}
+
+
+def make_backend(name=None):
+    return BACKENDS[name or os.environ.get('LEADER_PROFILE_BACKEND', 'tweepy')]()
+
+
+def placeholder_profile(username):
+    return {'name': username, 'profile_image_url': '', 'location': '', 'followers_count': '-', 'statuses_count': '-'}
+
+
+class LeaderProfileStore(object):
+    """
+    Profiles served from memory, persisted to `path`; refresh() re-fetches the ones older than `ttl` seconds
+    concurrently. Each worker refreshes on its own, but re-reads the file first, so profiles another worker
+    just fetched are not fetched again.
+    """
+    def __init__(self, usernames, backend, path=PROFILE_PATH, ttl=PROFILE_TTL, workers=5):
+        self.usernames = usernames
+        self.backend = backend
+        self.path = path
+        self.ttl = ttl
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.profiles = {}
+        self.last_refresh = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                profiles = json.load(f)
+        except (FileNotFoundError, ValueError):  # missing or half-written by an older version
+            return
+        with self.lock:
+            self.profiles.update(profiles)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with self.lock:
+            profiles = dict(self.profiles)
+        with open(tmp_path, 'w') as f:
+            json.dump(profiles, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, username):
+        """
+        The stored profile, possibly stale, or a placeholder if it was never fetched
+        """
+        with self.lock:
+            return self.profiles.get(username) or placeholder_profile(username)
+
+    def version(self):
+        # changes whenever a profile is refetched, for caches of what the profiles are rendered into
+        with self.lock:
+            return max([p.get('fetched_at', 0) for p in self.profiles.values()] + [0])
+
+    def stale(self, now=None):
+        now = now if now is not None else time.time()
+        with self.lock:
+            return [u for u in self.usernames if now - self.profiles.get(u, {}).get('fetched_at', 0) > self.ttl]
+
+    def _fetch(self, username):
+        try:
+            profile = self.backend.fetch(username)
+        except Exception as e:  # keep serving the old profile, try again next refresh
+            print("Could not refresh profile of {}: {}".format(username, e))
+            return
+        profile['fetched_at'] = time.time()
+        with self.lock:
+            self.profiles[username] = profile
+
+    def refresh(self, force=False):
+        self._load()
+        usernames = self.usernames if force else self.stale()
+        if usernames:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(self._fetch, usernames))
+            self._save()
+        self.last_refresh = time.time()
+        return usernames
+
+    def start_background_refresh(self, interval=None):
+        """
+        Refresh now and then every `interval` seconds (default ttl / 4) in a daemon thread
+        """
+        interval = interval if interval is not None else self.ttl / 4
+
+        def run():
+            while True:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print("Leader profile refresh failed: {}".format(e))
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name='leader-profile-refresh', daemon=True)
+        thread.start()
+        return thread
+
+
+if __name__ == '__main__':
+    import argparse
+    from data_prep import LEADER_USERNAMES
+
+    parser = argparse.ArgumentParser(description='Refresh the leader profiles shown on the dashboard')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=None)
+    args = parser.parse_args()
+
+    store = LeaderProfileStore(LEADER_USERNAMES, make_backend(args.backend))
+    print("Refreshed {}".format(store.refresh(force=True)))
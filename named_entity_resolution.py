@@ -1,58 +1,299 @@
-
+# Named entities of every tweet (nltk word_tokenize -> pos_tag -> ne_chunk), streamed one batch of tweets at a time into
+# nlp_results/entities.parquet as (tweet id, username, entity) rows; the dashboard tables are then counted from that file.
+# Batches are tagged by a pool of processes and come back in tweet order. Only English tweets are tagged
+# (language_id.py), each distinct text once (text_dedup.py), and entities are cached per text (entity_cache.py),
+# so a rerun only tags new or edited tweets.
+# python named_entity_resolution.py               one process per core
+# python named_entity_resolution.py --workers 1   serial, in this process
+# python named_entity_resolution.py --tables-only recount the dashboard tables from nlp_results/entities.parquet
 from utils import get_logger, check_gpu
 import pandas as pd
-import glob
-from data_prep import load_and_clean_data
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 from collections import Counter
 from nltk.tokenize import TweetTokenizer
 from nltk.tokenize.treebank import TreebankWordDetokenizer
 import nltk
 from data_prep import LEADER_USERNAMES
+from entity_cache import EntityCache, text_key
+from text_dedup import TextDedup
+from language_id import day_languages, detect_languages, languages_of, route_by_language
+from tweet_store import list_input_files
+from time import time
+import multiprocessing
+import os
 import pickle
 
-logger = get_logger("NAMED-ENTITY")
-df = load_and_clean_data()
-logger.info("Data successfully loaded")
-
-#df = df.head(1000)
+CHUNK_SIZE = 2000  # tweets per task sent to a worker
+BATCH_SIZE = 50000  # tweets read, tagged and written per step; bounds the pipeline's memory
+# the NLTK chunker is trained on English; undetermined tweets are mostly names, hashtags and links
+NER_LANGUAGES = ['en', 'und']
+SAVE_EVERY = 50000  # new entity cache entries between saves, so an interrupted run keeps most of its work
 
-# TODO NOTE TO SELF this has to be rerun for Oct!!!
+ENTITIES_PATH = 'nlp_results/entities.parquet'
+ENTITY_SCHEMA = pa.schema([('id', pa.int64()), ('username', pa.string()), ('entity', pa.string())])
+NAMED_ENTITIES_PATH = 'nlp_results/named_entities.pkl'
+LEADER_ENTITIES_PATH = 'nlp_results/leader_entities.pkl'
 
-# TODO English tweets only for NLP tasks
+logger = get_logger("NAMED-ENTITY")
 
-# Named entity recognition
 tweet_tokenizer = TweetTokenizer(preserve_case=True, strip_handles=False, reduce_len=False)
 detokenizer = TreebankWordDetokenizer()
-entity_list = []
-
-logger.info("Identifying named entities in tweets")
-# TODO cache this -- just for dev, not prod -- it's an expensive op
-entities_per_tweet = []
-tweets_to_parse = [detokenizer.detokenize(tweet_tokenizer.tokenize(str(tweet))) for tweet in df['text']]
-for i, tweet in enumerate(tweets_to_parse):
-    if i % 10000 == 0:
-        logger.info("Processing tweet {} of {}".format(i, len(tweets_to_parse)))
-    tokens = nltk.word_tokenize(tweet)
-    tagged = nltk.pos_tag(tokens)
-    entities = nltk.chunk.ne_chunk(tagged)
-    entities_extracted = [" ".join(w for w, t in elt) for elt in entities if isinstance(elt, nltk.Tree)]
-    entity_list.extend((entities_extracted))
-    entities_per_tweet.append(entities_extracted) # for joining back to the politician-level dataframe
-    # TODO theoretically len(entity_list) == len(tweets_to_parse) so usernames can line up and we can match them up
-
-df['named_entity'] = entities_per_tweet
-df_politician = df[df['username'].isin(LEADER_USERNAMES)]
-pickle.dump(df_politician, open('nlp_results/df_politician.pkl', 'wb'))
-
-# Count most popular entities
-popular_entities = pd.DataFrame(Counter(entity_list).most_common(25), columns=['entity', 'count'])
-
-print(popular_entities)
-
-# Dump onto disk for dashboard consumption
-
-pickle.dump(entity_list, open('nlp_results/entity_list.pkl', 'wb'))
-pickle.dump(popular_entities, open('nlp_results/named_entities.pkl', 'wb'))
-
-# Can also do this at a politician level, ha --  "what does each one talk about the most?"
-logger.info("Finished named entity detection")
\ No newline at end of file
+_models = {}
+
+
+def load_models():
+    """
+    POS tagger and NE chunker, loaded once per process: nltk.pos_tag unpickles the tagger again on every call
+    """
+    if not _models:
+        _models['tagger'] = nltk.tag._get_tagger()
+        _models['chunker'] = nltk.data.load(nltk.chunk._MULTICLASS_NE_CHUNKER)
+    return _models
+
+
+def normalize_tweet(text):
+    return detokenizer.detokenize(tweet_tokenizer.tokenize(str(text)))
+
+
+def extract_entities(tweet):
+    # same as nltk.ne_chunk(nltk.pos_tag(nltk.word_tokenize(tweet))) with the models kept in memory
+    models = load_models()
+    tagged = models['tagger'].tag(nltk.word_tokenize(tweet))
+    entities = models['chunker'].parse(tagged)
+    return [" ".join(w for w, t in elt) for elt in entities if isinstance(elt, nltk.Tree)]
+
+
+def _extract_chunk(tweets):
+    return [extract_entities(tweet) for tweet in tweets]
+
+
+def make_pool(workers=None):
+    """
+    Process pool with the models loaded in every worker, or None for workers=1 (tag in this process)
+    """
+    return None if workers == 1 else multiprocessing.Pool(workers, initializer=load_models)
+
+
+def iter_entities(tweets, workers=None, chunk_size=CHUNK_SIZE, pool=None):
+    """
+    Entities of each tweet, in order, as the chunks finish
+    :param workers: processes in the pool, default one per core; 1 runs in this process
+    :param pool: make_pool() result to reuse across calls instead of starting one here
+    """
+    chunks = (tweets[i:i + chunk_size] for i in range(0, len(tweets), chunk_size))
+    own_pool = pool is None and workers != 1
+    if own_pool:
+        pool = make_pool(workers)
+    results = pool.imap(_extract_chunk, chunks) if pool is not None else map(_extract_chunk, chunks)
+    try:
+        done = 0
+        for chunk_entities in results:
+            done += len(chunk_entities)
+            logger.info("Processed tweet {} of {}".format(done, len(tweets)))
+            yield from chunk_entities
+    finally:
+        if own_pool:
+            pool.terminate()
+
+
+def _extract_texts(texts, workers=None, chunk_size=CHUNK_SIZE, cache=None, pool=None):
+    if cache is None:
+        return list(iter_entities([normalize_tweet(text) for text in texts], workers, chunk_size, pool))
+
+    keys = [text_key(text) for text in texts]
+    entities_per_text = cache.get_many(keys)
+    missing = [i for i, entities in enumerate(entities_per_text) if entities is None]
+    logger.info("Entity cache: {:,} of {:,} texts cached ({:.1%} hit rate so far), tagging {:,}".format(
+        len(keys) - len(missing), len(keys), cache.hit_rate(), len(missing)))
+
+    tweets_to_parse = [normalize_tweet(texts[i]) for i in missing]
+    for i, entities in zip(missing, iter_entities(tweets_to_parse, workers, chunk_size, pool)):
+        entities_per_text[i] = entities
+        cache.add([keys[i]], [entities])
+        if len(cache.pending) >= SAVE_EVERY:
+            cache.save()
+    return entities_per_text
+
+
+def extract_named_entities(df, workers=None, chunk_size=CHUNK_SIZE, cache=None, languages=NER_LANGUAGES, pool=None):
+    """
+    Entities of every tweet in df, tagging each distinct text once; with an EntityCache only the texts it doesn't
+    know are tagged (call cache.save() when done)
+    :param languages: tag tweets in these languages (df['lang']) only, the others get no entities; None tags all
+    """
+    def extract(texts):
+        dedup = TextDedup(texts)
+        return dedup.run('Named entities',
+                         lambda unique_texts: _extract_texts(unique_texts, workers, chunk_size, cache, pool))
+
+    if languages is None:
+        return extract(df['text'])
+    langs = df['lang'] if 'lang' in df.columns else detect_languages(df['text'])
+    entities_per_tweet, _ = route_by_language(langs, df['text'], {lang: extract for lang in languages}, default=[],
+                                              name='Named entities')
+    return entities_per_tweet
+
+
+def _iter_file_frames(file, columns, batch_size):
+    # a parquet part one row group (or record batch) at a time, a csv of the archive in chunks
+    if not file.endswith('.parquet'):
+        yield from pd.read_csv(file, usecols=columns, chunksize=batch_size)
+        return
+    parquet_file = pq.ParquetFile(file)
+    if hasattr(parquet_file, 'iter_batches'):  # pyarrow >= 3.0
+        for batch in parquet_file.iter_batches(batch_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        for i in range(parquet_file.num_row_groups):
+            yield parquet_file.read_row_group(i, columns=columns).to_pandas()
+
+
+def _split_batches(df, batch_size, languages):
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size].reset_index(drop=True)
+        batch['lang'] = languages_of(batch['id'], languages)
+        yield batch
+
+
+def iter_tweet_batches(batch_size=BATCH_SIZE):
+    """
+    (id, username, text, lang) frames of at most batch_size tweets, read a row group at a time so a day is never
+    loaded whole, with the language stored for the day (language_id.day_languages)
+    """
+    columns = ['id', 'username', 'text']
+    for day, files in list_input_files():
+        if not files:
+            continue
+        languages = [day_languages(day, files)]
+        pending, num_pending = [], 0
+        for file in files:
+            for frame in _iter_file_frames(file, columns, batch_size):
+                pending.append(frame[columns])
+                num_pending += len(frame)
+                if num_pending >= batch_size:
+                    df = pd.concat(pending, ignore_index=True, sort=False)
+                    full = len(df) - len(df) % batch_size
+                    yield from _split_batches(df.iloc[:full], batch_size, languages)
+                    pending, num_pending = [df.iloc[full:]], len(df) - full
+        if num_pending:
+            yield from _split_batches(pd.concat(pending, ignore_index=True, sort=False), batch_size, languages)
+
+
+def stream_named_entities(path=ENTITIES_PATH, workers=None, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE, cache=None):
+    """
+    Read, tag and write the corpus batch by batch: one parquet row group of (id, username, entity) rows per batch,
+    the file is only swapped in once complete
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    seconds = {'read': 0.0, 'tag': 0.0, 'write': 0.0}
+    num_tweets = num_entities = 0
+    start = time()
+    pool = make_pool(workers)
+    batches = iter_tweet_batches(batch_size)
+    try:
+        with pq.ParquetWriter(tmp_path, ENTITY_SCHEMA, compression='snappy') as writer:
+            while True:
+                step = time()
+                df = next(batches, None)
+                seconds['read'] += time() - step
+                if df is None:
+                    break
+
+                step = time()
+                entities_per_tweet = extract_named_entities(df, workers, chunk_size, cache, pool=pool)
+                seconds['tag'] += time() - step
+
+                step = time()
+                rows = np.repeat(np.arange(len(df)), [len(entities) for entities in entities_per_tweet])
+                entities = [entity for tweet_entities in entities_per_tweet for entity in tweet_entities]
+                writer.write_table(pa.Table.from_arrays([pa.array(df['id'].values[rows].astype('int64'), pa.int64()),
+                                                         pa.array(df['username'].values[rows], pa.string()),
+                                                         pa.array(entities, pa.string())], schema=ENTITY_SCHEMA))
+                seconds['write'] += time() - step
+
+                num_tweets += len(df)
+                num_entities += len(entities)
+                logger.info("{:,} tweets, {:,} entities written, {:,.0f} tweets/s overall "
+                            "(read {:,.0f}/s, tag {:,.0f}/s, write {:,.0f}/s)".format(
+                                num_tweets, num_entities, num_tweets / (time() - start),
+                                *[num_tweets / max(seconds[stage], 1e-9) for stage in ['read', 'tag', 'write']]))
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if cache is not None:
+            cache.save()
+    os.replace(tmp_path, path)
+    logger.info("Wrote {:,} entities of {:,} tweets to {} in {:.0f}s".format(num_entities, num_tweets, path, time() - start))
+    return num_tweets, num_entities
+
+
+def iter_entity_batches(path=ENTITIES_PATH):
+    entity_file = pq.ParquetFile(path)
+    if entity_file.schema.to_arrow_schema().names != ENTITY_SCHEMA.names:
+        raise ValueError("{} was written by an older version, rerun without --tables-only".format(path))
+    for i in range(entity_file.num_row_groups):
+        yield entity_file.read_row_group(i).to_pandas()
+
+
+def count_entities(path=ENTITIES_PATH):
+    """
+    Entity counts over the whole file, and per leader, one row group in memory at a time; counters fill in first-seen
+    order so most_common() breaks ties like the tweet order
+    """
+    counts = Counter()
+    leader_counts = {leader: Counter() for leader in LEADER_USERNAMES}
+    for batch in iter_entity_batches(path):
+        codes, uniques = pd.factorize(batch['entity'])
+        counts.update(dict(zip(uniques, np.bincount(codes, minlength=len(uniques)).tolist())))
+        leader_rows = batch[batch['username'].isin(LEADER_USERNAMES)]
+        for username, entity in zip(leader_rows['username'], leader_rows['entity']):
+            leader_counts[username][entity] += 1
+    return counts, leader_counts
+
+
+def write_entity_tables(path=ENTITIES_PATH):
+    """
+    The dashboard's tables: top 25 entities overall and top 10 per leader, counted from the entity file
+    """
+    counts, leader_counts = count_entities(path)
+
+    # Count most popular entities
+    popular_entities = pd.DataFrame(counts.most_common(25), columns=['entity', 'count'])
+
+    print(popular_entities)
+
+    # "what does each one talk about the most?"
+    leader_entities = pd.DataFrame([(leader, entity, count) for leader in LEADER_USERNAMES
+                                    for entity, count in leader_counts[leader].most_common(10)],
+                                   columns=['username', 'entity', 'count'])
+
+    # Dump onto disk for dashboard consumption
+    pickle.dump(popular_entities, open(NAMED_ENTITIES_PATH, 'wb'))
+    pickle.dump(leader_entities, open(LEADER_ENTITIES_PATH, 'wb'))
+    return popular_entities, leader_entities
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Named entity recognition over all tweets')
+    parser.add_argument('--workers', type=int, default=None, help='processes, default one per core')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--no-cache', action='store_true', help='tag every tweet, ignoring the entity cache')
+    parser.add_argument('--tables-only', action='store_true', help='only recount the tables from the entity file')
+    args = parser.parse_args()
+
+    if not args.tables_only:
+        logger.info("Identifying named entities in tweets")
+        cache = None if args.no_cache else EntityCache('nltk-{}'.format(nltk.__version__))
+        stream_named_entities(ENTITIES_PATH, args.workers, args.chunk_size, args.batch_size, cache)
+        if cache is not None:
+            print("Entity cache hit rate {:.1%} ({:,} hits, {:,} misses, {:,} texts cached)".format(
+                cache.hit_rate(), cache.hits, cache.misses, len(cache)))
+
+    write_entity_tables(ENTITIES_PATH)
+    logger.info("Finished named entity detection")
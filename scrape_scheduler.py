@@ -0,0 +1,148 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils import get_logger
+
+logger = get_logger('Scheduler')
+
+STATE_FILE = 'tweets/scrape_state.json'
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts of up to `capacity`
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def acquire(self, tokens=1):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ScrapeState(object):
+    """
+    Days that finished scraping, persisted as json so a crashed run can resume
+    """
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = {}
+        if os.path.isfile(path):
+            with open(path) as f:
+                self.done = json.load(f)
+
+    def is_done(self, day):
+        return day in self.done
+
+    def mark_done(self, day, num_tweets):
+        with self.lock:
+            self.done[day] = {'num_tweets': num_tweets, 'finished_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.done, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+    def reset(self):
+        with self.lock:
+            self.done = {}
+            if os.path.isfile(self.path):
+                os.remove(self.path)
+
+
+def retry_with_backoff(func, retries=5, base_delay=5.0, max_delay=300.0, description=''):
+    """
+    Call func(), retrying with exponential backoff plus jitter on any exception
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except Exception as exc:
+            if attempt == retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+            logger.warning("{} failed ({!r}), retry {} of {} in {:.1f}s".format(description, exc, attempt + 1, retries, delay))
+            time.sleep(delay)
+
+
+class ScrapeProgress(object):
+    def __init__(self, total_days):
+        self.total_days = total_days
+        self.days_done = 0
+        self.days_failed = 0
+        self.num_tweets = 0
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+
+    def update(self, num_tweets=0, failed=False):
+        with self.lock:
+            if failed:
+                self.days_failed += 1
+            else:
+                self.days_done += 1
+                self.num_tweets += num_tweets
+
+    def summary(self):
+        elapsed = time.monotonic() - self.start
+        return ("{}/{} days done, {} failed, {:,} tweets in {:.0f}s ({:.1f} tweets/s, {:.2f} days/min)".format(
+            self.days_done, self.total_days, self.days_failed, self.num_tweets, elapsed,
+            self.num_tweets / elapsed if elapsed else 0, 60 * self.days_done / elapsed if elapsed else 0))
+
+
+def run_scrape_schedule(days, scrape_day, workers=4, requests_per_second=0.5, state=None, retries=5, base_delay=5.0):
+    """
+    Scrape several day windows at once
+    :param days: list of 'YYYY-MM-DD' strings
+    :param scrape_day: function(day, rate_limiter) -> number of tweets saved for that day
+    :param workers: number of day windows in flight
+    :param requests_per_second: shared rate limit across all workers
+    :param state: ScrapeState; days already marked done are skipped
+    :return: ScrapeProgress
+    """
+    state = state if state is not None else ScrapeState()
+    rate_limiter = TokenBucket(requests_per_second, capacity=workers)
+
+    todo = [day for day in days if not state.is_done(day)]
+    logger.info("{} of {} days left to scrape with {} workers".format(len(todo), len(days), workers))
+    progress = ScrapeProgress(len(todo))
+
+    def _job(day):
+        num_tweets = retry_with_backoff(lambda: scrape_day(day, rate_limiter), retries=retries,
+                                        base_delay=base_delay, description='Scrape {}'.format(day))
+        state.mark_done(day, num_tweets)
+        return num_tweets
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_job, day): day for day in todo}
+        for future in as_completed(futures):
+            day = futures[future]
+            try:
+                num_tweets = future.result()
+                progress.update(num_tweets)
+                logger.info("Done {} ({:,} tweets) - {}".format(day, num_tweets, progress.summary()))
+            except Exception as exc:
+                progress.update(failed=True)
+                logger.error("Giving up on {}: {!r}".format(day, exc))
+
+    logger.info("Scrape finished - {}".format(progress.summary()))
+    return progress
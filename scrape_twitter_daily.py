@@ -1,9 +1,13 @@
 # 2 days of tweets = 25k and then cut off, so need to scrape day-by-day and parse
+# python scrape_twitter_daily.py --since 2019-07-01 --until 2019-10-06 --workers 4
+# python scrape_twitter_daily.py --fake  (replays canned tweets through fake_tweet_manager, no network)
 
-import GetOldTweets3 as got
 import datetime
-import time
-from get_tweets import _get_tweet_object, _convert_tweets_to_dataframe
+from functools import partial
+from get_tweets import _iter_tweet_chunks, _convert_tweets_to_dataframe
+from id_index import get_id_index
+from scrape_scheduler import run_scrape_schedule, ScrapeState, STATE_FILE
+from tweet_store import read_checkpoint, append_chunk, commit_partial_partition, STORE_PATH
 from utils import get_logger
 
 logger = get_logger('Scrape')
@@ -11,26 +15,76 @@ logger = get_logger('Scrape')
 # TODAY = datetime.datetime.today() # USE THIS IF SCRAPING FROM TODAY OTHERWISE USE LINE BELOW
 TODAY = datetime.datetime.strptime('2019-10-06', '%Y-%m-%d')  # prev Oct 1
 MIN_DATE = datetime.datetime.strptime('2019-07-01', '%Y-%m-%d')
-#date_list = [TODAY - datetime.timedelta(days=x) for x in range(NUM_DAYS)]
-date_list = [TODAY - datetime.timedelta(days=x) for x in range((TODAY-MIN_DATE).days + 1)]
 
-for date in date_list:
-    time.sleep(10)
+#QUERY = "#cdnpoli OR #elxn43 OR #polcan OR #ItsOurVote OR #CestNotreVote" # --since {} --until {}".format(date, date)
+#QUERY = 'from:justintrudeau OR from:AndrewScheer OR from:ElizabethMay OR from:theJagmeetSingh OR from:MaximeBernier OR from:yfblanchet'
+QUERY = '#cdnpoli OR #elxn43 OR #polcan OR #ItsOurVote OR #CestNotreVote OR #CanadaDebates2019 OR from:justintrudeau OR from:AndrewScheer OR from:ElizabethMay OR from:theJagmeetSingh OR from:MaximeBernier OR from:yfblanchet'
+
+# tweets held in memory at once while scraping a day; each chunk is appended to the day's partition
+CHUNK_SIZE = 2000
+
+
+def get_date_list(min_date, today):
+    # newest day first, same order as the old sequential loop
+    return [(today - datetime.timedelta(days=x)).strftime("%Y-%m-%d") for x in range((today - min_date).days + 1)]
+
+
+def scrape_day(day, rate_limiter=None, tweet_manager=None, store_path=STORE_PATH, chunk_size=CHUNK_SIZE):
+    date = datetime.datetime.strptime(day, '%Y-%m-%d')
     NEXT_DAY = (date + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
-    DATE = date.strftime("%Y-%m-%d")
-    logger.info("Scraping tweets for {}".format(date))
-    #QUERY = "#cdnpoli OR #elxn43 OR #polcan OR #ItsOurVote OR #CestNotreVote" # --since {} --until {}".format(date, date)
-    #QUERY = 'from:justintrudeau OR from:AndrewScheer OR from:ElizabethMay OR from:theJagmeetSingh OR from:MaximeBernier OR from:yfblanchet'
-    QUERY = '#cdnpoli OR #elxn43 OR #polcan OR #ItsOurVote OR #CestNotreVote OR #CanadaDebates2019 OR from:justintrudeau OR from:AndrewScheer OR from:ElizabethMay OR from:theJagmeetSingh OR from:MaximeBernier OR from:yfblanchet'
 
-    tweet_criteria = got.manager.TweetCriteria().setQuerySearch(QUERY).setSince(DATE).setUntil(NEXT_DAY)
-    tweets = _get_tweet_object(tweet_criteria)
-    df = _convert_tweets_to_dataframe(tweets)
+    checkpoint = read_checkpoint(date, store_path)
+    if checkpoint['num_tweets']:
+        logger.info("Resuming {} below tweet id {} ({:,} tweets already saved)".format(day, checkpoint['max_id'], checkpoint['num_tweets']))
+    else:
+        logger.info("Scraping tweets for {}".format(day))
+
+    for tweets in _iter_tweet_chunks(QUERY, day, NEXT_DAY, chunk_size, checkpoint['max_id'], tweet_manager, rate_limiter):
+        checkpoint = append_chunk(_convert_tweets_to_dataframe(tweets), date, checkpoint, store_path)
+        logger.info("Saved chunk {} for {} ({:,} tweets so far)".format(checkpoint['num_parts'], day, checkpoint['num_tweets']))
+
+    logger.info("Done scraping tweets for {}, dropped {:,} tweets already stored under other days".format(
+        day, checkpoint.get('num_duplicates', 0)))
+
+    commit_partial_partition(date, store_path)
+    logger.info("Successfully saved tweets for {}".format(day))
+    return checkpoint['num_tweets']
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Scrape tweets day by day into the tweet store')
+    parser.add_argument('--since', type=str, default=MIN_DATE.strftime('%Y-%m-%d'))
+    parser.add_argument('--until', type=str, default=TODAY.strftime('%Y-%m-%d'))
+    parser.add_argument('--workers', type=int, default=4, help='day windows scraped at once')
+    parser.add_argument('--rate', type=float, default=0.1, help='max TweetManager queries (chunks) per second across workers')
+    parser.add_argument('--retries', type=int, default=5)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--state-file', type=str, default=STATE_FILE)
+    parser.add_argument('--restart', action='store_true', help='ignore days finished by a previous run')
+    parser.add_argument('--fake', action='store_true', help='replay canned tweets instead of hitting Twitter')
+    parser.add_argument('--fake-latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    date_list = get_date_list(datetime.datetime.strptime(args.since, '%Y-%m-%d'),
+                              datetime.datetime.strptime(args.until, '%Y-%m-%d'))
 
-    logger.info("Done scraping tweets for {}".format(date))
+    tweet_manager, store_path, state_file = None, STORE_PATH, args.state_file
+    if args.fake:
+        from fake_tweet_manager import FakeTweetManager, make_canned_tweets
+        tweet_manager = FakeTweetManager(make_canned_tweets(date_list[-1], date_list[0]), latency=args.fake_latency,
+                                         failure_rate=0.1)
+        store_path, state_file = 'tweets/fake_store', 'tweets/fake_scrape_state.json'
 
-    df.to_csv('tweets/cdnpoli_{}.csv'.format(date.strftime("%Y%m%d")), index=False)
-    logger.info("Successfully saved tweets for {}".format(DATE))
+    state = ScrapeState(state_file)
+    if args.restart:
+        state.reset()
 
-logger.info("Completed tweet scraping for {} until {}".format(date_list[-1].strftime("%Y-%m-%d"), date_list[0].strftime("%Y-%m-%d")))
+    scrape = partial(scrape_day, tweet_manager=tweet_manager, store_path=store_path, chunk_size=args.chunk_size)
+    run_scrape_schedule(date_list, scrape,
+                        workers=args.workers, requests_per_second=args.rate, state=state, retries=args.retries,
+                        base_delay=1.0 if args.fake else 5.0)
 
+    logger.info("Completed tweet scraping for {} until {}, {:,} duplicate tweets dropped".format(
+        date_list[-1], date_list[0], get_id_index(store_path).num_duplicates))
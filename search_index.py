@@ -0,0 +1,299 @@
+# Inverted index for keyword search over the whole corpus, built offline from the cleaned tweet text
+# (get_tweets.create_preprocessing_functions) and memory-mapped by the dashboard.
+# python search_index.py                  build or update search_index/ (days already indexed come from cache/)
+# python search_index.py --query trudeau  check a query from the command line
+#
+# search_index/
+#   manifest.json                 number of tweets / terms, inputs fingerprint
+#   vocab.bin, vocab_offsets.npy  sorted terms as utf-8, binary searched in place
+#   postings.bin                  per term: tweet numbers, delta + varint encoded (postings_offsets.npy)
+#   day_counts_*.npy              per term: (day, tweets) pairs for the volume-over-time graph
+#   doc_ids.npy, doc_users.npy    tweet id and username code of every tweet number, tweets numbered in day order
+#   doc_text.bin                  raw tweet texts for the sample tweets (doc_text_offsets.npy)
+#   days.npy, day_starts.npy      the indexed days and the first tweet number of each
+import datetime
+import functools
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from cache_manager import cached, fingerprint_files, TWEET_INPUTS
+from tweet_store import list_input_files, load_tweets
+
+SEARCH_INDEX_PATH = 'search_index'
+FORMAT_VERSION = 2
+
+
+def _varint_sizes(values):
+    num_bytes = np.ones(len(values), dtype='int64')
+    for k in range(1, 5):
+        num_bytes += np.asarray(values) >= (1 << (7 * k))
+    return num_bytes
+
+
+def varint_encode(values):
+    """
+    LEB128: 7 bits per byte, high bit set on all but the last byte of a value; values < 2 ** 35
+    """
+    values = np.asarray(values, dtype='uint64')
+    num_bytes = _varint_sizes(values)
+    starts = np.cumsum(num_bytes) - num_bytes
+    out = np.empty(int(num_bytes.sum()), dtype='uint8')
+    for k in range(5):
+        mask = num_bytes > k
+        low_bits = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        out[starts[mask] + k] = low_bits | (num_bytes[mask] > k + 1).astype('uint64') << np.uint64(7)
+    return out
+
+
+def varint_decode(buf):
+    buf = np.asarray(buf, dtype='uint8')
+    ends = np.flatnonzero(buf < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    values = np.zeros(len(ends), dtype='uint64')
+    for k in range(5):
+        mask = starts + k <= ends
+        if not mask.any():
+            break
+        values[mask] |= (buf[starts[mask] + k] & 0x7f).astype('uint64') << np.uint64(7 * k)
+    return values
+
+
+@functools.lru_cache(maxsize=1)
+def _preprocessing_func():
+    from get_tweets import create_preprocessing_functions, PRE_PROCESSING_OPTIONS
+    return create_preprocessing_functions(PRE_PROCESSING_OPTIONS)
+
+
+def query_terms(query):
+    """
+    The query cleaned by the same pipeline as the indexed tweets, so a query term matches exactly what was indexed
+    (e.g. stopwords are dropped, but 'the.' is indexed as 'the' since punctuation is stripped after them)
+    """
+    return _preprocessing_func()(query).split()
+
+
+def normalize_query(query):
+    # the query's words as typed, lowercased, to report the ones left out of the lookup
+    query = re.sub(r'@\w+', ' ', query.lower())
+    return re.sub(r'[^\w\s]|\d|_', ' ', query).split()
+
+
+@cached('search_day', inputs=lambda day, files: files)
+def day_postings(day, files):
+    """
+    Cleaned terms of one day's tweets: (term list, term number, tweet row) pairs, one per distinct term of a tweet
+    """
+    df = load_tweets(['id', 'username', 'text'], start_day=day, end_day=day, workers=1).reset_index(drop=True)
+    tokens = df['text'].fillna('').map(_preprocessing_func()).str.split().explode().dropna()
+    pairs = pd.DataFrame({'row': tokens.index.values, 'token': tokens.values}).drop_duplicates()
+    codes, terms = pd.factorize(pairs['token'].values)
+    return {'ids': df['id'].values.astype('int64'), 'usernames': df['username'].values.astype(str),
+            'texts': df['text'].fillna('').values.astype(str),
+            'terms': list(terms), 'term_codes': codes.astype('int32'), 'rows': pairs['row'].values.astype('int32')}
+
+
+def _write_strings(strings, path, name):
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='int64')
+    offsets[1:] = np.cumsum([len(s) for s in encoded])
+    np.save(os.path.join(path, '{}_offsets.npy'.format(name)), offsets)
+    with open(os.path.join(path, '{}.bin'.format(name)), 'wb') as f:
+        f.write(b''.join(encoded))
+
+
+def build_search_index(path=SEARCH_INDEX_PATH):
+    vocabulary = {}
+    term_numbers, doc_numbers = [], []
+    doc_ids, doc_users, doc_texts, days, day_starts = [], [], [], [], []
+    num_docs = 0
+    for day, files in list_input_files():
+        if not files:
+            continue
+        partial = day_postings(day, files)
+        global_codes = np.array([vocabulary.setdefault(term, len(vocabulary)) for term in partial['terms']],
+                                dtype='int32')
+        term_numbers.append(global_codes[partial['term_codes']])
+        doc_numbers.append(partial['rows'].astype('int64') + num_docs)
+        doc_ids.append(partial['ids'])
+        doc_users.append(partial['usernames'])
+        doc_texts.extend(partial['texts'])
+        days.append(np.datetime64(day, 'D'))
+        day_starts.append(num_docs)
+        num_docs += len(partial['ids'])
+        print("Indexed {} ({:,} tweets so far, {:,} terms)".format(day, num_docs, len(vocabulary)))
+
+    # renumber terms in sorted order so the vocabulary can be binary searched
+    terms = np.array(sorted(vocabulary), dtype=object)
+    new_number = np.empty(len(terms), dtype='int64')
+    new_number[[vocabulary[t] for t in terms]] = np.arange(len(terms))
+    term_numbers = new_number[np.concatenate(term_numbers)] if term_numbers else np.empty(0, dtype='int64')
+    doc_numbers = np.concatenate(doc_numbers) if doc_numbers else np.empty(0, dtype='int64')
+    order = np.lexsort((doc_numbers, term_numbers))
+    term_numbers, doc_numbers = term_numbers[order], doc_numbers[order]
+    term_offsets = np.zeros(len(terms) + 1, dtype='int64')
+    np.cumsum(np.bincount(term_numbers, minlength=len(terms)), out=term_offsets[1:])
+
+    # deltas restart at every term: the first tweet number of a term is stored as is
+    deltas = np.diff(doc_numbers, prepend=0)
+    term_starts = term_offsets[:-1][np.diff(term_offsets) > 0]
+    deltas[term_starts] = doc_numbers[term_starts]
+    byte_offsets = np.concatenate([[0], np.cumsum(_varint_sizes(deltas))])[term_offsets]
+
+    # per term per day counts
+    day_starts = np.array(day_starts, dtype='int64')
+    doc_days = np.searchsorted(day_starts, doc_numbers, side='right') - 1
+    pairs = pd.DataFrame({'term': term_numbers, 'day': doc_days}).groupby(['term', 'day']).size().reset_index()
+    day_count_offsets = np.zeros(len(terms) + 1, dtype='int64')
+    np.cumsum(np.bincount(pairs['term'].values, minlength=len(terms)), out=day_count_offsets[1:])
+
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    _write_strings(terms, tmp_path, 'vocab')
+    varint_encode(deltas).tofile(os.path.join(tmp_path, 'postings.bin'))
+    np.save(os.path.join(tmp_path, 'postings_offsets.npy'), byte_offsets)
+    np.save(os.path.join(tmp_path, 'day_counts_offsets.npy'), day_count_offsets)
+    np.save(os.path.join(tmp_path, 'day_counts_days.npy'), pairs['day'].values.astype('int32'))
+    np.save(os.path.join(tmp_path, 'day_counts.npy'), pairs[0].values.astype('int32'))
+    np.save(os.path.join(tmp_path, 'doc_ids.npy'), np.concatenate(doc_ids) if doc_ids else np.empty(0, dtype='int64'))
+    usernames = np.concatenate(doc_users) if doc_users else np.empty(0, dtype=str)
+    user_codes, user_names = pd.factorize(usernames)
+    np.save(os.path.join(tmp_path, 'doc_users.npy'), user_codes.astype('int32'))
+    _write_strings(doc_texts, tmp_path, 'doc_text')
+    np.save(os.path.join(tmp_path, 'days.npy'), np.array(days, dtype='datetime64[D]'))
+    np.save(os.path.join(tmp_path, 'day_starts.npy'), day_starts)
+    manifest = {'format': FORMAT_VERSION, 'num_tweets': num_docs, 'num_terms': len(terms),
+                'num_postings': len(doc_numbers), 'usernames': list(user_names),
+                'inputs': fingerprint_files(TWEET_INPUTS), 'built_at': datetime.datetime.utcnow().isoformat()}
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    # swap the new index in; readers that still map the old files keep working until they reload
+    old_path = path + '.old'
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.isdir(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    print("Wrote {} ({:,} tweets, {:,} terms, {:,} postings in {:.1f} MB)".format(
+        path, num_docs, len(terms), len(doc_numbers), os.path.getsize(os.path.join(path, 'postings.bin')) / 1024 ** 2))
+    return manifest
+
+
+class SearchIndex(object):
+    """
+    Read side of the index, everything memory-mapped: a lookup decodes only the posting lists of the query terms
+    """
+    def __init__(self, path=SEARCH_INDEX_PATH):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        if self.manifest['format'] != FORMAT_VERSION:
+            raise ValueError("Search index in {} has format {}, rebuild it".format(path, self.manifest['format']))
+        self.version = self.manifest['built_at']
+        self.usernames = self.manifest['usernames']
+        for name in ['vocab_offsets', 'postings_offsets', 'day_counts_offsets', 'day_counts_days', 'day_counts',
+                     'doc_ids', 'doc_users', 'doc_text_offsets', 'days', 'day_starts']:
+            setattr(self, name, np.load(os.path.join(path, name + '.npy'), mmap_mode='r'))
+        self.vocab = self._map_bytes('vocab.bin')
+        self.postings = self._map_bytes('postings.bin')
+        self.doc_text = self._map_bytes('doc_text.bin')
+
+    def _map_bytes(self, name):
+        file_path = os.path.join(self.path, name)
+        # np.memmap refuses empty files
+        return np.memmap(file_path, dtype='uint8', mode='r') if os.path.getsize(file_path) else np.empty(0, dtype='uint8')
+
+    def _term(self, i):
+        return bytes(self.vocab[self.vocab_offsets[i]:self.vocab_offsets[i + 1]]).decode('utf-8')
+
+    def term_number(self, term):
+        low, high = 0, len(self.vocab_offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < term:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(self.vocab_offsets) - 1 and self._term(low) == term else None
+
+    def docs(self, term_number):
+        buf = self.postings[self.postings_offsets[term_number]:self.postings_offsets[term_number + 1]]
+        return np.cumsum(varint_decode(buf)).astype('int64')
+
+    def count_by_day(self, docs):
+        days = np.searchsorted(self.day_starts, docs, side='right') - 1
+        return np.bincount(days, minlength=len(self.days))
+
+    def search(self, query, num_samples=10):
+        """
+        Tweets containing every term of the query that is in the index; the others (words the tweet cleaning
+        drops, or that no tweet contains) are left out of the lookup and reported
+        :return: {'terms', 'dropped' (words left out), 'num_tweets', 'days' (datetime64), 'counts' per day,
+            'samples' (latest matches)}
+        """
+        terms, numbers = [], []
+        for term in query_terms(query):
+            number = self.term_number(term)
+            if number is not None and term not in terms:
+                terms.append(term)
+                numbers.append(number)
+        result = {'terms': terms, 'dropped': [word for word in normalize_query(query) if word not in terms],
+                  'days': np.asarray(self.days), 'num_tweets': 0,
+                  'counts': np.zeros(len(self.days), dtype='int64'), 'samples': []}
+        if not terms:
+            return result
+
+        if len(numbers) == 1:  # the stored per-day counts, no need to decode the postings for the graph
+            n = numbers[0]
+            start, end = self.day_counts_offsets[n], self.day_counts_offsets[n + 1]
+            result['counts'][self.day_counts_days[start:end]] = self.day_counts[start:end]
+            docs = self.docs(n)
+        else:
+            docs = functools.reduce(np.intersect1d, sorted((self.docs(n) for n in numbers), key=len))
+            result['counts'] = self.count_by_day(docs)
+        result['num_tweets'] = len(docs)
+        result['samples'] = [self.sample(doc) for doc in docs[::-1][:num_samples]]
+        return result
+
+    def sample(self, doc):
+        day = self.days[np.searchsorted(self.day_starts, doc, side='right') - 1]
+        text = bytes(self.doc_text[self.doc_text_offsets[doc]:self.doc_text_offsets[doc + 1]]).decode('utf-8')
+        return {'day': str(day), 'username': self.usernames[self.doc_users[doc]], 'text': text,
+                'id': int(self.doc_ids[doc])}
+
+
+def load_search_index(path=SEARCH_INDEX_PATH):
+    if not os.path.isfile(os.path.join(path, 'manifest.json')):
+        return None
+    try:
+        return SearchIndex(path)
+    except ValueError as e:  # built by an older version, treated as missing until rebuilt
+        print(e)
+        return None
+
+
+if __name__ == '__main__':
+    import argparse
+    from time import time
+
+    parser = argparse.ArgumentParser(description='Build the keyword search index')
+    parser.add_argument('--path', type=str, default=SEARCH_INDEX_PATH)
+    parser.add_argument('--query', type=str, default=None, help='search the existing index instead of building')
+    args = parser.parse_args()
+
+    if args.query:
+        index = SearchIndex(args.path)
+        start = time()
+        result = index.search(args.query)
+        print("{:,} tweets match {} ({:.1f} ms, ignored: {})".format(
+            result['num_tweets'], result['terms'], (time() - start) * 1000, result['dropped']))
+        for sample in result['samples']:
+            print("{day} @{username}: {text}".format(**sample))
+    else:
+        build_search_index(args.path)
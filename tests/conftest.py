@@ -0,0 +1,48 @@
+import datetime
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# the modules live at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+STORE_DAYS = [datetime.date(2019, 10, 18), datetime.date(2019, 10, 19), datetime.date(2019, 10, 20)]
+TEXTS = ['The carbon tax is on the ballot', 'La taxe carbone est sur la table', 'Vote #elxn43 @JustinTrudeau',
+         'What is the plan for pharmacare?', 'Le plan pour les aînés', 'Debate tonight, who won the debate?']
+USERNAMES = ['JustinTrudeau', 'AndrewScheer', 'someone', 'yfblanchet', 'someone_else', 'ElizabethMay']
+
+
+def make_tweets(day, num_tweets, first_id):
+    rows = []
+    for i in range(num_tweets):
+        tweet_id = first_id + i
+        rows.append({'id': tweet_id, 'username': USERNAMES[tweet_id % len(USERNAMES)],
+                     'text': TEXTS[tweet_id % len(TEXTS)],
+                     'date': pd.Timestamp(day) + pd.Timedelta(hours=(tweet_id * 7) % 24),
+                     'retweets': (tweet_id * 13) % 50, 'favorites': (tweet_id * 29) % 80,
+                     'mentions': '@JustinTrudeau' if tweet_id % 3 == 0 else '',
+                     'hashtags': '#elxn43 #cdnpoli' if tweet_id % 2 == 0 else '#cdnpoli',
+                     'urls': 'https://www.cbc.ca/news/{}'.format(tweet_id % 4) if tweet_id % 5 == 0 else ''})
+    return pd.DataFrame(rows)
+
+
+def write_store():
+    """
+    A three day tweet store in tweets/store under the working directory
+    """
+    import tweet_store
+    tweet_store.reset_id_index(tweet_store.STORE_PATH)  # another test's store is cached under the same relative path
+    for i, day in enumerate(STORE_DAYS):
+        tweet_store.write_day_partition(make_tweets(day, 40, 1000 * (i + 1)), day)
+    return STORE_DAYS
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """
+    write_store(), with the working directory (cache/, dashboard/...) in tmp_path
+    """
+    monkeypatch.chdir(tmp_path)
+    return write_store()
@@ -0,0 +1,81 @@
+import gzip
+import json
+import os
+import pickle
+
+import pandas as pd
+import pytest
+
+from conftest import write_store
+
+
+@pytest.fixture(scope='module')
+def app_dir(tmp_path_factory):
+    """
+    app.py imported once, over a snapshot of the test store
+    """
+    pytest.importorskip('dash')
+    from dashboard_snapshot import build_dashboard_snapshot
+
+    path = str(tmp_path_factory.mktemp('app'))
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        write_store()
+        build_dashboard_snapshot()
+        import app
+    finally:
+        os.chdir(cwd)
+    return path, app
+
+
+@pytest.fixture
+def dash_app(app_dir, monkeypatch):
+    path, app = app_dir
+    monkeypatch.chdir(path)
+    return app
+
+
+def test_entity_panels_are_unpickled_on_first_open(dash_app):
+    os.makedirs('nlp_results', exist_ok=True)
+    entities = pd.DataFrame({'entity': ['Canada', 'Ottawa'], 'count': [5, 3]})
+    with open('nlp_results/named_entities.pkl', 'wb') as f:
+        pickle.dump(entities, f)
+    dash_app.load_named_entities.cache_clear()
+
+    assert dash_app.show_entity_panels(0) == ({'display': 'none'}, [])
+    assert dash_app.load_named_entities.cache_info().currsize == 0
+    assert dash_app.show_entity_panels(1) == ({}, entities.to_dict('records'))
+
+
+def test_top_tweet_tables_are_sent_after_the_first_render(dash_app):
+    retweets, favorites = dash_app.load_top_tweets('/')
+    top_text = retweets[0]['text']
+    assert favorites[0]['text'] == dash_app.live_snapshot.current()['favorites_df']['text'].iloc[0]
+
+    layout = dash_app.server.test_client().get('/_dash-layout').get_data(as_text=True)
+    assert 'top10_tweets_by_retweets' in layout
+    assert top_text not in layout
+
+
+def test_callback_requests_show_up_on_metrics(dash_app):
+    client = dash_app.server.test_client()
+    response = client.post('/_dash-update-component', json={
+        'output': 'graph-with-slider.figure', 'outputs': {'id': 'graph-with-slider', 'property': 'figure'},
+        'inputs': [{'id': 'day-slider', 'property': 'value', 'value': [-3, -1]}],
+        'changedPropIds': ['day-slider.value']})
+    assert response.status_code == 200
+
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'dash_callback_duration_seconds_count{{worker="{}",callback="update_figure"}} 1'.format(os.getpid()) in metrics
+    assert 'dashboard_snapshot_reloads{' in metrics
+
+
+def test_layout_is_served_precompressed_with_an_etag(dash_app):
+    client = dash_app.server.test_client()
+    response = client.get('/_dash-layout', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'props' in json.loads(gzip.decompress(response.data))
+    etag = response.headers['ETag']
+
+    assert client.get('/_dash-layout', headers={'If-None-Match': etag}).status_code == 304
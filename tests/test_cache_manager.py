@@ -0,0 +1,114 @@
+import glob
+import importlib
+import os
+import sys
+import threading
+from collections import Counter
+
+from cache_manager import _atomic_dump, _describe_arg, cached, memoize_callback
+
+
+def _entries(cache_dir, artifact):
+    return glob.glob(os.path.join(str(cache_dir), '{}-*.pkl'.format(artifact)))
+
+
+def test_callbacks_on_different_versions_keep_each_others_entries(tmp_path):
+    versions = {'snapshot': 'v1', 'entities': 'e1'}
+
+    @memoize_callback(lambda: versions['snapshot'], cache_dir=str(tmp_path))
+    def figure(x):
+        return x * 2
+
+    @memoize_callback(lambda: versions['entities'], cache_dir=str(tmp_path))
+    def entities(x):
+        return x * 3
+
+    assert figure(1) == 2
+    assert entities(1) == 3
+    assert len(_entries(tmp_path, 'figure')) == 1
+    assert len(_entries(tmp_path, 'entities')) == 1
+
+    # a new snapshot purges the old figure entries only
+    versions['snapshot'] = 'v2'
+    assert figure(1) == 2
+    assert len(_entries(tmp_path, 'figure')) == 1
+    assert len(_entries(tmp_path, 'entities')) == 1
+
+    # and a new entity version leaves the figure entries alone
+    versions['entities'] = 'e2'
+    assert entities(1) == 3
+    assert len(_entries(tmp_path, 'figure')) == 1
+    assert len(_entries(tmp_path, 'entities')) == 1
+
+
+def test_editing_a_helper_module_invalidates_cached_results(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    helper_file = tmp_path / 'aggregate_helpers.py'
+    helper_file.write_text('def scale(x):\n    return x * 2\n')
+    import aggregate_helpers
+    calls = []
+
+    def build():
+        @cached('scaled', inputs=[], depends=[aggregate_helpers], cache_dir=str(tmp_path / 'cache'))
+        def scaled(x):
+            calls.append(x)
+            return aggregate_helpers.scale(x)
+        return scaled
+
+    assert build()(5) == 10
+    assert build()(5) == 10
+    assert len(calls) == 1
+
+    helper_file.write_text('def scale(x):\n    return x * 3\n')
+    importlib.reload(aggregate_helpers)
+    assert build()(5) == 15
+    assert len(calls) == 2
+    del sys.modules['aggregate_helpers']
+
+
+def test_big_counters_are_keyed_on_their_size():
+    assert _describe_arg(Counter({str(i): i for i in range(1000)})) == 'Counter[1000]'
+    assert _describe_arg({'a': 1}) == "{'a': 1}"
+
+
+def test_concurrent_writes_of_one_key_dont_collide(tmp_path):
+    path = str(tmp_path / 'artifact-key.pkl')
+    errors = []
+
+    def dump(i):
+        try:
+            for _ in range(20):
+                _atomic_dump(list(range(i * 1000)), path)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=dump, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.listdir(str(tmp_path)) == ['artifact-key.pkl']
+
+
+def test_callback_results_are_shared_and_not_stored_across_a_data_swap(tmp_path):
+    version = {'snapshot': 'v1'}
+    calls = []
+
+    def make_worker():
+        @memoize_callback(lambda: version['snapshot'], cache_dir=str(tmp_path))
+        def figure(x):
+            calls.append(x)
+            return x * 2
+        return figure
+
+    assert make_worker()(1) == 2
+    assert make_worker()(1) == 2  # another worker reads the first one's entry
+    assert calls == [1]
+
+    def swapping_figure(x):
+        version['snapshot'] = 'v2'
+        return x
+    swapping = memoize_callback(lambda: version['snapshot'], cache_dir=str(tmp_path))(swapping_figure)
+    assert swapping(3) == 3
+    assert _entries(tmp_path, 'swapping_figure') == []
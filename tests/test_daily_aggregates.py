@@ -0,0 +1,39 @@
+import datetime
+
+import pandas as pd
+
+import daily_aggregates
+from engagement import write_snapshot
+
+
+def _count_computed(monkeypatch):
+    computed = []
+
+    def compute_partials(df, names=None):
+        computed.append(names)
+        return daily_aggregates.data_prep.compute_partials(df, names)
+
+    monkeypatch.setattr(daily_aggregates, 'compute_partials', compute_partials)
+    return computed
+
+
+def test_engagement_refresh_rebuilds_only_the_engagement_partials(store, monkeypatch):
+    computed = _count_computed(monkeypatch)
+    before = daily_aggregates.build_dashboard_aggregates()
+    assert len(computed) == 2 * len(store)
+
+    del computed[:]
+    daily_aggregates.build_dashboard_aggregates()
+    assert computed == []
+
+    # one refresh touches a single tweet, yet every day's engagement partial is rebuilt
+    write_snapshot(pd.DataFrame({'id': [1000], 'retweets': [10 ** 6], 'favorites': [10 ** 6]}),
+                   datetime.datetime(2019, 10, 25))
+    after = daily_aggregates.build_dashboard_aggregates()
+    assert computed == [daily_aggregates.ENGAGEMENT_PARTIALS] * len(store)
+    assert after['retweet_df']['retweets'].iloc[0] == 10 ** 6
+    assert after['tweet_volume_df'].equals(before['tweet_volume_df'])
+
+
+def test_merged_partials_match_a_full_rebuild(store):
+    assert daily_aggregates.verify_against_full_rebuild() == []
@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip('flask')
+
+from dash_metrics import CallbackMetrics
+
+
+def test_histograms_are_cumulative_and_errors_counted():
+    metrics = CallbackMetrics(latency_buckets=[0.1, 1.0], size_buckets=[100])
+    metrics.record('update_figure', 0.05, 50)
+    metrics.record('update_figure', 0.5, 500, error=True)
+    metrics.add_gauge('dashboard_snapshot_reloads', lambda: 2, 'reloads')
+
+    lines = metrics.render().splitlines()
+    labels = [line for line in lines if 'dash_callback_duration_seconds_bucket' in line]
+    assert [line.rsplit(' ', 1)[1] for line in labels] == ['1', '2', '2']
+    assert any(line.startswith('dash_callback_duration_seconds_count{') and line.endswith(' 2') for line in lines)
+    assert any(line.startswith('dash_callback_response_bytes_bucket{') and 'le="+Inf"' in line and line.endswith(' 2')
+               for line in lines)
+    assert any(line.startswith('dash_callback_errors_total{') and line.endswith(' 1') for line in lines)
+    assert any(line.startswith('dashboard_snapshot_reloads{') and line.endswith(' 2') for line in lines)
@@ -0,0 +1,40 @@
+import pandas as pd
+
+import dashboard_snapshot
+from daily_aggregates import build_dashboard_aggregates
+
+
+def test_snapshot_serves_the_aggregates_it_was_built_from(store):
+    aggregates = build_dashboard_aggregates()
+    version = dashboard_snapshot.build_dashboard_snapshot()
+    snapshot = dashboard_snapshot.load_dashboard_snapshot()
+
+    assert snapshot.version == version == dashboard_snapshot.current_version()
+    assert snapshot['hashtag_counts_df'].equals(aggregates['hashtag_counts_df'])
+    assert snapshot['overview'] == aggregates['overview']
+
+    leader_df = aggregates['leader_df']
+    columns = ['username', 'id', 'day', 'favorites', 'text']
+    frame = snapshot.leader.frame(columns)
+    frame['username'] = frame['username'].astype(str)
+    assert frame.equals(leader_df[columns].reset_index(drop=True))
+    assert snapshot.leader.text([2]) == [leader_df['text'].iloc[2]]
+
+
+def test_live_snapshot_swaps_in_new_versions(store, monkeypatch):
+    aggregates = build_dashboard_aggregates()
+    first = dashboard_snapshot.build_dashboard_snapshot(aggregates=aggregates)
+    live = dashboard_snapshot.LiveSnapshot(prepare=lambda snapshot: snapshot.version)
+    assert live.current().version == first
+    assert not live.reload_if_changed()
+
+    # a version built later in the same second
+    monkeypatch.setattr(dashboard_snapshot, 'VERSION_FORMAT', 'v=%Y%m%dT%H%M%SZ')
+    second = dashboard_snapshot.build_dashboard_snapshot(aggregates=aggregates)
+    assert second != first
+    assert live.reload_if_changed()
+    assert live.current().version == live.current().prepared == second
+    assert live.num_reloads == 1
+
+    dashboard_snapshot.prune_versions(keep=1)
+    assert dashboard_snapshot.list_versions() == [second]
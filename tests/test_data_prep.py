@@ -0,0 +1,20 @@
+import pandas as pd
+
+from data_prep import clean_data
+
+
+def test_clean_data_compacts_dtypes_and_adds_date_columns():
+    df = clean_data(pd.DataFrame({
+        'id': [1, 2],
+        'username': ['JustinTrudeau', 'someone'],
+        'retweets': [3, None],
+        'favorites': [4, 5],
+        'date': pd.to_datetime(['2019-10-20 23:30', '2019-10-21 01:00'], utc=True),
+    }))
+    assert df['leader'].tolist()[0] == 'JustinTrudeau' and pd.isna(df['leader'].tolist()[1])
+    assert str(df['username'].dtype) == 'category'
+    assert df['retweets'].tolist() == [3, 0] and df['retweets'].dtype == 'int32'
+    assert df['day'].tolist() == [pd.Timestamp(2019, 10, 20), pd.Timestamp(2019, 10, 21)]
+    assert df['day_of_week'].tolist() == ['Sunday', 'Monday']
+    assert df['hour'].tolist() == [23, 1] and df['hour'].dtype == 'int8'
+    assert df['days_until_election'].tolist() == [-1, 0]
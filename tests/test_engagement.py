@@ -0,0 +1,34 @@
+import datetime
+
+import pandas as pd
+
+import engagement
+
+
+def test_latest_snapshot_wins_per_tweet(tmp_path):
+    snapshot_path = str(tmp_path)
+    engagement.write_snapshot(pd.DataFrame({'id': [1, 2], 'retweets': [5, 6], 'favorites': [7, 8]}),
+                              datetime.datetime(2019, 10, 1), snapshot_path)
+    # a later refresh that only covered tweet 2
+    engagement.write_snapshot(pd.DataFrame({'id': [2], 'retweets': [60], 'favorites': [80]}),
+                              datetime.datetime(2019, 10, 2), snapshot_path)
+
+    df = pd.DataFrame({'id': [1, 2, 3], 'retweets': [0, 0, 9], 'favorites': [0, 0, 9]}).astype('int32')
+    df = engagement.apply_latest_engagement(df, snapshot_path)
+    assert df['retweets'].tolist() == [5, 60, 9]
+    assert df['favorites'].tolist() == [7, 80, 9]
+    assert df['retweets'].dtype == 'int32'
+
+
+def test_refresh_looks_up_every_stored_tweet_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(engagement, 'load_tweets', lambda columns, start_day, end_day: pd.DataFrame({'id': [1, 2, 2, 3]}))
+    batches = []
+
+    def lookup(ids):
+        batches.append(ids)
+        return [{'id': i, 'retweets': i * 10, 'favorites': i} for i in ids if i != 3]  # 3 was deleted
+
+    file_path = engagement.refresh_engagement(lookup, batch_size=2, snapshot_path=str(tmp_path))
+    assert batches == [[1, 2], [3]]
+    assert engagement.list_snapshots(str(tmp_path)) == [file_path]
+    assert engagement.read_latest_engagement(str(tmp_path))['retweets'].tolist() == [10, 20]
@@ -0,0 +1,21 @@
+from entity_cache import EntityCache, text_key
+
+
+def test_entities_are_found_again_after_a_save(tmp_path):
+    path = str(tmp_path / 'ner_entities-test.npz')
+    cache = EntityCache('test', path)
+    keys = [text_key('Trudeau in Montreal'), text_key('nothing here'), text_key('Scheer  in Ottawa')]
+    assert cache.get_many(keys) == [None, None, None]
+    cache.add(keys[:2], [['Trudeau', 'Montreal'], []])
+    assert cache.get_many(keys) == [['Trudeau', 'Montreal'], [], None]  # pending entries are found before the save
+    cache.save()
+    cache.add(keys[2:], [['Scheer', 'Ottawa']])
+    cache.save()
+
+    cache = EntityCache('test', path)
+    assert len(cache) == 3
+    # the key is on the whitespace-normalized text
+    assert cache.get_many([text_key('Scheer in Ottawa'), keys[1], keys[0], text_key('new')]) == [
+        ['Scheer', 'Ottawa'], [], ['Trudeau', 'Montreal'], None]
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert cache.hit_rate() == 0.75
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('flask')
+
+from figure_payloads import downsample_indices
+
+
+def test_short_series_are_kept_whole():
+    assert downsample_indices([3, 1, 2], max_points=10).tolist() == [0, 1, 2]
+
+
+def test_downsampling_keeps_spikes_in_order():
+    y = np.zeros(10000)
+    y[1234], y[8765] = 50, -50
+    keep = downsample_indices(y, max_points=100)
+    assert len(keep) <= 100
+    assert 1234 in keep and 8765 in keep
+    assert (np.diff(keep) > 0).all()
@@ -0,0 +1,71 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+import tweet_store
+from id_index import INDEX_FILE, TweetIdIndex
+
+DAY = datetime.date(2019, 10, 1)
+OTHER_DAY = datetime.date(2019, 10, 2)
+
+
+def test_claim_drops_ids_already_stored_under_any_day(tmp_path):
+    index = TweetIdIndex(str(tmp_path / 'index.npz'))
+    assert index.claim([1, 2, 2], DAY).tolist() == [True, True, False]
+    assert index.claim([2, 3], DAY).tolist() == [False, True]
+    assert index.claim([3, 4], OTHER_DAY).tolist() == [False, True]
+    assert index.claim([1, 2], DAY, replace_day=True).tolist() == [True, True]
+    assert index.day_of(3) is None and index.day_of(4) == OTHER_DAY
+
+
+def test_claims_are_saved_once_per_committed_day(tmp_path):
+    store_path = str(tmp_path)
+    checkpoint = tweet_store.read_checkpoint(DAY, store_path)
+    checkpoint = tweet_store.append_chunk(pd.DataFrame({'id': [3, 2]}), DAY, checkpoint, store_path)
+    checkpoint = tweet_store.append_chunk(pd.DataFrame({'id': [2, 1]}), DAY, checkpoint, store_path)
+    assert not os.path.isfile(os.path.join(store_path, INDEX_FILE))
+    assert checkpoint['num_tweets'] == 3 and checkpoint['num_duplicates'] == 1
+
+    tweet_store.commit_partial_partition(DAY, store_path)
+    assert len(TweetIdIndex(os.path.join(store_path, INDEX_FILE))) == 3
+    assert sorted(tweet_store.read_tweets(['id'], store_path=store_path)['id']) == [1, 2, 3]
+
+
+def test_resumed_day_claims_its_written_parts_again(tmp_path):
+    store_path = str(tmp_path)
+    checkpoint = tweet_store.append_chunk(pd.DataFrame({'id': [3, 2]}), DAY, tweet_store.read_checkpoint(DAY, store_path),
+                                          store_path)
+    tweet_store.reset_id_index(store_path)  # the process died before the day was committed
+
+    checkpoint = tweet_store.read_checkpoint(DAY, store_path)
+    checkpoint = tweet_store.append_chunk(pd.DataFrame({'id': [2, 1]}), DAY, checkpoint, store_path)
+    assert checkpoint['num_tweets'] == 3
+    assert np.array_equal(tweet_store.get_id_index(store_path).ids, [1, 2, 3])
+
+
+def test_commit_drops_checkpoint_and_empty_rescrape_releases_day(tmp_path):
+    store_path = str(tmp_path)
+    tweet_store.append_chunk(pd.DataFrame({'id': [1, 2]}), DAY, tweet_store.read_checkpoint(DAY, store_path), store_path)
+    day_path = tweet_store.commit_partial_partition(DAY, store_path)
+    assert not os.path.isfile(os.path.join(day_path, tweet_store.CHECKPOINT_FILE))
+
+    checkpoint = tweet_store.read_checkpoint(DAY, store_path)
+    tweet_store.append_chunk(pd.DataFrame(columns=['id']), DAY, checkpoint, store_path)
+    tweet_store.commit_partial_partition(DAY, store_path)
+    assert len(TweetIdIndex(os.path.join(store_path, INDEX_FILE))) == 0
+    assert tweet_store.read_tweets(['id'], store_path=store_path).empty
+
+
+def test_rebuild_finds_and_removes_tweets_stored_under_several_days(tmp_path):
+    store_path = str(tmp_path)
+    tweet_store.write_day_partition(pd.DataFrame({'id': [1, 2]}), DAY, store_path)
+    tweet_store.reset_id_index(store_path)  # e.g. the index file was lost
+    tweet_store.write_day_partition(pd.DataFrame({'id': [2, 3]}), OTHER_DAY, store_path)
+
+    assert tweet_store.rebuild_id_index(store_path) == {OTHER_DAY: 1}
+    assert tweet_store.read_tweets(['id'], store_path=store_path)['id'].tolist() == [1, 2, 2, 3]
+    assert tweet_store.rebuild_id_index(store_path, dedupe=True) == {OTHER_DAY: 1}
+    assert tweet_store.read_tweets(['id'], store_path=store_path)['id'].tolist() == [1, 2, 3]
+    assert TweetIdIndex(os.path.join(store_path, INDEX_FILE)).day_of(2) == DAY
@@ -0,0 +1,22 @@
+import numpy as np
+
+from language_id import detect_languages, languages_of, route_by_language
+
+
+def test_languages_of_looks_up_stored_languages():
+    stored = [{'ids': np.array([10, 11], dtype='int64'), 'codes': np.asarray(detect_languages(
+        ['the tax is on the table', 'la taxe est sur la table']).codes, dtype='int8')}]
+    assert list(languages_of([11, 12, 10], stored)) == ['fr', 'und', 'en']
+
+
+def test_route_by_language_skips_languages_without_pipeline():
+    results, stats = route_by_language(['en', 'fr', 'en'], ['a', 'b', 'c'], {'en': lambda items: [i.upper() for i in items]})
+    assert results == ['A', None, 'C']
+    assert stats['fr']['skipped'] and stats['en']['count'] == 2
+
+
+def test_skipped_rows_get_their_own_default():
+    results, _ = route_by_language(['fr', 'fr', 'en'], ['a', 'b', 'c'], {'en': lambda items: [[i] for i in items]},
+                                   default=[])
+    results[0].append('entity')
+    assert results == [['entity'], [], ['c']]
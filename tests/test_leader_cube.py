@@ -0,0 +1,28 @@
+import datetime
+
+import numpy as np
+
+from data_prep import LEADER_USERNAMES
+from leader_cube import LeaderDayCube
+
+CODES = np.array([0, 0, 1, 0, 4, 1])
+DAYS = np.array([-10, -10, -9, -7, -7, -1])
+
+
+def test_range_totals_and_series_match_a_filter_on_the_tweets():
+    cube = LeaderDayCube.from_columns(CODES, DAYS)
+    assert (cube.first_day, cube.last_day) == (-10, -1)
+    for start, end in [(-10, -1), (-9, -7), (-30, -8), (-2, 5)]:
+        in_range = (DAYS >= start) & (DAYS <= end)
+        assert cube.totals(start, end).tolist() == np.bincount(CODES[in_range], minlength=len(LEADER_USERNAMES)).tolist()
+
+    dates, counts = cube.series('JustinTrudeau', -10, -7)
+    assert dates == [datetime.date(2019, 10, 11), datetime.date(2019, 10, 14)]
+    assert counts == [2, 1]
+    assert cube.active_days().tolist() == [-10, -9, -7, -1]
+
+
+def test_cube_without_leader_tweets_is_empty():
+    cube = LeaderDayCube.from_columns([], [])
+    assert cube.totals(-10, 0).tolist() == [0] * len(LEADER_USERNAMES)
+    assert cube.series('yfblanchet', -10, 0) == ([], [])
@@ -0,0 +1,15 @@
+import numpy as np
+
+from leader_index import LeaderTopIndex
+
+CODES = np.array([1, 0, 1, 0, 1, 0])
+FAVORITES = np.array([5, 3, 9, 7, 5, 3])
+
+
+def test_pages_follow_a_stable_descending_sort_per_leader():
+    index = LeaderTopIndex.from_columns(CODES, FAVORITES)
+    assert index.num_rows('JustinTrudeau') == 3 and index.num_rows('yfblanchet') == 0
+    assert index.rows('JustinTrudeau').tolist() == [3, 1, 5]  # ties keep their row order
+    assert index.rows('AndrewScheer', 1, 3).tolist() == [0, 4]
+    assert index.rows('AndrewScheer', 2, 10).tolist() == [4]
+    assert index.rows('yfblanchet').tolist() == []
@@ -0,0 +1,43 @@
+from leader_profiles import LeaderProfileStore, StubProfileBackend
+
+USERNAMES = ['JustinTrudeau', 'AndrewScheer']
+
+
+class CountingBackend(StubProfileBackend):
+    def __init__(self, fail=False):
+        super(CountingBackend, self).__init__()
+        self.fetched = []
+        self.fail = fail
+
+    def fetch(self, username):
+        self.fetched.append(username)
+        if self.fail:
+            raise IOError('rate limited')
+        return super(CountingBackend, self).fetch(username)
+
+
+def test_profiles_are_fetched_once_per_ttl_across_workers(tmp_path):
+    path = str(tmp_path / 'profiles.json')
+    backend = CountingBackend()
+    store = LeaderProfileStore(USERNAMES, backend, path=path, ttl=3600)
+    assert store.get('JustinTrudeau')['followers_count'] == '-'  # placeholder until fetched
+
+    assert sorted(store.refresh()) == sorted(USERNAMES)
+    assert store.get('JustinTrudeau')['location'] == 'Canada'
+    assert store.refresh() == []
+
+    # another worker starts from the file and finds nothing stale
+    other = LeaderProfileStore(USERNAMES, backend, path=path, ttl=3600)
+    assert other.refresh() == []
+    assert sorted(backend.fetched) == sorted(USERNAMES)
+
+
+def test_failed_refresh_keeps_serving_the_old_profile(tmp_path):
+    path = str(tmp_path / 'profiles.json')
+    LeaderProfileStore(USERNAMES, CountingBackend(), path=path, ttl=3600).refresh()
+
+    store = LeaderProfileStore(USERNAMES, CountingBackend(fail=True), path=path, ttl=0)
+    version = store.version()
+    store.refresh()
+    assert store.get('AndrewScheer')['name'] == 'AndrewScheer'
+    assert store.version() == version
@@ -0,0 +1,56 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import named_entity_resolution as ner
+from language_id import load_languages
+from tweet_store import load_tweets
+
+
+def _fake_entities(tweet):
+    # the capitalized words, standing in for the nltk chunker whose models aren't needed here
+    return [word for word in tweet.split() if word[:1].isupper()]
+
+
+def test_pool_returns_entities_in_tweet_order(monkeypatch):
+    # workers are forked from this process, so they see the patched functions
+    monkeypatch.setattr(ner, 'extract_entities', _fake_entities)
+    monkeypatch.setattr(ner, 'load_models', lambda: {})
+    tweets = ['Tweet {} about Trudeau'.format(i) if i % 2 else 'tweet {} about nothing'.format(i) for i in range(25)]
+
+    expected = [_fake_entities(tweet) for tweet in tweets]
+    assert list(ner.iter_entities(tweets, workers=2, chunk_size=4)) == expected
+    assert list(ner.iter_entities(tweets, workers=1, chunk_size=4)) == expected
+
+    pool = ner.make_pool(2)
+    try:
+        assert list(ner.iter_entities(tweets[:3], chunk_size=2, pool=pool)) == expected[:3]
+        assert list(ner.iter_entities(tweets[3:], chunk_size=2, pool=pool)) == expected[3:]
+    finally:
+        pool.terminate()
+
+
+def test_streamed_entities_match_the_in_memory_extraction(store, monkeypatch):
+    monkeypatch.setattr(ner, 'extract_entities', _fake_entities)
+    tweets = load_tweets(['id', 'username', 'text'])
+    tweets['lang'] = load_languages(tweets['id'])
+
+    batches = list(ner.iter_tweet_batches(batch_size=15))
+    assert max(len(batch) for batch in batches) == 15
+    assert pd.concat(batches, ignore_index=True).equals(tweets)
+
+    ner.stream_named_entities('entities.parquet', workers=1, batch_size=15)
+    entities_per_tweet = ner.extract_named_entities(tweets, workers=1)
+    expected = [(tweet_id, username, entity) for tweet_id, username, entities
+                in zip(tweets['id'], tweets['username'], entities_per_tweet) for entity in entities]
+    streamed = pd.concat(ner.iter_entity_batches('entities.parquet'), ignore_index=True)
+    assert list(streamed.itertuples(index=False, name=None)) == expected
+    assert len(expected) > 0
+
+
+def test_entity_file_of_another_schema_is_rejected(tmp_path):
+    path = str(tmp_path / 'entities.parquet')
+    pq.write_table(pa.table({'id': [1], 'entity': ['Trudeau']}), path)
+    with pytest.raises(ValueError):
+        list(ner.iter_entity_batches(path))
@@ -0,0 +1,45 @@
+import threading
+
+from scrape_scheduler import ScrapeState, TokenBucket, run_scrape_schedule
+
+DAYS = ['2019-10-03', '2019-10-02', '2019-10-01']
+
+
+def test_failed_days_are_retried_and_done_days_skipped(tmp_path):
+    state = ScrapeState(str(tmp_path / 'state.json'))
+    state.mark_done(DAYS[0], 5)
+    attempts = {}
+    lock = threading.Lock()
+
+    def scrape_day(day, rate_limiter):
+        rate_limiter.acquire()
+        with lock:
+            attempts[day] = attempts.get(day, 0) + 1
+        if day == DAYS[1] and attempts[day] == 1:
+            raise IOError('rate limited')
+        return 10
+
+    progress = run_scrape_schedule(DAYS, scrape_day, workers=2, requests_per_second=1000, state=state, retries=2,
+                                   base_delay=0)
+    assert attempts == {DAYS[1]: 2, DAYS[2]: 1}
+    assert (progress.days_done, progress.days_failed, progress.num_tweets) == (2, 0, 20)
+    assert sorted(ScrapeState(state.path).done) == sorted(DAYS)
+
+
+def test_day_failing_every_retry_is_not_marked_done(tmp_path):
+    state = ScrapeState(str(tmp_path / 'state.json'))
+
+    def scrape_day(day, rate_limiter):
+        raise IOError('down')
+
+    progress = run_scrape_schedule(DAYS[:1], scrape_day, workers=1, requests_per_second=1000, state=state, retries=1,
+                                   base_delay=0)
+    assert progress.days_failed == 1
+    assert not state.is_done(DAYS[0])
+
+
+def test_token_bucket_starts_with_its_capacity():
+    bucket = TokenBucket(rate=0.001, capacity=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert bucket.tokens < 1
@@ -0,0 +1,60 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import search_index
+
+DAYS = {datetime.date(2019, 9, 1): ['Carbon tax', 'The tax on carbon. Debate'],
+        datetime.date(2019, 9, 2): ['carbon pricing', 'The. debate on tax']}
+
+
+def _preprocessing(text):
+    # the order of get_tweets.PRE_PROCESSING_OPTIONS: stopwords are removed before the punctuation is stripped
+    from gensim.parsing.preprocessing import remove_stopwords, strip_punctuation, strip_multiple_whitespaces
+    return strip_multiple_whitespaces(strip_punctuation(remove_stopwords(text.lower())))
+
+
+def _build(tmp_path, monkeypatch):
+    pytest.importorskip('gensim')
+    monkeypatch.chdir(tmp_path)  # the cleaned days are cached under cache/
+    monkeypatch.setattr(search_index, 'list_input_files', lambda: [(day, ['part']) for day in sorted(DAYS)])
+    monkeypatch.setattr(search_index, 'load_tweets', lambda columns, start_day, end_day, workers: pd.DataFrame({
+        'id': np.arange(len(DAYS[start_day])) + 100 * start_day.day, 'username': 'user', 'text': DAYS[start_day]}))
+    monkeypatch.setattr(search_index, '_preprocessing_func', lambda: _preprocessing)
+    path = str(tmp_path / 'search_index')
+    search_index.build_search_index(path)
+    return search_index.SearchIndex(path)
+
+
+def test_query_is_cleaned_like_the_indexed_tweets(tmp_path, monkeypatch):
+    index = _build(tmp_path, monkeypatch)
+    result = index.search('Tax on carbon')
+    assert result['terms'] == ['tax', 'carbon']
+    assert result['dropped'] == ['on']
+    assert result['num_tweets'] == 2
+    assert result['counts'].tolist() == [2, 0]
+
+    # 'The.' was indexed as 'the', and the same query text finds it
+    result = index.search('The. debate')
+    assert result['terms'] == ['the', 'debate']
+    assert result['num_tweets'] == 1 and result['counts'].tolist() == [0, 1]
+
+
+def test_words_in_no_tweet_are_dropped(tmp_path, monkeypatch):
+    index = _build(tmp_path, monkeypatch)
+    result = index.search('carbon pharmacare')
+    assert result['terms'] == ['carbon']
+    assert result['dropped'] == ['pharmacare']
+    assert result['num_tweets'] == 3
+
+    result = index.search('on the')
+    assert result['terms'] == []
+    assert result['dropped'] == ['on', 'the']
+    assert result['num_tweets'] == 0
+
+
+def test_varint_round_trip():
+    values = np.array([0, 1, 127, 128, 16383, 16384, 2 ** 34], dtype='uint64')
+    assert search_index.varint_decode(search_index.varint_encode(values)).tolist() == values.tolist()
@@ -0,0 +1,19 @@
+import numpy as np
+
+from text_dedup import TextDedup
+
+
+def test_each_distinct_text_is_processed_once():
+    dedup = TextDedup(['Vote  today', 'vote today', 'Vote today', 'Debate tonight'])
+    calls = []
+
+    def upper(texts):
+        calls.append(list(texts))
+        return [text.upper() for text in texts]
+
+    assert dedup.run('upper', upper) == ['VOTE TODAY', 'VOTE TODAY', 'VOTE TODAY', 'DEBATE TONIGHT']
+    assert calls == [['Vote today', 'vote today', 'Debate tonight']]
+    assert dedup.ratio() == 0.25
+    assert dedup.stats['upper']['unique_texts'] == 3 and dedup.stats['upper']['rows'] == 4
+    # array results (embeddings) are fanned out by row too
+    assert dedup.expand(np.arange(3) * 10).tolist() == [0, 10, 0, 20]
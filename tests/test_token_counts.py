@@ -0,0 +1,27 @@
+from collections import Counter
+
+import pandas as pd
+
+from token_counts import TokenCounter
+
+HASHTAGS = pd.Series(['#a #b', None, '#b #c', '#c', '#b'], index=[10, 11, 12, 13, 14])
+USERS = pd.Series(['u1', 'u2', 'u1', 'u2', 'u2'], index=[10, 11, 12, 13, 14])
+
+
+def _counter(series):
+    return Counter(token for tokens in series.dropna() for token in tokens.split(' '))
+
+
+def test_counts_match_counter_including_ties():
+    counter = TokenCounter(HASHTAGS)
+    assert counter.top_k(3) == _counter(HASHTAGS).most_common(3)
+    assert counter.to_counter() == _counter(HASHTAGS)
+    assert len(counter) == 6 and counter.num_unique == 3
+
+
+def test_counts_by_group_match_per_group_counters():
+    counter = TokenCounter(HASHTAGS)
+    expected = {user: _counter(HASHTAGS[USERS == user]) for user in ['u1', 'u2']}
+    assert counter.top_k_by(USERS, 2) == {user: c.most_common(2) for user, c in expected.items()}
+    assert {user: list(c.items()) for user, c in counter.counters_by(USERS).items()} == \
+        {user: list(c.items()) for user, c in expected.items()}
@@ -0,0 +1,68 @@
+import datetime
+import os
+
+import pandas as pd
+
+import tweet_store
+
+DAY = datetime.date(2019, 10, 1)
+NEXT_DAY = datetime.date(2019, 10, 2)
+
+
+def _tweets(ids, day=DAY):
+    return pd.DataFrame({'id': ids, 'username': ['user{}'.format(i) for i in ids], 'text': ['tweet {}'.format(i) for i in ids],
+                         'date': [pd.Timestamp(day)] * len(ids), 'retweets': [1] * len(ids), 'favorites': [2] * len(ids)})
+
+
+def test_day_partitions_read_back_by_column_and_day(tmp_path):
+    store_path = str(tmp_path)
+    tweet_store.write_day_partition(_tweets([1, 2]), DAY, store_path)
+    tweet_store.write_day_partition(_tweets([3], NEXT_DAY), '2019-10-02', store_path)
+    os.makedirs(tweet_store.partition_path(NEXT_DAY, store_path) + '.partial')  # still being streamed in
+
+    assert [day for day, _ in tweet_store.list_partitions(store_path=store_path)] == [DAY, NEXT_DAY]
+    df = tweet_store.read_tweets(['id', 'retweets'], store_path=store_path)
+    assert list(df.columns) == ['id', 'retweets']
+    assert df['id'].tolist() == [1, 2, 3]
+    assert tweet_store.read_tweets(['id'], start_day=NEXT_DAY, store_path=store_path)['id'].tolist() == [3]
+    assert tweet_store.read_tweets(['id'], end_day='2019-10-01', store_path=store_path)['id'].tolist() == [1, 2]
+
+
+def test_rewriting_a_day_replaces_its_partition(tmp_path):
+    store_path = str(tmp_path)
+    tweet_store.write_day_partition(_tweets([1, 2]), DAY, store_path)
+    tweet_store.write_day_partition(_tweets([2, 4]), DAY, store_path)
+    assert tweet_store.read_tweets(['id'], store_path=store_path)['id'].tolist() == [2, 4]
+
+
+def test_load_tweets_reads_the_csv_archive_until_converted(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tweet_store.reset_id_index(tweet_store.STORE_PATH)
+    os.makedirs('tweets')
+    _tweets([1, 2]).to_csv('tweets/cdnpoli_20191001.csv', index=False)
+    _tweets([3], NEXT_DAY).to_csv('tweets/cdnpoli_20191002.csv', index=False)
+
+    assert tweet_store.load_tweets(['id', 'text'])['id'].tolist() == [1, 2, 3]
+    assert [day for day, _ in tweet_store.list_input_files()] == [DAY, NEXT_DAY]
+
+    tweet_store.convert_csv_archive()
+    assert tweet_store.has_store()
+    df = tweet_store.load_tweets(['id', 'text'], start_day=NEXT_DAY)
+    assert df['id'].tolist() == [3] and df['text'].tolist() == ['tweet 3']
+
+
+def test_streamed_day_is_checkpointed_and_published_on_commit(tmp_path):
+    store_path = str(tmp_path)
+    checkpoint = tweet_store.read_checkpoint(DAY, store_path)
+    checkpoint = tweet_store.append_chunk(_tweets([30, 20]), DAY, checkpoint, store_path)
+    checkpoint = tweet_store.append_chunk(_tweets([10]), DAY, checkpoint, store_path)
+
+    # a restarted scrape resumes below the oldest tweet written, and nothing is visible until the commit
+    assert tweet_store.read_checkpoint(DAY, store_path) == {'max_id': 9, 'num_parts': 2, 'num_tweets': 3,
+                                                           'num_duplicates': 0}
+    assert tweet_store.read_tweets(['id'], store_path=store_path).empty
+
+    day_path = tweet_store.commit_partial_partition(DAY, store_path)
+    assert sorted(os.listdir(day_path)) == ['part-00000.parquet', 'part-00001.parquet']
+    assert tweet_store.read_tweets(['id'], store_path=store_path)['id'].tolist() == [30, 20, 10]
+    assert tweet_store.read_checkpoint(DAY, store_path)['num_parts'] == 0
@@ -0,0 +1,60 @@
+import gc
+import importlib.util
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.path.isfile('/proc/self/smaps_rollup') or not hasattr(gc, 'freeze'),
+                                reason='needs Linux smaps_rollup and python 3.7+')
+
+GUNICORN_CONF = os.path.join(os.path.dirname(__file__), os.pardir, 'gunicorn.conf.py')
+
+
+def _private_dirty_mb():
+    # pages only this process has written to, i.e. no longer shared with the master
+    with open('/proc/self/smaps_rollup') as f:
+        fields = dict(line.split()[:2] for line in f if line.split()[0].endswith(':'))
+    return int(fields['Private_Dirty:']) / 1024
+
+
+def _worker(snapshot, results):
+    before = _private_dirty_mb()
+    for col in snapshot.leader.columns.values():  # read the leader columns like the callbacks do
+        np.asarray(col).view('uint8').sum()
+    gc.collect()
+    results.put(_private_dirty_mb() - before)
+
+
+def _fork_worker(snapshot):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    worker = context.Process(target=_worker, args=(snapshot, results))
+    worker.start()
+    grown = results.get()
+    worker.join()
+    return grown
+
+
+def test_preloaded_worker_stays_shared_after_gc_freeze(store):
+    from dashboard_snapshot import build_dashboard_snapshot, load_dashboard_snapshot
+
+    build_dashboard_snapshot()
+    snapshot = load_dashboard_snapshot()
+    preloaded = [(i, str(i)) for i in range(200000)]  # python objects preloaded with the app, e.g. the tables
+
+    unfrozen = _fork_worker(snapshot)
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', GUNICORN_CONF)
+    gunicorn_conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gunicorn_conf)
+    gunicorn_conf.pre_fork(None, None)
+    try:
+        frozen = _fork_worker(snapshot)
+    finally:
+        gc.unfreeze()
+
+    # without the freeze a collection in the worker writes to every preloaded object and copies its pages
+    assert unfrozen > 10
+    assert frozen < 2
+    del preloaded
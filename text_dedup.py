@@ -0,0 +1,58 @@
+# Retweets and copy-pasted campaign messages make a large share of tweet texts identical: NLP stages run once per
+# distinct (whitespace-normalized) text and their results are fanned back out to the rows with an index array.
+#     dedup = TextDedup(df['text'])
+#     df['named_entity'] = dedup.run('named entities', extract)   # extract(list of unique texts) -> one result each
+from time import time
+
+import numpy as np
+import pandas as pd
+
+
+def normalize_text(text):
+    # whitespace never changes what the NLP stages see: their tokenizers split on it
+    return ' '.join(str(text).split())
+
+
+class TextDedup(object):
+    def __init__(self, texts):
+        start = time()
+        codes, uniques = pd.factorize(pd.Series([normalize_text(text) for text in texts], dtype=object))
+        self.inverse = codes  # row -> position in unique_texts
+        self.unique_texts = list(uniques)
+        self.seconds = time() - start
+        self.stats = {}
+
+    def __len__(self):
+        return len(self.inverse)
+
+    def ratio(self):
+        """
+        Share of rows whose text is a repeat
+        """
+        return 1 - len(self.unique_texts) / len(self.inverse) if len(self.inverse) else 0.0
+
+    def apply(self, name, func):
+        """
+        func(unique_texts), timed and reported: one result per unique text
+        """
+        start = time()
+        results = func(self.unique_texts)
+        seconds = time() - start
+        # what the stage would have cost on every row, at the measured time per text
+        saved = seconds / len(self.unique_texts) * (len(self.inverse) - len(self.unique_texts)) if self.unique_texts else 0.0
+        self.stats[name] = {'rows': len(self.inverse), 'unique_texts': len(self.unique_texts), 'seconds': seconds,
+                            'saved_seconds': saved}
+        print("{}: {:,} rows, {:,} unique texts ({:.1%} duplicates), {:.1f}s, ~{:.1f}s saved by dedup".format(
+            name, len(self.inverse), len(self.unique_texts), self.ratio(), seconds, saved))
+        return results
+
+    def expand(self, results):
+        """
+        Per unique text results back to one per row
+        """
+        if isinstance(results, np.ndarray):
+            return results[self.inverse]
+        return [results[i] for i in self.inverse]
+
+    def run(self, name, func):
+        return self.expand(self.apply(name, func))
@@ -0,0 +1,72 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+
+class TokenCounter(object):
+    """
+    Space-separated tokens of a column (hashtags, mentions, urls) exploded once and integer-coded.
+    Codes follow first-seen order, so a stable sort on the counts breaks ties exactly like Counter.most_common().
+    :param series: text column; missing values are skipped
+    """
+    def __init__(self, series):
+        series = series.reset_index(drop=True)
+        tokens = series.dropna().str.split(' ').explode()
+        self.rows = tokens.index.values  # position of the source row for every token
+        codes, self.tokens = pd.factorize(tokens.values)
+        self.codes = codes.astype('int64')
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def num_unique(self):
+        return len(self.tokens)
+
+    def counts(self):
+        return np.bincount(self.codes, minlength=len(self.tokens))
+
+    def top_k(self, k):
+        """
+        Same as Counter(tokens).most_common(k)
+        """
+        counts = self.counts()
+        order = np.argsort(-counts, kind='stable')[:k]
+        return list(zip(self.tokens[order].tolist(), counts[order].tolist()))
+
+    def to_counter(self):
+        return Counter(dict(zip(self.tokens.tolist(), self.counts().tolist())))
+
+    def grouped_counts(self, groups):
+        """
+        Token counts per group, with each token's first position inside its group for tie-breaking
+        :param groups: values aligned with the original series, e.g. df['username'] or df['day']
+        :return: dataframe [group, token, count, first], ordered like most_common() within each group
+        """
+        group_codes, group_values = pd.factorize(np.asarray(groups)[self.rows])
+        counts = (pd.DataFrame({'group': group_codes, 'token': self.codes, 'position': np.arange(len(self.codes))})
+                  .groupby(['group', 'token'])['position'].agg(['size', 'min'])
+                  .rename(columns={'size': 'count', 'min': 'first'})
+                  .reset_index())
+        counts = counts[counts['group'] >= 0]  # tokens of rows whose group is missing
+        counts = counts.sort_values(['group', 'count', 'first'], ascending=[True, False, True], kind='mergesort')
+        counts['group'] = np.asarray(group_values)[counts['group'].values]
+        counts['token'] = self.tokens[counts['token'].values]
+        return counts.reset_index(drop=True)
+
+    def top_k_by(self, groups, k):
+        """
+        {group: Counter(tokens of that group's rows).most_common(k)} without re-filtering the frame per group
+        """
+        counts = self.grouped_counts(groups)
+        top = counts.groupby('group', sort=False).head(k)
+        return {group: list(zip(g['token'].tolist(), g['count'].tolist())) for group, g in top.groupby('group', sort=False)}
+
+    def counters_by(self, groups):
+        """
+        {group: Counter} with keys in first-seen order inside each group, so they merge like per-group Counters
+        """
+        counts = self.grouped_counts(groups).sort_values(['group', 'first'], kind='mergesort')
+        return {group: Counter(dict(zip(g['token'].tolist(), g['count'].tolist())))
+                for group, g in counts.groupby('group', sort=False)}
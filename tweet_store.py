@@ -0,0 +1,336 @@
+import datetime
+import glob
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from id_index import get_id_index, reset_id_index
+
+# Tweets are stored as one directory per day: tweets/store/day=20191006/part-00000.parquet
+STORE_PATH = 'tweets/store'
+CSV_GLOB = 'tweets/cdnpoli_*.csv'
+PARTITION_FORMAT = 'day=%Y%m%d'
+PARTITION_PATTERN = re.compile(r'^day=\d{8}$')
+CHECKPOINT_FILE = '_checkpoint.json'
+
+TWEET_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('permalink', pa.string()),
+    ('username', pa.string()),
+    ('to', pa.string()),
+    ('text', pa.string()),
+    ('date', pa.timestamp('ns', tz='UTC')),
+    ('retweets', pa.int64()),
+    ('favorites', pa.int64()),
+    ('replies', pa.int64()),
+    ('mentions', pa.string()),
+    ('hashtags', pa.string()),
+    ('geo', pa.string()),
+    ('urls', pa.string()),
+    ('author_id', pa.int64()),
+    ('formatted_date', pa.string()),
+])
+
+INT_COLS = [field.name for field in TWEET_SCHEMA if pa.types.is_integer(field.type)]
+STRING_COLS = [field.name for field in TWEET_SCHEMA if pa.types.is_string(field.type)]
+
+
+def _to_day(day):
+    if isinstance(day, str):
+        return datetime.datetime.strptime(day.replace('-', ''), '%Y%m%d').date()
+    if isinstance(day, datetime.datetime):
+        return day.date()
+    return day
+
+
+def partition_path(day, store_path=STORE_PATH):
+    return os.path.join(store_path, _to_day(day).strftime(PARTITION_FORMAT))
+
+
+def _coerce_types(df):
+    """
+    Cast a raw tweet frame (from GetOldTweets3 or an archived csv) to TWEET_SCHEMA
+    """
+    df = df.copy()
+    for field in TWEET_SCHEMA:
+        if field.name not in df.columns:
+            df[field.name] = None
+    for col in INT_COLS:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype('int64')
+    for col in STRING_COLS:
+        # keep missing values as nulls so str.cat() still skips them downstream
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str)).astype(object)
+    df['date'] = pd.to_datetime(df['date'], utc=True)
+    return df[TWEET_SCHEMA.names]
+
+
+def _write_parquet(df, file_path):
+    table = pa.Table.from_pandas(_coerce_types(df), schema=TWEET_SCHEMA, preserve_index=False)
+    tmp_path = file_path + '.tmp'
+    pq.write_table(table, tmp_path, compression='snappy')
+    os.replace(tmp_path, file_path)
+
+
+def _drop_known_ids(df, day, store_path, replace_day=False):
+    """
+    Upsert against the id index: drop rows whose tweet id is already stored under another day
+    :return: deduplicated df, number of rows dropped
+    """
+    keep = get_id_index(store_path).claim(pd.to_numeric(df['id']).values, _to_day(day), replace_day=replace_day)
+    return df[keep], int((~keep).sum())
+
+
+def write_day_partition(df, day, store_path=STORE_PATH):
+    """
+    Replace the partition for `day` with the tweets in df, minus tweets other days already have
+    """
+    df, num_duplicates = _drop_known_ids(df, day, store_path, replace_day=True)
+    if num_duplicates:
+        print("Dropped {:,} duplicate tweets for {}".format(num_duplicates, _to_day(day)))
+
+    day_path = partition_path(day, store_path)
+    tmp_day_path = day_path + '.tmp'
+    shutil.rmtree(tmp_day_path, ignore_errors=True)
+    os.makedirs(tmp_day_path)
+    _write_parquet(df, os.path.join(tmp_day_path, 'part-00000.parquet'))
+
+    shutil.rmtree(day_path, ignore_errors=True)
+    os.rename(tmp_day_path, day_path)
+    get_id_index(store_path).save()
+    return day_path
+
+
+def _partial_path(day, store_path=STORE_PATH):
+    return partition_path(day, store_path) + '.partial'
+
+
+def read_checkpoint(day, store_path=STORE_PATH):
+    """
+    Progress of a day that is being streamed in: the max_id to resume from, parts and tweets written so far.
+    The id index only keeps a day's claims once it is committed, so resuming claims the ids of the parts written
+    so far again.
+    """
+    partial_path = _partial_path(day, store_path)
+    checkpoint_file = os.path.join(partial_path, CHECKPOINT_FILE)
+    if not os.path.isfile(checkpoint_file):
+        return {'max_id': None, 'num_parts': 0, 'num_tweets': 0, 'num_duplicates': 0}
+    with open(checkpoint_file) as f:
+        checkpoint = json.load(f)
+
+    index = get_id_index(store_path)
+    index.release_day(_to_day(day))
+    for i in range(checkpoint['num_parts']):
+        index.claim(pq.read_table(os.path.join(partial_path, 'part-{:05d}.parquet'.format(i)), columns=['id'])
+                    .column('id').to_pandas().values, _to_day(day))
+    return checkpoint
+
+
+def append_chunk(df, day, checkpoint, store_path=STORE_PATH):
+    """
+    Write one chunk of a day's tweets as the next part file, then move the checkpoint past it.
+    Search results come newest first, so the next chunk resumes below the smallest id seen.
+    """
+    partial_path = _partial_path(day, store_path)
+    os.makedirs(partial_path, exist_ok=True)
+    if df.empty:
+        return checkpoint
+
+    max_id = int(pd.to_numeric(df['id']).min()) - 1
+    # the first chunk of a day starts it over, so forget the ids an earlier scrape of it claimed
+    df, num_duplicates = _drop_known_ids(df, day, store_path, replace_day=checkpoint['num_parts'] == 0)
+
+    # a crash between these two writes just means the same part gets fetched and overwritten again
+    _write_parquet(df, os.path.join(partial_path, 'part-{:05d}.parquet'.format(checkpoint['num_parts'])))
+    checkpoint = {'max_id': max_id,
+                  'num_parts': checkpoint['num_parts'] + 1,
+                  'num_tweets': checkpoint['num_tweets'] + len(df),
+                  'num_duplicates': checkpoint.get('num_duplicates', 0) + num_duplicates}
+
+    checkpoint_file = os.path.join(partial_path, CHECKPOINT_FILE)
+    with open(checkpoint_file + '.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(checkpoint_file + '.tmp', checkpoint_file)
+    return checkpoint
+
+
+def commit_partial_partition(day, store_path=STORE_PATH):
+    """
+    Publish a fully streamed day, replacing any earlier scrape of it
+    """
+    partial_path = _partial_path(day, store_path)
+    os.makedirs(partial_path, exist_ok=True)
+    checkpoint_file = os.path.join(partial_path, CHECKPOINT_FILE)
+    if not os.path.isfile(checkpoint_file):
+        # no tweets this time: the first chunk never came to release the ids the earlier scrape claimed
+        get_id_index(store_path).release_day(_to_day(day))
+    else:
+        os.remove(checkpoint_file)
+
+    day_path = partition_path(day, store_path)
+    shutil.rmtree(day_path, ignore_errors=True)
+    os.rename(partial_path, day_path)
+    get_id_index(store_path).save()
+    return day_path
+
+
+def list_partitions(start_day=None, end_day=None, store_path=STORE_PATH):
+    """
+    Sorted [(day, partition directory)] for the days in [start_day, end_day]; None means unbounded
+    """
+    start_day = _to_day(start_day) if start_day is not None else None
+    end_day = _to_day(end_day) if end_day is not None else None
+
+    partitions = []
+    for day_path in glob.glob(os.path.join(store_path, 'day=*')):
+        # skip .tmp and .partial directories that are still being written
+        if not PARTITION_PATTERN.match(os.path.basename(day_path)):
+            continue
+        day = datetime.datetime.strptime(os.path.basename(day_path), PARTITION_FORMAT).date()
+        if start_day is not None and day < start_day:
+            continue
+        if end_day is not None and day > end_day:
+            continue
+        partitions.append((day, day_path))
+    return sorted(partitions)
+
+
+def _map_files(func, files, workers):
+    # parquet and csv parsing both release the GIL, so threads are enough; map keeps the file order
+    if workers is None or workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, files))
+    return [func(file) for file in files]
+
+
+def read_tweets(columns=None, start_day=None, end_day=None, store_path=STORE_PATH, workers=None):
+    """
+    Read tweets from the store, only touching the requested columns and day partitions
+    :param columns: list of column names, None for all of TWEET_SCHEMA
+    :param start_day: first day to load (date, datetime or 'YYYY-MM-DD'), inclusive
+    :param end_day: last day to load, inclusive
+    :param workers: files read in parallel, None for one per cpu
+    :return: dataframe
+    """
+    columns = list(columns) if columns is not None else TWEET_SCHEMA.names
+    files = []
+    for _, day_path in list_partitions(start_day, end_day, store_path):
+        files.extend(sorted(glob.glob(os.path.join(day_path, 'part-*.parquet'))))
+
+    if not files:
+        return pd.DataFrame(columns=columns)
+
+    tables = _map_files(lambda file: pq.read_table(file, columns=columns, use_threads=False), files, workers)
+    return pa.concat_tables(tables).to_pandas()
+
+
+def has_store(store_path=STORE_PATH):
+    return len(list_partitions(store_path=store_path)) > 0
+
+
+def _csv_day(file):
+    return datetime.datetime.strptime(re.search(r'(\d{8})', os.path.basename(file)).group(1), '%Y%m%d').date()
+
+
+def read_csv_archive(columns=None, start_day=None, end_day=None, csv_glob=CSV_GLOB, workers=None):
+    """
+    Same contract as read_tweets() but over the legacy tweets/cdnpoli_*.csv files
+    """
+    start_day = _to_day(start_day) if start_day is not None else None
+    end_day = _to_day(end_day) if end_day is not None else None
+
+    files = []
+    for file in sorted(glob.glob(csv_glob)):
+        day = _csv_day(file)
+        if (start_day is not None and day < start_day) or (end_day is not None and day > end_day):
+            continue
+        files.append(file)
+    if not files:
+        return pd.DataFrame(columns=columns)
+
+    frames = _map_files(lambda file: pd.read_csv(file, usecols=columns), files, workers)
+    return pd.concat(frames, ignore_index=True, sort=False)
+
+
+def load_tweets(columns=None, start_day=None, end_day=None, workers=None):
+    """
+    Load tweets from the columnar store, falling back to the csv archive if it hasn't been converted yet
+    """
+    if has_store():
+        return read_tweets(columns, start_day, end_day, workers=workers)
+    print("No partitions in {}, reading {}".format(STORE_PATH, CSV_GLOB))
+    return read_csv_archive(columns, start_day, end_day, workers=workers)
+
+
+def list_input_files():
+    """
+    [(day, [files])] in load order, from the store or the csv archive, whichever load_tweets() would read
+    """
+    if has_store():
+        return [(day, sorted(glob.glob(os.path.join(day_path, 'part-*.parquet')))) for day, day_path in list_partitions()]
+    return [(_csv_day(file), [file]) for file in sorted(glob.glob(CSV_GLOB))]
+
+
+def convert_csv_archive(csv_glob=CSV_GLOB, store_path=STORE_PATH, overwrite=False):
+    """
+    One-off conversion of tweets/cdnpoli_YYYYMMDD.csv files into day partitions
+    """
+    files = sorted(glob.glob(csv_glob))
+    for i, file in enumerate(files):
+        day = _csv_day(file)
+        if not overwrite and os.path.isdir(partition_path(day, store_path)):
+            print("Skipping {}, partition already exists".format(file))
+            continue
+        print("Converting {} ({} of {})".format(file, i + 1, len(files)))
+        write_day_partition(pd.read_csv(file), day, store_path)
+    return list_partitions(store_path=store_path)
+
+
+def rebuild_id_index(store_path=STORE_PATH, dedupe=False):
+    """
+    Rebuild the id index from the partitions on disk, oldest day first, reporting tweets stored under several days
+    :param dedupe: also rewrite the affected part files without the duplicate rows (the oldest day keeps the tweet)
+    :return: {day: number of duplicate rows}
+    """
+    index = reset_id_index(store_path)
+    duplicates = {}
+    for day, day_path in list_partitions(store_path=store_path):
+        for file in sorted(glob.glob(os.path.join(day_path, 'part-*.parquet'))):
+            ids = pq.read_table(file, columns=['id']).column('id').to_pandas().values
+            keep = index.claim(ids, day)
+            if keep.all():
+                continue
+            duplicates[day] = duplicates.get(day, 0) + int((~keep).sum())
+            if dedupe:
+                df = pq.read_table(file).to_pandas()
+                _write_parquet(df[keep], file)
+    index.save()
+
+    for day, num_duplicates in sorted(duplicates.items()):
+        print("{}: {:,} duplicate tweets{}".format(day, num_duplicates, ' removed' if dedupe else ''))
+    print("Id index has {:,} tweets, {:,} duplicates found".format(len(index), sum(duplicates.values())))
+    return duplicates
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert the csv tweet archive into day partitions')
+    parser.add_argument('--csv-glob', type=str, default=CSV_GLOB)
+    parser.add_argument('--store-path', type=str, default=STORE_PATH)
+    parser.add_argument('--overwrite', action='store_true')
+    parser.add_argument('--rebuild-id-index', action='store_true', help='rebuild the tweet id index instead of converting')
+    parser.add_argument('--dedupe', action='store_true', help='with --rebuild-id-index, rewrite partitions without duplicates')
+    args = parser.parse_args()
+
+    if args.rebuild_id_index:
+        rebuild_id_index(args.store_path, args.dedupe)
+    else:
+        partitions = convert_csv_archive(args.csv_glob, args.store_path, args.overwrite)
+        print("Store has {} day partitions, {:,} duplicate tweets dropped".format(
+            len(partitions), get_id_index(args.store_path).num_duplicates))